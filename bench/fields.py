@@ -0,0 +1,68 @@
+""" Compare a page of full transactions with one projected to a few fields
+
+    python bench/fields.py --rows 500 --input-bytes 2000
+
+Builds a synthetic transaction page with input data of the given size, once
+with every column and once with only hash, block_number and value, as a
+request with fields would select.  Reports the time to build the records from
+cursor rows and JSON encode them, and the encoded size.  Needs no database, so
+the disk and network reads the projection also skips aren't measured.
+"""
+import json
+import time
+import random
+import argparse
+from blocksapi.db import JSONEncoder, _results
+from blocksapi.records import Transaction
+
+FIELDS = ['hash', 'block_number', 'value']
+
+
+def make_rows(count: int, input_bytes: int) -> list:
+    """ Cursor tuples like a transaction page returns """
+    rows = []
+    for i in range(count):
+        rows.append((
+            '0x' + '%064x' % random.getrandbits(256),
+            5000000 + i,
+            '0x' + '%040x' % random.getrandbits(160),
+            '0x' + '%040x' % random.getrandbits(160),
+            random.getrandbits(70),
+            random.randint(1, 100) * 10 ** 9,
+            21000,
+            random.randint(0, 10000),
+            '0x' + random.getrandbits(input_bytes * 8).to_bytes(
+                input_bytes, 'big').hex(),
+        ))
+    return rows
+
+
+def run(rows: list, columns: list, repeat: int) -> tuple:
+    """ Seconds to build and encode the page, and its encoded size """
+    start = time.perf_counter()
+    for i in range(repeat):
+        body = json.dumps({'results': _results(rows, columns, Transaction)},
+                          cls=JSONEncoder)
+    return (time.perf_counter() - start) / repeat, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--input-bytes', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    full = make_rows(args.rows, args.input_bytes)
+    indexes = [Transaction.columns.index(col) for col in FIELDS]
+    projected = [tuple(row[i] for i in indexes) for row in full]
+
+    for label, rows, columns in (('all columns', full, Transaction.columns),
+                                 ('fields', projected, FIELDS)):
+        seconds, size = run(rows, columns, args.repeat)
+        print("{:<12} {:8.2f}ms per page  {:8.1f}KiB".format(
+            label, seconds * 1e3, size / 1024))
+
+
+if __name__ == '__main__':
+    main()
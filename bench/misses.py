@@ -0,0 +1,55 @@
+""" Time the address filter and negative cache answering lookups in memory
+
+    python bench/misses.py --addresses 1000000
+
+Fills a filter sized for the addresses with random ones, as loading it does,
+then times looking up addresses never added and measures how many it wrongly
+reports as present.  Those, and any address with transactions, still query.
+Needs no database.
+"""
+import os
+import time
+import argparse
+from blocksapi.misses import AddressFilter, NegativeCache
+
+
+def random_address() -> str:
+    return '0x' + os.urandom(20).hex()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--addresses', type=int, default=1000000)
+    parser.add_argument('--error', type=float, default=0.01)
+    parser.add_argument('--lookups', type=int, default=100000)
+    args = parser.parse_args()
+
+    addresses = AddressFilter(None, args.addresses, args.error)
+    loading = [random_address() for i in range(args.addresses)]
+    start = time.perf_counter()
+    for address in loading:
+        addresses.add(address)
+    elapsed = time.perf_counter() - start
+    addresses.ready = True
+    print("load   {:8.2f}us per address, {:.1f} MiB".format(
+        elapsed / args.addresses * 1e6, len(addresses.bloom.bits) / 2 ** 20))
+
+    unknown = [random_address() for i in range(args.lookups)]
+    start = time.perf_counter()
+    present = sum(address in addresses for address in unknown)
+    elapsed = time.perf_counter() - start
+    print("filter {:8.2f}us per lookup, {:.2%} false positives".format(
+        elapsed / args.lookups * 1e6, present / args.lookups))
+
+    misses = NegativeCache(ttl=60)
+    for address in unknown:
+        misses.add(('hash', address), misses.generation)
+    start = time.perf_counter()
+    for address in unknown:
+        ('hash', address) in misses
+    elapsed = time.perf_counter() - start
+    print("cache  {:8.2f}us per lookup".format(elapsed / args.lookups * 1e6))
+
+
+if __name__ == '__main__':
+    main()
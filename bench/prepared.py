@@ -0,0 +1,66 @@
+""" Time single block lookups with and without prepared statements
+
+    python bench/prepared.py --count 5000
+
+Uses the DSN from blocksapi.ini, which should point at a populated block
+table.  Both runs look up the same random blocks over one connection, after a
+warm-up pass so the blocks are cached either way.
+"""
+import time
+import random
+import argparse
+import psycopg2
+from blocksapi.config import override, settings
+from blocksapi.db import BlockModel
+from blocksapi.replicas import Router
+
+
+def run(blocks: BlockModel, numbers: list) -> list:
+    """ Look up each block, returning the seconds each took """
+    timings = []
+    for block_number in numbers:
+        start = time.perf_counter()
+        blocks.get(block_number)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(label: str, timings: list) -> float:
+    """ Print a run's latencies, returning its mean """
+    timings = sorted(timings)
+    mean = sum(timings) / len(timings)
+    print("{:<12} mean {:8.1f}us  p50 {:8.1f}us  p99 {:8.1f}us".format(
+        label,
+        mean * 1e6,
+        timings[len(timings) // 2] * 1e6,
+        timings[int(len(timings) * 0.99)] * 1e6))
+    return mean
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--count', type=int, default=5000,
+                        help="Lookups per run")
+    args = parser.parse_args()
+
+    dsn = settings().dsn
+    blocks = BlockModel(dsn, router=Router(dsn, []))
+    try:
+        latest = blocks.get_latest()
+    except psycopg2.OperationalError as e:
+        raise SystemExit("Unable to reach the database: {}".format(
+            str(e).strip()))
+    numbers = [random.randint(0, latest) for i in range(args.count)]
+
+    override(prepared_statements=False)
+    run(blocks, numbers)
+
+    means = []
+    for label, prepared in (('unprepared', False), ('prepared', True)):
+        override(prepared_statements=prepared)
+        means.append(report(label, run(blocks, numbers)))
+    print("prepared lookups take {:.2f}x the time".format(means[1] / means[0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+""" Time answering recent block and transaction lookups from memory
+
+    python bench/recent.py --blocks 128 --txs 200
+
+Fills a ring with blocks of txs transactions each, with a few hot addresses in
+most of them, then times block, transaction hash, block transaction and
+address page lookups including copying out the records.  Needs no database.
+"""
+import os
+import time
+import random
+import argparse
+from blocksapi.head import Head
+from blocksapi.records import Block, Transaction
+from blocksapi.recent import RecentBlocks, copy_records
+
+HOT = ['0x' + os.urandom(20).hex() for i in range(5)]
+
+
+class Chain(object):
+    def __init__(self, txs: int):
+        self.txs = txs
+
+    def get_range_number(self, start, end, limit=None):
+        return [Block((n, None, '0x{:064x}'.format(n), HOT[0], 0, 0, 0, 0, 0))
+                for n in range(start, end + 1)]
+
+    def get_block_range(self, start, end):
+        return [Transaction(('0x' + os.urandom(32).hex(), n,
+                             '0x' + os.urandom(20).hex(),
+                             random.choice(HOT) if i % 4 == 0
+                             else '0x' + os.urandom(20).hex(),
+                             10 ** 18, 10 ** 9, 21000, i,
+                             '0x' + os.urandom(68).hex()))
+                for n in range(start, end + 1) for i in range(self.txs)]
+
+
+def timed(label: str, lookups: int, lookup):
+    start = time.perf_counter()
+    for i in range(lookups):
+        lookup(i)
+    elapsed = time.perf_counter() - start
+    print("{:<12} {:8.2f}us".format(label, elapsed / lookups * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--blocks', type=int, default=128)
+    parser.add_argument('--txs', type=int, default=200)
+    parser.add_argument('--lookups', type=int, default=10000)
+    args = parser.parse_args()
+
+    recent = RecentBlocks(Chain(args.txs), Chain(args.txs), args.blocks)
+    top = 10 ** 7
+    start = time.perf_counter()
+    recent.load(Head(top, None, 0))
+    print("load         {:8.2f}ms for {} transactions".format(
+        (time.perf_counter() - start) * 1e3, len(recent.hashes)))
+
+    numbers = [top - random.randrange(args.blocks) for i in range(1000)]
+    hashes = random.sample(list(recent.hashes), 1000)
+    timed('block', args.lookups, lambda i: recent.get(numbers[i % 1000]))
+    timed('transaction', args.lookups,
+          lambda i: recent.get_transaction(hashes[i % 1000]))
+    timed('block txs', args.lookups,
+          lambda i: copy_records(recent.get_transactions(numbers[i % 1000])))
+    timed('address page', args.lookups // 10,
+          lambda i: copy_records(recent.by_address(HOT[i % len(HOT)], 500)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+""" Compare rawl results with slotted records for a page of transactions
+
+    python bench/records.py --rows 500
+
+Builds the same synthetic transaction page both ways: rawl's RawlResult with
+the Decimal values psycopg2 gives numerics by default, and Transaction records
+with the ints the model connections now read them as.  Reports memory per row
+and the time to build and JSON encode a page.  Needs no database.
+"""
+import gc
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from decimal import Decimal
+from datetime import datetime
+from rawl import RawlResult
+from blocksapi.db import JSONEncoder
+from blocksapi.records import Transaction
+
+
+def make_rows(count: int, decimals: bool) -> list:
+    """ Cursor tuples like a transaction page returns """
+    number = Decimal if decimals else int
+    rows = []
+    for i in range(count):
+        rows.append((
+            '0x' + '%064x' % random.getrandbits(256),
+            5000000 + i,
+            '0x' + '%040x' % random.getrandbits(160),
+            '0x' + '%040x' % random.getrandbits(160),
+            number(random.getrandbits(70)),
+            number(random.randint(1, 100) * 10 ** 9),
+            21000,
+            number(random.randint(0, 10000)),
+            '0x' + '%0136x' % random.getrandbits(544),
+        ))
+    return rows
+
+
+def rawl_page(rows: list) -> list:
+    return [RawlResult(Transaction.columns, dict(zip(Transaction.columns, row)))
+            for row in rows]
+
+
+def record_page(rows: list) -> list:
+    return list(map(Transaction, rows))
+
+
+def measure(label: str, build, rows: list, repeat: int):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    page = build(rows)
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del page
+
+    start = time.perf_counter()
+    for i in range(repeat):
+        page = build(rows)
+    built = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(repeat):
+        json.dumps({'results': page}, cls=JSONEncoder)
+    encoded = time.perf_counter() - start
+
+    print("{:<8} {:6.0f} bytes/row  build {:6.2f}ms/page  encode {:6.2f}ms/page"
+          .format(label, size / len(rows), built / repeat * 1000,
+                  encoded / repeat * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=500, help="Rows per page")
+    parser.add_argument('--repeat', type=int, default=200,
+                        help="Pages built and encoded for the timings")
+    args = parser.parse_args()
+
+    measure('rawl', rawl_page, make_rows(args.rows, True), args.repeat)
+    measure('record', record_page, make_rows(args.rows, False), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+""" Time request parsing as an endpoint declares more properties
+
+    python bench/schema.py --requests 50000
+
+Parses a /block range request with the compiled schema from docs, then with
+the same schema plus extra optional properties, to check the cost stays flat
+as query fields are added.  Needs no database.
+"""
+import copy
+import time
+import argparse
+from blocksapi.docs import JSON_SCHEMA
+from blocksapi.schema import RequestSchema
+
+REQUEST = {'start': 100, 'end': 200, 'page': 1}
+
+
+def block_schema(extra: int) -> RequestSchema:
+    """ The /block request schema with extra optional integer properties """
+    schema = copy.deepcopy(next(e['request'] for e in JSON_SCHEMA
+                                if e['uri'] == '/block'))
+    for i in range(extra):
+        schema['properties']['extra_{}'.format(i)] = {'type': 'integer'}
+    return RequestSchema(schema)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--requests', type=int, default=50000)
+    args = parser.parse_args()
+
+    for extra in (0, 10, 100):
+        schema = block_schema(extra)
+        start = time.perf_counter()
+        for i in range(args.requests):
+            schema.parse(REQUEST)
+        elapsed = time.perf_counter() - start
+        print("{:>4} properties  {:6.2f}us per request".format(
+            len(schema.coercers), elapsed / args.requests * 1e6))
+
+
+if __name__ == '__main__':
+    main()
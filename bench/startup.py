@@ -0,0 +1,46 @@
+""" Time a cold import of the API and building its Application
+
+    python bench/startup.py --runs 10
+
+Each run is a fresh interpreter, so nothing is cached in sys.modules.  Reports
+the median and best of the runs for importing blocksapi.web, and for importing
+it and constructing the Application (no connections are made either way).
+"""
+import sys
+import argparse
+import statistics
+import subprocess
+
+IMPORT = "import blocksapi.web"
+BUILD = "import blocksapi.web; blocksapi.web.Application()"
+
+TIMER = """
+import time
+start = time.perf_counter()
+{}
+print(time.perf_counter() - start)
+"""
+
+
+def run(code: str, runs: int) -> list:
+    timings = []
+    for i in range(runs):
+        out = subprocess.run([sys.executable, '-c', TIMER.format(code)],
+                             stdout=subprocess.PIPE, check=True)
+        timings.append(float(out.stdout.decode().split()[-1]))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=10, help="Interpreters to start")
+    args = parser.parse_args()
+
+    for label, code in (('import', IMPORT), ('application', BUILD)):
+        timings = run(code, args.runs)
+        print("{:<12} median {:6.1f}ms  best {:6.1f}ms".format(
+            label, statistics.median(timings) * 1000, min(timings) * 1000))
+
+
+if __name__ == '__main__':
+    main()
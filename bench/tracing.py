@@ -0,0 +1,51 @@
+""" Time the tracing a request pays for when it isn't written
+
+    python bench/tracing.py --requests 50000
+
+Records the spans a block request makes, a root and six children with a query
+thread's spans made through traced(), then finishes the trace unsampled and
+fast so it's dropped.  Compared with tracing off.  Needs no database.
+"""
+import time
+import argparse
+from blocksapi.tracing import Tracer, span, traced
+
+
+def request(tracer: Tracer):
+    trace = tracer.start('POST /block')
+    with trace.span('ratelimit'):
+        pass
+    with trace.span('parse_json', bytes=40):
+        pass
+    with trace.span('validate'):
+        pass
+    with trace.span('flight', query='get_block', coalesced=False) as flight:
+        with traced(flight):
+            with span('db.query', db='localhost:5432/blocks') as s:
+                if s is not None:
+                    s.attrs['rows'] = 1
+            with span('hex_format', rows=1):
+                pass
+    with trace.span('encode', format='json') as s:
+        if s is not None:
+            s.attrs['bytes'] = 500
+    tracer.finish(trace, status=200)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--requests', type=int, default=50000)
+    args = parser.parse_args()
+
+    for label, tracer in (('off', Tracer(None)),
+                          ('on', Tracer('/dev/null', sample=0.0, slow=60))):
+        start = time.perf_counter()
+        for i in range(args.requests):
+            request(tracer)
+        elapsed = time.perf_counter() - start
+        print("{:<4} {:6.2f}us per request".format(
+            label, elapsed / args.requests * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+""" Time address and hash validation per request, before and after caching
+
+    python bench/validate.py --requests 20000 --addresses 200
+
+Each request validates one address and one hash drawn from a skewed set, as
+traffic for a few hot addresses would.  "before" is the previous
+implementation, eth_utils' is_address and to_normalized_address on every call
+with a fresh re.match for hashes.  Needs no database.
+"""
+import re
+import time
+import random
+import argparse
+from eth_utils import __version__ as eth_utils_version
+from eth_utils.address import is_address, to_checksum_address, to_normalized_address
+from blocksapi import validate
+from blocksapi.validate import InvalidInput, be_string
+
+
+def old_be_hash(v):
+    v = be_string(v)
+    if not re.match(r'^(0x)?[A-Fa-f0-9]+$', v):
+        raise InvalidInput("String is not a hash")
+    if len(v) not in (64,66):
+        raise InvalidInput("Hash is an invalid length")
+    if v[:2] != '0x':
+        return '0x' + v
+    else:
+        return v
+
+
+def old_be_address(v):
+    v = be_string(v)
+    if not is_address(v):
+        raise InvalidInput("Address is invalid")
+    return to_normalized_address(v)
+
+
+def workload(requests: int, addresses: int) -> list:
+    """ (address, hash) pairs, checksummed addresses with a Zipf-like skew """
+    hot = [to_checksum_address('0x%040x' % random.getrandbits(160))
+           for i in range(addresses)]
+    hashes = ['0x%064x' % random.getrandbits(256) for i in range(addresses)]
+    weights = [1 / (i + 1) for i in range(addresses)]
+    picks = random.choices(range(addresses), weights, k=requests)
+    return [(hot[i], hashes[i]) for i in picks]
+
+
+def measure(label: str, be_address, be_hash, pairs: list):
+    start = time.perf_counter()
+    for address, tx_hash in pairs:
+        be_address(address)
+        be_hash(tx_hash)
+    elapsed = time.perf_counter() - start
+    print("{:<7} {:6.2f}us/request".format(label, elapsed / len(pairs) * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--addresses', type=int, default=200,
+                        help="Distinct addresses and hashes")
+    args = parser.parse_args()
+
+    pairs = workload(args.requests, args.addresses)
+    print("eth_utils {}, {} requests over {} addresses".format(
+        eth_utils_version, args.requests, args.addresses))
+    measure('before', old_be_address, old_be_hash, pairs)
+    measure('after', validate.be_address, validate.be_hash, pairs)
+    info = validate.normalize_address.cache_info()
+    print("address cache hits {} misses {}".format(info.hits, info.misses))
+
+
+if __name__ == '__main__':
+    main()
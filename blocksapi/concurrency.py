@@ -0,0 +1,64 @@
+""" Adaptive limit on the queries a worker runs at once
+
+The limit follows AIMD: every query finishing within concurrency_latency grows
+it by 1/limit, so by about one per limit's worth of queries, and a slower or
+timed out query shrinks it by a tenth.  Queries over the limit are refused so
+the worker can shed load quickly instead of queueing it on the DB.
+
+Cheap lookups may use the whole limit, other queries only scan_share of it,
+which keeps room for lookups while scans pile up.
+"""
+from .config import settings
+
+
+class Overloaded(Exception):
+    """ A query was refused because the worker is at its limit """
+
+
+class AIMDLimiter(object):
+    """ Additive increase, multiplicative decrease concurrency limit
+
+    Only use from the IOLoop thread.
+    """
+    def __init__(self, initial: float=None, minimum: float=None,
+                 maximum: float=None, latency: float=None,
+                 backoff: float=0.9, scan_share: float=0.8):
+        current = settings()
+        if initial is None:
+            initial = current.query_threads
+        self.limit = float(initial)
+        self.minimum = current.concurrency_min if minimum is None else minimum
+        self.maximum = current.concurrency_max if maximum is None else maximum
+        self.latency = current.concurrency_latency if latency is None else latency
+        self.backoff = backoff
+        self.scan_share = scan_share
+        self.in_flight = 0
+
+    def configure(self, minimum: float, maximum: float, latency: float):
+        """ Change the bounds, keeping the current limit within them """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency = latency
+        self.limit = min(max(self.limit, minimum), maximum)
+
+    def acquire(self, cheap: bool=False) -> bool:
+        """ Take a slot for a query if there is room for it """
+        limit = self.limit if cheap else self.limit * self.scan_share
+        if self.in_flight >= max(limit, 1):
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, seconds: float, timed_out: bool=False):
+        """ Give back a slot, adjusting the limit by how the query went """
+        self.in_flight -= 1
+        if timed_out or seconds > self.latency:
+            self.limit = max(self.limit * self.backoff, self.minimum)
+        else:
+            self.limit = min(self.limit + 1 / self.limit, self.maximum)
+
+    def status(self) -> dict:
+        return {
+            'limit': round(self.limit, 2),
+            'in_flight': self.in_flight,
+        }
@@ -1,18 +1,35 @@
 """ Database models and utilities """
+import json
 import logging
 import decimal
 import psycopg2
-from datetime import datetime
-from eth_utils.address import is_address
-from rawl import RawlBase, RawlJSONEncoder
-from .utils import results_hex_format, has_to_pg_varchar
-from .config import LOGGER, DEFAULT_LIMIT, DEFAULT_OFFSET
+from psycopg2 import errorcodes
+from collections import namedtuple
+from datetime import datetime, timedelta
+from psycopg2 import sql
+from rawl import RawlBase, RawlJSONEncoder, RawlResult
+from .utils import has_to_pg_varchar, pg_varchar_to_hex
+from .timeindex import TimestampIndex
+from .head import Head
+from .records import Record, Block, Transaction, projection
+from .replicas import Router, PreparingConnection, PRIMARY, routing, current_route
+from .validate import is_address
+from .config import LOGGER, DEFAULT_OFFSET, settings
+from .tracing import span
 
 log = LOGGER.getChild('db')
 
 
 class InvalidRange(IndexError): pass
 
+# Bucket sizes available from the rollup tables
+RESOLUTIONS = ('minute', 'hour', 'day')
+
+# A row count and how it was arrived at, EXACT or ESTIMATE
+Count = namedtuple('Count', ['value', 'kind'])
+EXACT = 'exact'
+ESTIMATE = 'estimate'
+
 
 class JSONEncoder(RawlJSONEncoder):
     """ 
@@ -25,6 +42,8 @@ class JSONEncoder(RawlJSONEncoder):
                 return float(o)
             else:
                 return int(o)
+        if isinstance(o, Record):
+            return o.to_dict()
         try:
             return super(JSONEncoder, self).default(o)
         except TypeError as e:
@@ -34,12 +53,311 @@ class JSONEncoder(RawlJSONEncoder):
                 return super(JSONEncoder, self).default(o)
 
 
-class BlockModel(RawlBase):
-    def __init__(self, dsn: str):
+class BaseModel(RawlBase):
+    """ Functionality shared by the API's models
+
+    Queries run through a Router: reads go to a replica chosen by
+    replicas.routing() and writes (commit=True) go to the primary.  Without
+    one every query goes to dsn.  Hot fixed-shape queries use select_prepared()
+    to skip parsing and planning after the first run on a connection.
+
+    bytea columns are read as 0x hex strings and integral numerics as ints.
+    Reads taking fields select only those columns, see project().  Each round
+    trip is a db.query tracing span.
+    """
+    column_types = {}
+
+    # Record class for rows of all the model's columns, RawlResult if None
+    record = None
+
+    def __init__(self, dsn: str, columns, table_name: str, pk_name: str=None,
+                 router: Router=None):
+        super(BaseModel, self).__init__(dsn, columns, table_name, pk_name)
+        self.router = router or Router(dsn, [])
+        # Prepared statement name to its PREPARE statement
+        self.statements = {}
+        # Whether hash is still '\x' prefixed varchar, see varchar_hashes()
+        self.varchar_hash = None
+        # Whether sql/counters.sql is installed, see count_rows()
+        self.row_counter = None
+
+    def _execute(self, query, commit=False, working_columns=None):
+        if working_columns is None:
+            working_columns = self.columns
+
+        return self._routed(
+            lambda db: self._execute_on(db, query, commit, working_columns,
+                                        self.record),
+            commit)
+
+    def _routed(self, run, commit=False):
+        """ Call run(db) on the database the router picks, retrying on the
+            primary if a replica fails
+        """
+        db = self.router.primary if commit \
+            else self.router.pick(current_route())
+        try:
+            return run(db)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            if db is self.router.primary \
+                    or isinstance(e, psycopg2.extensions.QueryCanceledError):
+                raise
+            log.warning("Query on replica {} failed, retrying on the"
+                        " primary: {}".format(db.name, str(e).strip()))
+            self.router.failed(db)
+            return run(self.router.primary)
+
+    @staticmethod
+    def _execute_on(db, query, commit, working_columns, record=None) -> list:
+        """ Run a query on a Database, returning rows like rawl does """
+        with span('db.query', db=db.name) as s, db.connection() as conn:
+            with conn.cursor() as curs:
+                curs.execute(query)
+                rows = curs.fetchall() if curs.description else []
+            if commit:
+                conn.commit()
+            if s is not None:
+                s.attrs['rows'] = len(rows)
+
+        return _results(rows, working_columns, record)
+
+    def project(self, fields=None) -> list:
+        """ The columns in fields in the model's column order, every column if
+            fields is empty
+        """
+        if not fields:
+            return self.columns
+
+        unknown = set(fields).difference(self.columns)
+        if unknown:
+            raise ValueError("Unknown columns {}".format(
+                ', '.join(sorted(unknown))))
+
+        return [col for col in self.columns if col in fields]
+
+    def select_prepared(self, name: str, sql_string: str, columns: list,
+                        *args) -> list:
+        """ Like select(), but PREPAREd once per connection and run with
+            EXECUTE.  sql_string must have the same shape for every call.
+            With prepared_statements off this is select().  Results are named
+            after columns without their table alias.
+        """
+        names = [col.split('.')[-1] for col in columns]
+        if not settings().prepared_statements:
+            return self.select(sql_string, columns, *args, columns=names)
+
+        name = '{}_{}'.format(self.table, name)
+        # Each projection of the columns is its own statement
+        if names != self.columns:
+            name += '_{:x}'.format(sum(1 << self.columns.index(col)
+                                       for col in names))
+        if name not in self.statements:
+            self.statements[name] = self._assemble_prepare(name, sql_string,
+                                                           columns, len(args))
+
+        execute = sql.SQL("EXECUTE {} ({});").format(
+            sql.Identifier(name),
+            sql.SQL(', ').join([sql.Literal(a) for a in args]))
+
+        return self._routed(
+            lambda db: self._execute_prepared(db, name, self.statements[name],
+                                              execute, names, self.record))
+
+    def _assemble_prepare(self, name: str, sql_string: str, columns: list,
+                          nargs: int):
+        """ Build the PREPARE for a select() template, with $n parameters in
+            place of the arguments
+        """
+        qcols = [self.select_column(col) for col in columns]
+        return sql.SQL("PREPARE {} AS ").format(sql.Identifier(name)) \
+            + sql.SQL(sql_string.rstrip(';')).format(
+                sql.SQL(', ').join(qcols),
+                *[sql.SQL('${}'.format(i + 1)) for i in range(nargs)])
+
+    @staticmethod
+    def _execute_prepared(db, name, prepare, execute, working_columns,
+                          record=None) -> list:
+        """ Run a prepared statement on a Database, preparing it first if this
+            connection hasn't
+        """
+        with span('db.query', db=db.name, statement=name) as s, \
+                db.connection() as conn:
+            for attempt in range(2):
+                try:
+                    with conn.cursor() as curs:
+                        if name not in conn.prepared:
+                            curs.execute(prepare)
+                            conn.prepared.add(name)
+                        curs.execute(execute)
+                        rows = curs.fetchall()
+                    break
+                except psycopg2.OperationalError as e:
+                    # Deallocated behind our back, e.g. DISCARD ALL
+                    if attempt or e.pgcode != errorcodes.INVALID_SQL_STATEMENT_NAME:
+                        raise
+                    conn.rollback()
+                    conn.prepared.clear()
+                    db.limit(conn)
+            if s is not None:
+                s.attrs['rows'] = len(rows)
+
+        return _results(rows, working_columns, record)
+
+    def count_rows(self) -> Count:
+        """ Count the rows in the model's table without scanning it.  The
+            trigger maintained row_counter (sql/counters.sql) is exact; if it
+            isn't installed fall back to the planner's estimate.
+        """
+        if self.row_counter is None:
+            res = self.query("SELECT to_regclass('row_counter') IS NOT NULL;",
+                             columns=['installed'])
+            self.row_counter = bool(res and res[0][0])
+            if not self.row_counter:
+                log.info("No row_counter table, run sql/counters.sql for"
+                         " exact counts")
+
+        res = self.query(
+            "SELECT row_count FROM row_counter WHERE table_name = {};",
+            self.table, columns=['row_count']) if self.row_counter else None
+        if res:
+            return Count(res[0][0], EXACT)
+
+        log.debug("No row_counter for {}, estimating".format(self.table))
+        res = self.query(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = {}::regclass;",
+            self.table, columns=['reltuples'])
+        if res:
+            # reltuples is -1 for tables that have never been analyzed
+            return Count(max(res[0][0], 0), ESTIMATE)
+        else:
+            return Count(0, ESTIMATE)
+
+    def estimate(self, sql_string: str, *args) -> Count:
+        """ Get the planner's row estimate for a query without running it """
+
+        query = sql.SQL("EXPLAIN (FORMAT JSON) ") \
+            + self._assemble_simple(sql_string, *args)
+        res = self._execute(query, working_columns=['plan'])
+        if not res:
+            return Count(0, ESTIMATE)
+
+        plan = res[0][0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return Count(int(plan[0]['Plan']['Plan Rows']), ESTIMATE)
+
+    def _assemble_with_columns(self, sql_str, columns, *args, **kwargs):
+        """ rawl's, with each column from select_column() """
+        return sql.SQL(sql_str).format(
+            sql.SQL(', ').join([self.select_column(col) for col in columns]),
+            *[sql.Literal(a) for a in args])
+
+    def select_column(self, col: str) -> sql.Composable:
+        """ A column, alias.column or not, for a select list.  A '\\x'
+            varchar hash is turned into 0x hex by the query itself, so rows
+            need no reformatting once fetched.
+        """
+        column = sql.SQL('.').join([sql.Identifier(x) for x in col.split('.')])
+        if col.split('.')[-1] != 'hash' or not self.varchar_hashes():
+            return column
+        return sql.SQL("'0x' || substr({}, 3) AS {}").format(
+            column, sql.Identifier('hash'))
+
+    def varchar_hashes(self) -> bool:
+        """ Whether hash is '\\x' prefixed varchar, which it is until
+            sql/bytea.sql has turned it into bytea, read as 0x hex already.
+            Looked up once.
+        """
+        if self.varchar_hash is None:
+            if 'hash' not in self.columns:
+                self.varchar_hash = False
+                return False
+            res = self.query(
+                "SELECT data_type FROM information_schema.columns"
+                " WHERE table_name = {} AND column_name = 'hash';",
+                self.table, columns=['data_type'])
+            self.varchar_hash = not res or res[0][0] != 'bytea'
+            if self.varchar_hash:
+                log.info("{}.hash is not bytea, queries turn it into hex"
+                         " until sql/bytea.sql is run".format(self.table))
+        return self.varchar_hash
+
+    def iter_select(self, sql_string: str, columns: list, *args,
+                    batch_size: int=None, min_block=None):
+        """ Run a SELECT on a server-side cursor and yield the results in lists
+            of at most batch_size, so memory use stays flat however many rows
+            match.  Uses its own connection, which is closed when the
+            generator is exhausted or closed.  min_block routes it like
+            replicas.routing().
+        """
+
+        if batch_size is None:
+            batch_size = settings().cursor_batch
+
+        query = self._assemble_with_columns(sql_string, columns, *args)
+        dsn = self.router.pick(min_block).dsn
+        conn = psycopg2.connect(dsn, connection_factory=PreparingConnection)
+        try:
+            with conn.cursor(name='iter_' + self.table) as curs:
+                curs.itersize = batch_size
+                curs.execute(query)
+                while True:
+                    rows = curs.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield _results(rows, self.columns, self.record)
+        finally:
+            conn.close()
+
+
+def _results(rows: list, working_columns: list, record=None) -> list:
+    """ Turn rows into records if they have only the record's columns,
+        otherwise RawlResults the way rawl does
+    """
+    if record is not None and working_columns == record.columns:
+        return list(map(record, rows))
+    if record is not None and set(working_columns) <= set(record.columns):
+        return list(map(projection(record, tuple(working_columns)), rows))
+    names = [col.replace('.', '_') for col in working_columns]
+    return [RawlResult(working_columns, dict(zip(names, row))) for row in rows]
+
+
+class BlockModel(BaseModel):
+    # Value kinds used by the binary encoders, see encoders.COLUMN_TYPES
+    column_types = {
+        'block_number': 'int',
+        'block_timestamp': 'datetime',
+        'hash': 'hex',
+        'miner': 'hex',
+        'nonce': 'uint',
+        'difficulty': 'uint',
+        'gas_used': 'int',
+        'gas_limit': 'int',
+        'size': 'int',
+    }
+    record = Block
+
+    def __init__(self, dsn: str, timestamps: TimestampIndex=None,
+                 router: Router=None):
         super(BlockModel, self).__init__(dsn, table_name='block', 
-            columns=['block_number', 'block_timestamp', 'hash', 'miner', 
-                     'nonce', 'difficulty', 'gas_used', 'gas_limit', 'size'], 
-            pk_name='block_number')
+            columns=list(Block.columns),
+            pk_name='block_number', router=router)
+        # Optional in-memory index turning time ranges into number ranges
+        self.timestamps = timestamps
+
+    def get(self, block_number: int, fields: tuple=None) -> list:
+        """ Get a block, from a replica if one has it """
+
+        with routing(block_number):
+            return self.select_prepared('get',
+                "SELECT {} FROM block WHERE block_number = {};",
+                self.project(fields), block_number)
+
+    def _block_range(self, start_time: datetime, end_time: datetime) -> tuple:
+        """ Look up a time range in the timestamp index, if there is one """
+        if self.timestamps is None:
+            return None
+        return self.timestamps.block_range(start_time, end_time)
 
     def get_range(self, start: datetime, end: datetime) -> tuple:
         """ Get a range of blocks from start to end """
@@ -47,79 +365,220 @@ class BlockModel(RawlBase):
         if start > end:
             raise InvalidRange("start must come before end")
 
+        bounds = self._block_range(start, end)
+        if bounds is not None and bounds[1] is not None:
+            return bounds[:2]
+
         result = self.query(
-            "SELECT MIN(block_no), MAX(block_no) FROM block"
+            "SELECT MIN(block_number), MAX(block_number) FROM block"
             " WHERE block_timestamp BETWEEN {} AND {}",
             start, end)
 
         return (result[0][0], result[0][1])
 
-    def get_range_date(self, start_time, end_time, limit=DEFAULT_LIMIT, 
-                       offset=DEFAULT_OFFSET) -> list:
-        """ Get a range of blocks between two numbers """
+    def _date_filter(self, start_time, end_time) -> tuple:
+        """ Build the WHERE clause and arguments selecting blocks between two
+            times, or None if the timestamp index shows there are none
+        """
 
         if start_time > end_time:
             raise InvalidRange("start must come before end")
 
+        bounds = self._block_range(start_time, end_time)
+
+        if bounds is None:
+            return (" WHERE block_timestamp BETWEEN {} AND {}",
+                    [start_time, end_time])
+
+        first, last, _ = bounds
+
+        # The window is past the newest indexed block, so scan from there
+        if last is None:
+            return (" WHERE block_number >= {}"
+                    " AND block_timestamp BETWEEN {} AND {}",
+                    [first, start_time, end_time])
+
+        if first > last:
+            return None
+
+        return (" WHERE block_number BETWEEN {} AND {}"
+                " AND block_timestamp BETWEEN {} AND {}",
+                [first, last, start_time, end_time])
+
+    def get_range_date(self, start_time, end_time, limit=None, 
+                       offset=DEFAULT_OFFSET, fields: tuple=None) -> list:
+        """ Get a range of blocks between two numbers """
+
+        if limit is None:
+            limit = settings().page_limit
+
+        date_filter = self._date_filter(start_time, end_time)
+        if date_filter is None:
+            return []
+
+        where, args = date_filter
+        columns = self.project(fields)
         return self.select(
-            "SELECT {} FROM block"
-            " WHERE block_timestamp BETWEEN {} AND {}"
+            "SELECT {} FROM block" + where +
             " ORDER BY block_number LIMIT {} OFFSET {}",
-            self.columns, start_time, end_time, limit, offset)
+            columns, *args, limit, offset, columns=columns)
+
+    def iter_range_date(self, start_time, end_time):
+        """ Yield batches of blocks between two times """
+
+        date_filter = self._date_filter(start_time, end_time)
+        if date_filter is None:
+            return
 
-    def get_range_number(self, start, end, limit=DEFAULT_LIMIT, 
-                       offset=DEFAULT_OFFSET) -> list:
+        where, args = date_filter
+        yield from self.iter_select(
+            "SELECT {} FROM block" + where + " ORDER BY block_number",
+            self.columns, *args)
+
+    def get_range_number(self, start, end, limit=None, 
+                       offset=DEFAULT_OFFSET, fields: tuple=None) -> list:
         """ Get a range of blocks between two numbers """
 
+        if limit is None:
+            limit = settings().page_limit
+
         if start > end:
             raise InvalidRange("start must come before end")
 
-        return self.select(
+        with routing(end):
+            return self.select_prepared('range_number',
+                "SELECT {} FROM block"
+                " WHERE block_number BETWEEN {} AND {}"
+                " ORDER BY block_number LIMIT {} OFFSET {}",
+               self.project(fields), start, end, limit, offset)
+
+    def iter_range_number(self, start: int, end: int):
+        """ Yield batches of blocks between two numbers """
+
+        if start > end:
+            raise InvalidRange("start must come before end")
+
+        yield from self.iter_select(
             "SELECT {} FROM block"
             " WHERE block_number BETWEEN {} AND {}"
-            " ORDER BY block_number LIMIT {} OFFSET {}",
-           self.columns,  start, end, limit, offset)
+            " ORDER BY block_number",
+            self.columns, start, end, min_block=end)
+
+    def count_range_date(self, start_time, end_time) -> Count:
+        """ Count the blocks between two times, exactly if the timestamp index
+            covers the range
+        """
+
+        bounds = self._block_range(start_time, end_time)
+        if bounds is not None and bounds[2] is not None:
+            return Count(bounds[2], EXACT)
+
+        return self.estimate(
+            "SELECT 1 FROM block WHERE block_timestamp BETWEEN {} AND {}",
+            start_time, end_time)
+
+    def count_range_number(self, start, end) -> Count:
+        """ Estimate the blocks between two numbers """
+
+        return self.estimate(
+            "SELECT 1 FROM block WHERE block_number BETWEEN {} AND {}",
+            start, end)
+
+    def get_head(self):
+        """ Get the newest block's number, hash and timestamp (in seconds) """
+
+        with routing(PRIMARY):
+            res = self.query(
+                "SELECT block_number, hash,"
+                " extract(epoch FROM block_timestamp)::bigint"
+                " FROM block ORDER BY block_number DESC LIMIT 1;",
+                columns=['block_number', 'hash', 'block_timestamp'])
+        if res:
+            return Head(res[0][0], pg_varchar_to_hex(res[0][1]), res[0][2])
+        else:
+            return None
+
+    def get_hashes(self, start: int, end: int) -> dict:
+        """ Get the block number to hash of the blocks between two numbers,
+            as the primary has them
+        """
+
+        with routing(PRIMARY):
+            res = self.query(
+                "SELECT block_number, hash FROM block"
+                " WHERE block_number BETWEEN {} AND {};",
+                start, end, columns=['block_number', 'hash'])
+        return {row[0]: pg_varchar_to_hex(row[1]) for row in res}
 
     def get_latest(self) -> int:
         """ Get the latest block in the DB """
 
-        res = self.query("SELECT MAX(block_number) FROM block;")
+        with routing(PRIMARY):
+            res = self.query("SELECT MAX(block_number) FROM block;")
         if res is not None:
             return res[0][0]
         else:
             return 0
 
-class TransactionModel(RawlBase):
-    def __init__(self, dsn: str):
+class TransactionModel(BaseModel):
+    column_types = {
+        'hash': 'hex',
+        'block_number': 'int',
+        'from_address': 'hex',
+        'to_address': 'hex',
+        'value': 'wei',
+        'gas_price': 'wei',
+        'gas_limit': 'int',
+        'nonce': 'uint',
+        'input': 'hex',
+    }
+    record = Transaction
+
+    def __init__(self, dsn: str, router: Router=None):
         super(TransactionModel, self).__init__(dsn, table_name='transaction', 
-            columns=['hash', 'block_number', 'from_address', 'to_address',
-                     'value', 'gas_price', 'gas_limit', 'nonce', 'input'],
-            pk_name='hash')
-        # Deal with 'hash' column being in both tables
-        self.aliased_columns = ['t.' + x for x in self.columns]
-
-    def get_by_address(self, address:str, limit:int=DEFAULT_LIMIT,
-                       offset:int=DEFAULT_OFFSET) -> list:
+            columns=list(Transaction.columns),
+            pk_name='hash', router=router)
+
+    def aliased(self, fields: tuple=None) -> list:
+        """ The projected columns prefixed with the transaction table's alias,
+            as hash is in both tables when joined to block
+        """
+        return ['t.' + x for x in self.project(fields)]
+
+    def get(self, tx_hash: str, fields: tuple=None) -> list:
+        """ Get a transaction by 0x hash """
+
+        # '\\x' hex is bytea input, and how the hash is stored as varchar
+        return self.select_prepared('get',
+            "SELECT {} FROM transaction WHERE hash = {};",
+            self.project(fields), has_to_pg_varchar(tx_hash))
+
+    def get_by_address(self, address:str, limit:int=None,
+                       offset:int=DEFAULT_OFFSET, fields: tuple=None) -> list:
         """ Get a list of transactions for an address """
 
+        if limit is None:
+            limit = settings().page_limit
+
         if not is_address(address):
             raise ValueError("Address is invalid")
 
-        result = self.select(
+        result = self.select_prepared('by_address',
             "SELECT {} FROM transaction t JOIN block b USING (block_number)"
             " WHERE lower(from_address) = lower({})"
             " OR lower(to_address) = lower({})"
             " ORDER BY block_timestamp DESC LIMIT {} OFFSET {};",
-            self.aliased_columns, address, address, limit, offset)
-
-        result = results_hex_format(result, 'hash')
+            self.aliased(fields), address, address, limit, offset)
 
         return result
 
-    def get_from(self, address:str, limit:int=DEFAULT_LIMIT,
-                 offset:int=DEFAULT_OFFSET) -> list:
+    def get_from(self, address:str, limit:int=None,
+                 offset:int=DEFAULT_OFFSET, fields: tuple=None) -> list:
         """ Get a list of transactions for an address """
 
+        if limit is None:
+            limit = settings().page_limit
+
         if not is_address(address):
             raise ValueError("Address is invalid")
 
@@ -127,16 +586,18 @@ class TransactionModel(RawlBase):
             "SELECT {} FROM transaction t JOIN block b USING (block_number)"
             " WHERE lower(from_address) = lower({})"
             " ORDER BY block_timestamp DESC LIMIT {} OFFSET {};",
-            self.aliased_columns, address, limit, offset)
-
-        result = results_hex_format(result, 'hash')
+            self.aliased(fields), address, limit, offset,
+            columns=self.project(fields))
 
         return result
 
-    def get_to(self, address:str, limit:int=DEFAULT_LIMIT,
-                 offset:int=DEFAULT_OFFSET) -> list:
+    def get_to(self, address:str, limit:int=None,
+                 offset:int=DEFAULT_OFFSET, fields: tuple=None) -> list:
         """ Get a list of transactions for an address """
 
+        if limit is None:
+            limit = settings().page_limit
+
         if not is_address(address):
             raise ValueError("Address is invalid")
 
@@ -144,34 +605,134 @@ class TransactionModel(RawlBase):
             "SELECT {} FROM transaction t JOIN block b USING (block_number)"
             " WHERE lower(to_address) = lower({})"
             " ORDER BY block_timestamp DESC LIMIT {} OFFSET {};",
-            self.aliased_columns, address, limit, offset)
-
-        result = results_hex_format(result, 'hash')
+            self.aliased(fields), address, limit, offset,
+            columns=self.project(fields))
 
         return result
 
-    def get_block(self, block_number:int, limit:int=DEFAULT_LIMIT,
-                  offset:int=DEFAULT_OFFSET) -> list:
+    def get_block(self, block_number:int, limit:int=None,
+                  offset:int=DEFAULT_OFFSET, fields: tuple=None) -> list:
         """ Get transactions in a block """
 
-        result = self.select(
-            "SELECT {} FROM transaction t JOIN block b USING (block_number)"
-            " WHERE block_number = {}"
-            " ORDER BY block_timestamp DESC LIMIT {} OFFSET {};",
-            self.aliased_columns, block_number, limit, offset)
+        if limit is None:
+            limit = settings().page_limit
+
+        with routing(block_number):
+            result = self.select_prepared('block',
+                "SELECT {} FROM transaction t JOIN block b USING (block_number)"
+                " WHERE block_number = {}"
+                " ORDER BY block_timestamp DESC LIMIT {} OFFSET {};",
+                self.aliased(fields), block_number, limit, offset)
 
-        result = results_hex_format(result, 'hash')
+        return result
+
+    def get_block_range(self, start: int, end: int) -> list:
+        """ Get every transaction in a range of blocks """
+
+        if start > end:
+            raise InvalidRange("start must come before end")
+
+        with routing(end):
+            result = self.select(
+                "SELECT {} FROM transaction t"
+                " WHERE block_number BETWEEN {} AND {}"
+                " ORDER BY block_number;",
+                self.aliased(), start, end)
 
         return result
 
-    def get_count(self) -> int:
+    def iter_block_range(self, start: int, end: int):
+        """ Yield batches of the transactions in a range of blocks """
+
+        if start > end:
+            raise InvalidRange("start must come before end")
+
+        yield from self.iter_select(
+            "SELECT {} FROM transaction"
+            " WHERE block_number BETWEEN {} AND {}"
+            " ORDER BY block_number",
+            self.columns, start, end, min_block=end)
+
+    def iter_by_address(self, address: str, start: int, end: int):
+        """ Yield batches of transactions for an address in a range of blocks,
+            oldest first
+        """
+
+        if not is_address(address):
+            raise ValueError("Address is invalid")
+
+        yield from self.iter_select(
+            "SELECT {} FROM transaction"
+            " WHERE (lower(from_address) = lower({})"
+            " OR lower(to_address) = lower({}))"
+            " AND block_number BETWEEN {} AND {}"
+            " ORDER BY block_number",
+            self.columns, address, address, start, end, min_block=end)
+
+    def iter_from(self, address: str, start: int, end: int):
+        """ Yield batches of transactions sent from an address in a range of
+            blocks, oldest first
+        """
+
+        if not is_address(address):
+            raise ValueError("Address is invalid")
+
+        yield from self.iter_select(
+            "SELECT {} FROM transaction"
+            " WHERE lower(from_address) = lower({})"
+            " AND block_number BETWEEN {} AND {}"
+            " ORDER BY block_number",
+            self.columns, address, start, end, min_block=end)
+
+    def iter_to(self, address: str, start: int, end: int):
+        """ Yield batches of transactions sent to an address in a range of
+            blocks, oldest first
+        """
+
+        if not is_address(address):
+            raise ValueError("Address is invalid")
+
+        yield from self.iter_select(
+            "SELECT {} FROM transaction"
+            " WHERE lower(to_address) = lower({})"
+            " AND block_number BETWEEN {} AND {}"
+            " ORDER BY block_number",
+            self.columns, address, start, end, min_block=end)
+
+    def get_count(self) -> Count:
         """ Get the full count of transactions """
 
-        res = self.query("SELECT COUNT(hash) FROM transaction;")
-        if res is not None:
-            return res[0][0]
-        else:
-            return 0
+        return self.count_rows()
+
+    def count_by_address(self, address: str) -> Count:
+        """ Estimate the transactions for an address """
+
+        return self.estimate(
+            "SELECT 1 FROM transaction"
+            " WHERE lower(from_address) = lower({})"
+            " OR lower(to_address) = lower({})",
+            address, address)
+
+    def count_from(self, address: str) -> Count:
+        """ Estimate the transactions sent from an address """
+
+        return self.estimate(
+            "SELECT 1 FROM transaction WHERE lower(from_address) = lower({})",
+            address)
+
+    def count_to(self, address: str) -> Count:
+        """ Estimate the transactions sent to an address """
+
+        return self.estimate(
+            "SELECT 1 FROM transaction WHERE lower(to_address) = lower({})",
+            address)
+
+    def count_block(self, block_number: int) -> Count:
+        """ Estimate the transactions in a block """
+
+        return self.estimate(
+            "SELECT 1 FROM transaction WHERE block_number = {}",
+            block_number)
 
     def get_mean_gas_price(self, block_length) -> int:
         """ Get the mean gas price for the last X transactions """
@@ -198,3 +759,250 @@ class TransactionModel(RawlBase):
             return res[0][0]
         else:
             return 0
+
+
+class AggregateModel(BaseModel):
+    """ Time-bucketed block aggregates served from the block_aggregate rollup """
+    column_types = {
+        'bucket': 'datetime',
+        'block_count': 'int',
+        'transaction_count': 'int',
+        'gas_used': 'int',
+        'gas_limit': 'int',
+        'difficulty': 'uint',
+        'size': 'int',
+    }
+
+    def __init__(self, dsn: str, router: Router=None):
+        super(AggregateModel, self).__init__(dsn, table_name='block_aggregate',
+            columns=['bucket', 'block_count', 'transaction_count', 'gas_used',
+                     'gas_limit', 'difficulty', 'size'],
+            pk_name='bucket', router=router)
+
+    def get_range(self, resolution: str, start_time: datetime,
+                  end_time: datetime, limit: int=None,
+                  offset: int=DEFAULT_OFFSET) -> list:
+        """ Get the aggregate buckets overlapping a time range """
+
+        if limit is None:
+            limit = settings().page_limit
+
+        if resolution not in RESOLUTIONS:
+            raise ValueError("Unknown resolution")
+
+        if start_time > end_time:
+            raise InvalidRange("start must come before end")
+
+        return self.query(
+            "SELECT bucket, block_count, transaction_count, gas_used, gas_limit,"
+            " round(difficulty / block_count), size / block_count"
+            " FROM block_aggregate"
+            " WHERE resolution = {} AND bucket BETWEEN date_trunc({}, {}) AND {}"
+            " ORDER BY bucket LIMIT {} OFFSET {};",
+            resolution, resolution, start_time, end_time, limit, offset)
+
+    def get_refreshed(self, resolution: str) -> int:
+        """ Get the block number a resolution has been rolled up through """
+
+        res = self.query(
+            "SELECT block_number FROM rollup_state WHERE name = {};",
+            'block_aggregate_' + resolution, columns=['block_number'])
+        if res:
+            return res[0][0]
+        else:
+            return -1
+
+    def refresh(self, resolution: str, margin: int=None) -> int:
+        """ Recompute every bucket touched by blocks added since the last
+            refresh (less a margin for late transactions) and return the block
+            number the rollup is now current through.
+        """
+
+        if margin is None:
+            margin = settings().rollup_margin
+
+        if resolution not in RESOLUTIONS:
+            raise ValueError("Unknown resolution")
+
+        from_block = max(self.get_refreshed(resolution) - margin, -1)
+
+        res = self.query(
+            "SELECT date_trunc({}, MIN(block_timestamp)) FROM block"
+            " WHERE block_number > {};",
+            resolution, from_block, columns=['bucket'])
+        if not res or res[0][0] is None:
+            log.debug("No new blocks for {} rollup".format(resolution))
+            return from_block
+
+        first_bucket = res[0][0]
+
+        res = self.query(
+            "INSERT INTO block_aggregate (resolution, bucket, block_count,"
+            "  transaction_count, gas_used, gas_limit, difficulty, size,"
+            "  first_block, last_block)"
+            " SELECT {}, date_trunc({}, b.block_timestamp) AS bucket, COUNT(*),"
+            "  COALESCE(SUM(t.transaction_count), 0), SUM(b.gas_used),"
+            "  SUM(b.gas_limit), SUM(b.difficulty), SUM(b.size),"
+            "  MIN(b.block_number), MAX(b.block_number)"
+            " FROM block b LEFT JOIN ("
+            "  SELECT block_number, COUNT(*) AS transaction_count"
+            "  FROM transaction WHERE block_number >= ("
+            "   SELECT MIN(block_number) FROM block WHERE block_timestamp >= {})"
+            "  GROUP BY block_number) t USING (block_number)"
+            " WHERE b.block_timestamp >= {}"
+            " GROUP BY bucket"
+            " ON CONFLICT (resolution, bucket) DO UPDATE SET"
+            "  block_count = EXCLUDED.block_count,"
+            "  transaction_count = EXCLUDED.transaction_count,"
+            "  gas_used = EXCLUDED.gas_used,"
+            "  gas_limit = EXCLUDED.gas_limit,"
+            "  difficulty = EXCLUDED.difficulty,"
+            "  size = EXCLUDED.size,"
+            "  first_block = EXCLUDED.first_block,"
+            "  last_block = EXCLUDED.last_block"
+            " RETURNING last_block;",
+            resolution, resolution, first_bucket, first_bucket,
+            commit=True, columns=['last_block'])
+
+        last_block = max(r[0] for r in res)
+        log.info("Refreshed {} {} buckets through block {}".format(
+            len(res), resolution, last_block))
+
+        self.query(
+            "INSERT INTO rollup_state (name, block_number) VALUES ({}, {})"
+            " ON CONFLICT (name) DO UPDATE SET block_number = EXCLUDED.block_number"
+            " RETURNING block_number;",
+            'block_aggregate_' + resolution, last_block,
+            commit=True, columns=['block_number'])
+
+        return last_block
+
+
+class MinerModel(BaseModel):
+    """ Per-miner block statistics served from the miner_daily rollup """
+    column_types = {
+        'miner': 'hex',
+        'block_count': 'int',
+        'gas_used': 'int',
+        'share': 'number',
+    }
+
+    def __init__(self, dsn: str, router: Router=None):
+        super(MinerModel, self).__init__(dsn, table_name='miner_daily',
+            columns=['miner', 'block_count', 'gas_used', 'share'],
+            pk_name='miner', router=router)
+
+    def get_stats(self, start_time: datetime, end_time: datetime,
+                  miner: str=None, limit: int=None,
+                  offset: int=DEFAULT_OFFSET) -> list:
+        """ Get blocks mined, gas used and share of blocks per miner for a time
+            range.  Whole days inside the range are summed from the rollup and
+            only the partial days at either end are read from block.
+        """
+
+        if limit is None:
+            limit = settings().page_limit
+
+        if start_time > end_time:
+            raise InvalidRange("start must come before end")
+
+        midnight = dict(hour=0, minute=0, second=0, microsecond=0)
+        first_day = start_time.replace(**midnight)
+        if first_day < start_time:
+            first_day += timedelta(days=1)
+        # Block timestamps have second resolution, so a day is whole once the
+        # range reaches its last second
+        last_day = (end_time + timedelta(seconds=1)).replace(**midnight)
+        if first_day >= last_day:
+            first_day = last_day = start_time
+
+        miner_filter = ""
+        args = [first_day, last_day, start_time, first_day, last_day, end_time]
+        if miner is not None:
+            miner_filter = " WHERE miner = lower({})"
+            args.append(miner)
+
+        return self.query(
+            "SELECT miner, block_count, gas_used, share FROM ("
+            " SELECT miner, SUM(block_count) AS block_count,"
+            "  SUM(gas_used) AS gas_used,"
+            "  round(SUM(block_count)::numeric / SUM(SUM(block_count)) OVER (), 6)"
+            "   AS share"
+            " FROM ("
+            "  SELECT miner, block_count, gas_used FROM miner_daily"
+            "  WHERE day >= {} AND day < {}"
+            "  UNION ALL"
+            "  SELECT lower(miner), 1, gas_used FROM block"
+            "  WHERE (block_timestamp >= {} AND block_timestamp < {})"
+            "  OR (block_timestamp >= {} AND block_timestamp <= {})"
+            " ) stats GROUP BY miner) totals" + miner_filter +
+            " ORDER BY block_count DESC, miner LIMIT {} OFFSET {};",
+            *args, limit, offset)
+
+    def get_refreshed(self) -> int:
+        """ Get the block number the rollup has been refreshed through """
+
+        res = self.query(
+            "SELECT block_number FROM rollup_state WHERE name = 'miner_daily';",
+            columns=['block_number'])
+        if res:
+            return res[0][0]
+        else:
+            return -1
+
+    def refresh(self, margin: int=None) -> int:
+        """ Recompute every day touched by blocks added since the last refresh
+            and return the block number the rollup is now current through.
+        """
+
+        if margin is None:
+            margin = settings().rollup_margin
+
+        from_block = max(self.get_refreshed() - margin, -1)
+
+        res = self.query(
+            "SELECT date_trunc('day', MIN(block_timestamp)) FROM block"
+            " WHERE block_number > {};",
+            from_block, columns=['day'])
+        if not res or res[0][0] is None:
+            log.debug("No new blocks for miner rollup")
+            return from_block
+
+        first_day = res[0][0]
+
+        # Rows for a miner that no longer has blocks on a day (after a reorg)
+        # are removed in the same statement
+        res = self.query(
+            "WITH fresh AS ("
+            "  SELECT block_timestamp::date AS day, lower(miner) AS miner,"
+            "   COUNT(*) AS block_count, SUM(gas_used) AS gas_used,"
+            "   MAX(block_number) AS last_block"
+            "  FROM block WHERE block_timestamp >= {}"
+            "  GROUP BY 1, 2"
+            " ), upserted AS ("
+            "  INSERT INTO miner_daily (day, miner, block_count, gas_used, last_block)"
+            "  SELECT day, miner, block_count, gas_used, last_block FROM fresh"
+            "  ON CONFLICT (day, miner) DO UPDATE SET"
+            "   block_count = EXCLUDED.block_count,"
+            "   gas_used = EXCLUDED.gas_used,"
+            "   last_block = EXCLUDED.last_block"
+            "  RETURNING last_block"
+            " ), removed AS ("
+            "  DELETE FROM miner_daily m WHERE m.day >= {}::date"
+            "  AND NOT EXISTS ("
+            "   SELECT 1 FROM fresh f WHERE f.day = m.day AND f.miner = m.miner)"
+            " )"
+            " SELECT MAX(last_block) FROM upserted;",
+            first_day, first_day, commit=True, columns=['last_block'])
+
+        last_block = res[0][0]
+        log.info("Refreshed miner rollup through block {}".format(last_block))
+
+        self.query(
+            "INSERT INTO rollup_state (name, block_number)"
+            " VALUES ('miner_daily', {})"
+            " ON CONFLICT (name) DO UPDATE SET block_number = EXCLUDED.block_number"
+            " RETURNING block_number;",
+            last_block, commit=True, columns=['block_number'])
+
+        return last_block
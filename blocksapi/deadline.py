@@ -0,0 +1,82 @@
+""" Time limits for the queries of a request
+
+A Deadline is started when a request is handled.  Queries run while it is set
+with within() get the time left as their statement_timeout, and cancel()
+interrupts whatever is running, for when the client has gone away.
+"""
+import time
+import threading
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+class DeadlineExceeded(Exception):
+    """ The deadline passed before a query could start """
+
+
+class Deadline(object):
+    """ A point in time queries must finish by, and the connections running
+        them.  Without seconds there is no time limit, but it can still be
+        cancelled.
+    """
+    def __init__(self, seconds: float=None):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds if seconds else None
+        self.cancelled = False
+        self.connections = set()
+        self.lock = threading.Lock()
+
+    @property
+    def remaining(self) -> float:
+        if self.expires is None:
+            return None
+        return self.expires - time.monotonic()
+
+    def timeout_ms(self) -> int:
+        """ The statement_timeout for a query starting now, None for no limit """
+        if self.cancelled:
+            raise DeadlineExceeded("Cancelled")
+        if self.expires is None:
+            return None
+        remaining = self.remaining
+        if remaining <= 0:
+            raise DeadlineExceeded("Deadline of {}s passed".format(self.seconds))
+        # 0 would mean no timeout
+        return max(int(remaining * 1000), 1)
+
+    def attach(self, conn):
+        """ Track a connection running a query, so cancel() can interrupt it """
+        with self.lock:
+            self.connections.add(conn)
+        # Cancelled between the timeout check and now
+        if self.cancelled:
+            conn.cancel()
+
+    def detach(self, conn):
+        with self.lock:
+            self.connections.discard(conn)
+
+    def cancel(self):
+        """ Stop running queries and refuse new ones """
+        self.cancelled = True
+        with self.lock:
+            connections = list(self.connections)
+        for conn in connections:
+            conn.cancel()
+
+
+@contextmanager
+def within(deadline: Deadline):
+    """ Apply deadline to queries made in this thread """
+    previous = getattr(_local, 'deadline', None)
+    _local.deadline = deadline
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def current_deadline() -> Deadline:
+    """ The deadline set by within() in this thread, None if not set """
+    return getattr(_local, 'deadline', None)
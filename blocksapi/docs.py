@@ -55,16 +55,66 @@ JSON_SCHEMA = [
             "properties": {
                 "message": {
                     "type": "string",
-                    "description": "A description of the health of the API.  Good: 'ok'"
+                    "description": "A description of the health of the API.  Good: 'ok'.  'stale' if the indexer has fallen behind"
                 },
                 "block_number": {
                     "type": "integer",
                     "description": "The current max block the API knows about."
+                },
+                "lag": {
+                    "type": "integer",
+                    "description": "Seconds since the current max block was mined."
+                },
+                "replicas": {
+                    "type": "array",
+                    "description": "Read replicas, when configured",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "name": {"type": "string"},
+                            "block_number": {"type": "integer"},
+                            "lag": {
+                                "type": "integer",
+                                "description": "Blocks behind the primary"
+                            },
+                            "ejected": {"type": "boolean"}
+                        }
+                    }
                 }
             },
             "required": ["message", "block_number"]
         }
     },
+    {
+        "uri": "/metrics",
+        "method": "GET",
+        "description": "Counters for this worker since it started",
+        "request": None,
+        "response": {
+            "title": "Response",
+            "type": "object",
+            "properties": {
+                "counters": {
+                    "type": "object",
+                    "description": "Counter name to value.  queries_executed and queries_coalesced count queries run and those shared with an identical query in flight.  deadline_exceeded (504s), deadline_rejected (503s) and queries_cancelled count queries stopped early, and queries_shed those refused over the concurrency limit (503s)",
+                    "additionalProperties": {"type": "integer"}
+                },
+                "in_flight": {
+                    "type": "integer",
+                    "description": "Distinct queries running now"
+                },
+                "concurrency": {
+                    "type": "object",
+                    "description": "The adaptive limit of queries running at once and how many are",
+                    "properties": {
+                        "limit": {"type": "number"},
+                        "in_flight": {"type": "integer"}
+                    }
+                }
+            },
+            "required": ["counters", "in_flight", "concurrency"]
+        }
+    },
     {
         "uri": "/block",
         "method": "POST",
@@ -74,14 +124,17 @@ JSON_SCHEMA = [
             "type": "object",
             "properties": {
                 "block_number": {
-                    "type": "number"
+                    "type": "integer",
+                    "minimum": 0
                 },
                 "start": {
-                    "type": "number",
+                    "type": "integer",
+                    "minimum": 0,
                     "description": "The starting block number of the range"
                 },
                 "end": {
-                    "type": "number",
+                    "type": "integer",
+                    "minimum": 0,
                     "description": "The ending block number of the range. (Required when start is provided)",
                 },
                 "start_time": {
@@ -93,9 +146,30 @@ JSON_SCHEMA = [
                     "format": "date-time",
                     "type": "string",
                     "description": "The ending date time of the range. (Required when start_time is provided)",
+                },
+                "fields": {
+                    "type": "array",
+                    "items": {
+                        "type": "string",
+                        "enum": ["block_number", "block_timestamp", "hash",
+                                 "miner", "nonce", "difficulty", "gas_used",
+                                 "gas_limit", "size"]
+                    },
+                    "description": "Only return these columns, as a list or comma separated.  Defaults to all of them"
+                },
+                "page": {
+                    "type": "integer",
+                    "minimum": 0,
+                    "default": 0,
+                    "description": "The page of results to retrieve"
                 }
             },
-            "required": []
+            "required": [],
+            "anyOf": [
+                {"title": "block", "required": ["block_number"]},
+                {"title": "range_number", "required": ["start", "end"]},
+                {"title": "range_date", "required": ["start_time", "end_time"]}
+            ]
         },
         "response": {
             "title": "Response",
@@ -106,6 +180,16 @@ JSON_SCHEMA = [
                 },
                 "pages": {
                     "type": "number",
+                    "description": "The total pages available, from total"
+                },
+                "total": {
+                    "type": "number",
+                    "description": "The number of blocks matching the request"
+                },
+                "total_type": {
+                    "type": "string",
+                    "enum": ["exact", "estimate"],
+                    "description": "Whether total is exact or a planner estimate"
                 },
                 "results": {
                     "type": "array",
@@ -166,108 +250,301 @@ JSON_SCHEMA = [
             "required": ["page", "pages", "result"]
         }
     },
-    # {
-    #     "uri": "/transaction",
-    #     "method": "POST",
-    #     "description": "Query for transactions",
-    #     "request": {
-    #         "title": "Request",
-    #         "type": "object",
-    #         "properties": {
-    #             "block_number": {
-    #                 "type": "number",
-    #                 "description": "The block the tx was mined in."
-    #             },
-    #             "hash": {
-    #                 "type": "string",
-    #                 "description": "The transaction hash."
-    #             },
-    #             "from_address": {
-    #                 "type": "string",
-    #                 "description": "The address the transaction was sent from."
-    #             },
-    #             "to_address": {
-    #                 "type": "string",
-    #                 "description": "The address the transaction was sent to.",
-    #             },
-    #             "address": {
-    #                 "type": "string",
-    #                 "description": "The address the transaction was sent from or to."
-    #             }
-    #         },
-    #         "required": []
-    #     },
-    #     "response": {
-    #         "title": "Response",
-    #         "type": "object",
-    #         "properties": {
-    #             "page": {
-    #                 "type": "number",
-    #                 "description": "The page number currently being served."
-    #             },
-    #             "pages": {
-    #                 "type": "number",
-    #                 "description": "The total pages available."
-    #             },
-    #             "results": {
-    #                 "type": "array",
-    #                 "items": {
-    #                     "type": "object",
-    #                     "properties": {
-    #                         "hash": {
-    #                             "type": "string",
-    #                             "description": "The sha3 hash of the transaction."
-    #                         },
-    #                         "block_number": {
-    #                             "type": "number",
-    #                             "description": "The block the tx was mined in."
-    #                         },
-    #                         "from_address": {
-    #                             "type": "string",
-    #                             "description": "The address of the acount that signed the tx."
-    #                         },
-    #                         "to_address": {
-    #                             "type": "string",
-    #                             "description": "The destination account or contract for the tx."
-    #                         },
-    #                         "value": {
-    #                             "type": "number",
-    #                             "description": "The amount of wei sent."
-    #                         },
-    #                         "gas_price": {
-    #                             "type": "number",
-    #                             "description": "The gas price in wei."
-    #                         },
-    #                         "gas_limit": {
-    #                             "type": "number",
-    #                             "description": "The gas limit for the transaction."
-    #                         },
-    #                         "nonce": {
-    #                             "type": "number",
-    #                             "description": "The nonce for the transaction."
-    #                         },
-    #                         "input": {
-    #                             "type": "string",
-    #                             "description": "The input data for the tx."
-    #                         }
-    #                     },
-    #                     "required": [
-    #                         "hash",
-    #                         "block_number",
-    #                         "from_address",
-    #                         "to_address",
-    #                         "value",
-    #                         "gas_price",
-    #                         "gas_limit",
-    #                         "nonce",
-    #                         "input"
-    #                     ]
-    #                 }
-    #             }
-    #         },
-    #         "required": ["page", "pages", "result"]
-    #     }
-    # },
+    {
+        "uri": "/aggregate",
+        "method": "POST",
+        "description": "Per-interval block aggregates over a time range",
+        "request": {
+            "title": "Request",
+            "type": "object",
+            "properties": {
+                "interval": {
+                    "type": "string",
+                    "enum": ["minute", "hour", "day"],
+                    "default": "hour",
+                    "description": "The bucket size.  Defaults to hour"
+                },
+                "start_time": {
+                    "format": "date-time",
+                    "type": "string",
+                    "description": "The start date time of the range"
+                },
+                "end_time": {
+                    "format": "date-time",
+                    "type": "string",
+                    "description": "The ending date time of the range"
+                },
+                "page": {
+                    "type": "integer",
+                    "minimum": 0,
+                    "default": 0,
+                    "description": "The page of results to retrieve"
+                }
+            },
+            "required": ["start_time", "end_time"],
+            "anyOf": [
+                {"title": "range", "required": ["start_time", "end_time"]}
+            ]
+        },
+        "response": {
+            "title": "Response",
+            "type": "object",
+            "properties": {
+                "page": {
+                    "type": "number"
+                },
+                "interval": {
+                    "type": "string"
+                },
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "bucket": {
+                                "format": "date-time",
+                                "type": "string",
+                                "description": "The start of the bucket, UTC"
+                            },
+                            "block_count": {
+                                "type": "number",
+                                "description": "Blocks mined in the bucket"
+                            },
+                            "transaction_count": {
+                                "type": "number",
+                                "description": "Transactions mined in the bucket"
+                            },
+                            "gas_used": {
+                                "type": "number",
+                                "description": "Total gas used by the bucket's blocks"
+                            },
+                            "gas_limit": {
+                                "type": "number",
+                                "description": "Total gas limit of the bucket's blocks"
+                            },
+                            "difficulty": {
+                                "type": "number",
+                                "description": "The mean block difficulty"
+                            },
+                            "size": {
+                                "type": "number",
+                                "description": "The mean block size"
+                            }
+                        },
+                        "required": [
+                            "bucket",
+                            "block_count",
+                            "transaction_count",
+                            "gas_used",
+                            "gas_limit",
+                            "difficulty",
+                            "size"
+                        ]
+                    }
+                }
+            },
+            "required": ["page", "interval", "results"]
+        }
+    },
+    {
+        "uri": "/miner",
+        "method": "POST",
+        "description": "Blocks mined and gas used per miner over a time range",
+        "request": {
+            "title": "Request",
+            "type": "object",
+            "properties": {
+                "start_time": {
+                    "format": "date-time",
+                    "type": "string",
+                    "description": "The start date time of the range"
+                },
+                "end_time": {
+                    "format": "date-time",
+                    "type": "string",
+                    "description": "The ending date time of the range"
+                },
+                "miner": {
+                    "type": "string",
+                    "format": "address",
+                    "description": "Only return statistics for this miner address"
+                },
+                "page": {
+                    "type": "integer",
+                    "minimum": 0,
+                    "default": 0,
+                    "description": "The page of results to retrieve"
+                }
+            },
+            "required": ["start_time", "end_time"],
+            "anyOf": [
+                {"title": "stats", "required": ["start_time", "end_time"]}
+            ]
+        },
+        "response": {
+            "title": "Response",
+            "type": "object",
+            "properties": {
+                "page": {
+                    "type": "number"
+                },
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "miner": {
+                                "type": "string",
+                                "description": "The miner address, lower case"
+                            },
+                            "block_count": {
+                                "type": "number",
+                                "description": "Blocks mined in the range"
+                            },
+                            "gas_used": {
+                                "type": "number",
+                                "description": "Total gas used by the miner's blocks"
+                            },
+                            "share": {
+                                "type": "number",
+                                "description": "Fraction of all blocks in the range mined by this miner"
+                            }
+                        },
+                        "required": ["miner", "block_count", "gas_used", "share"]
+                    }
+                }
+            },
+            "required": ["page", "results"]
+        }
+    },
+    {
+        "uri": "/subscribe",
+        "method": "GET",
+        "description": "WebSocket pushing new blocks and transactions for watched addresses as they are indexed",
+        "request": {
+            "title": "Message",
+            "type": "object",
+            "properties": {
+                "subscribe": {
+                    "type": "string",
+                    "enum": ["blocks", "transactions"],
+                    "description": "The topic to subscribe to"
+                },
+                "unsubscribe": {
+                    "type": "string",
+                    "enum": ["blocks", "transactions"],
+                    "description": "The topic to unsubscribe from"
+                },
+                "addresses": {
+                    "type": "array",
+                    "items": {
+                        "type": "string"
+                    },
+                    "description": "Addresses to (un)watch for the transactions topic"
+                }
+            },
+            "required": []
+        },
+        "response": {
+            "title": "Message",
+            "type": "object",
+            "properties": {
+                "type": {
+                    "type": "string",
+                    "enum": ["block", "transaction", "subscribed", "unsubscribed", "error"],
+                    "description": "The kind of message"
+                },
+                "result": {
+                    "type": "object",
+                    "description": "The block or transaction, in the same form as /block and /transaction"
+                },
+                "topic": {
+                    "type": "string",
+                    "description": "The topic of a subscribed or unsubscribed message"
+                },
+                "addresses": {
+                    "type": "array",
+                    "items": {
+                        "type": "string"
+                    },
+                    "description": "Every address now watched, in subscribed and unsubscribed messages"
+                },
+                "message": {
+                    "type": "string",
+                    "description": "What went wrong, in error messages"
+                }
+            },
+            "required": ["type"]
+        }
+    },
+    {
+        "uri": "/export",
+        "method": "POST",
+        "description": "Stream a range of blocks or transactions as CSV, JSON lines or Parquet, in block number order",
+        "request": {
+            "title": "Request",
+            "type": "object",
+            "properties": {
+                "type": {
+                    "type": "string",
+                    "enum": ["block", "transaction"],
+                    "default": "block",
+                    "description": "What to export.  Defaults to block"
+                },
+                "format": {
+                    "type": "string",
+                    "enum": ["csv", "jsonl", "parquet"],
+                    "default": "csv",
+                    "description": "The file format.  Defaults to csv"
+                },
+                "address": {
+                    "type": "string",
+                    "format": "address",
+                    "description": "Only export transactions sent from or to this address"
+                },
+                "from_address": {
+                    "type": "string",
+                    "format": "address",
+                    "description": "Only export transactions sent from this address"
+                },
+                "to_address": {
+                    "type": "string",
+                    "format": "address",
+                    "description": "Only export transactions sent to this address"
+                },
+                "start": {
+                    "type": "integer",
+                    "minimum": 0,
+                    "description": "The first block number.  To resume an export, the last block received"
+                },
+                "end": {
+                    "type": "integer",
+                    "minimum": 0,
+                    "description": "The last block number.  Defaults to the newest block"
+                },
+                "start_time": {
+                    "format": "date-time",
+                    "type": "string",
+                    "description": "The start date time of the range"
+                },
+                "end_time": {
+                    "format": "date-time",
+                    "type": "string",
+                    "description": "The ending date time of the range. (Required when start_time is provided)"
+                }
+            },
+            "required": [],
+            "anyOf": [
+                {"title": "range_number", "required": ["start"]},
+                {"title": "range_date", "required": ["start_time", "end_time"]}
+            ]
+        },
+        "response": {
+            "title": "Response",
+            "type": "string",
+            "description": "The file.  X-Export-Start and X-Export-End headers give the block range"
+        }
+    },
     # {
     #     "uri": "/gas-price",
     #     "method": "GET",
@@ -298,4 +575,188 @@ JSON_SCHEMA = [
     #         "required": ["results"]
     #     }
     # },
-]
\ No newline at end of file
+]
+
+# Endpoints not routed yet, and admin endpoints.  Not listed by /, but their
+# handlers validate requests against them.
+UNLISTED_SCHEMA = [
+    {
+        "uri": "/transaction",
+        "method": "POST",
+        "description": "Query for transactions",
+        "request": {
+            "title": "Request",
+            "type": "object",
+            "properties": {
+                "block_number": {
+                    "type": "integer",
+                    "minimum": 0,
+                    "description": "The block the tx was mined in."
+                },
+                "hash": {
+                    "type": "string",
+                    "format": "hash",
+                    "description": "The transaction hash."
+                },
+                "from_address": {
+                    "type": "string",
+                    "format": "address",
+                    "description": "The address the transaction was sent from."
+                },
+                "to_address": {
+                    "type": "string",
+                    "format": "address",
+                    "description": "The address the transaction was sent to.",
+                },
+                "address": {
+                    "type": "string",
+                    "format": "address",
+                    "description": "The address the transaction was sent from or to."
+                },
+                "fields": {
+                    "type": "array",
+                    "items": {
+                        "type": "string",
+                        "enum": ["hash", "block_number", "from_address",
+                                 "to_address", "value", "gas_price",
+                                 "gas_limit", "nonce", "input"]
+                    },
+                    "description": "Only return these columns, as a list or comma separated.  Defaults to all of them"
+                },
+                "input_limit": {
+                    "type": "integer",
+                    "minimum": 0,
+                    "description": "Cut input data longer than this many bytes, setting input_truncated"
+                },
+                "page": {
+                    "type": "integer",
+                    "minimum": 0,
+                    "default": 0,
+                    "description": "The page of results to retrieve"
+                }
+            },
+            "required": [],
+            "anyOf": [
+                {"title": "hash", "required": ["hash"]},
+                {"title": "block_number", "required": ["block_number"]},
+                {"title": "from_address", "required": ["from_address"]},
+                {"title": "to_address", "required": ["to_address"]},
+                {"title": "address", "required": ["address"]}
+            ]
+        },
+        "response": {
+            "title": "Response",
+            "type": "object",
+            "properties": {
+                "page": {
+                    "type": "number",
+                    "description": "The page number currently being served."
+                },
+                "pages": {
+                    "type": "number",
+                    "description": "The total pages available."
+                },
+                "total": {
+                    "type": "number",
+                    "description": "The number of transactions matching the request."
+                },
+                "total_type": {
+                    "type": "string",
+                    "enum": ["exact", "estimate"],
+                    "description": "Whether total is exact or a planner estimate."
+                },
+                "input_truncated": {
+                    "type": "boolean",
+                    "description": "Whether input_limit cut the input of any results."
+                },
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "hash": {
+                                "type": "string",
+                                "description": "The sha3 hash of the transaction."
+                            },
+                            "block_number": {
+                                "type": "number",
+                                "description": "The block the tx was mined in."
+                            },
+                            "from_address": {
+                                "type": "string",
+                                "description": "The address of the acount that signed the tx."
+                            },
+                            "to_address": {
+                                "type": "string",
+                                "description": "The destination account or contract for the tx."
+                            },
+                            "value": {
+                                "type": "number",
+                                "description": "The amount of wei sent."
+                            },
+                            "gas_price": {
+                                "type": "number",
+                                "description": "The gas price in wei."
+                            },
+                            "gas_limit": {
+                                "type": "number",
+                                "description": "The gas limit for the transaction."
+                            },
+                            "nonce": {
+                                "type": "number",
+                                "description": "The nonce for the transaction."
+                            },
+                            "input": {
+                                "type": "string",
+                                "description": "The input data for the tx."
+                            }
+                        },
+                        "required": [
+                            "hash",
+                            "block_number",
+                            "from_address",
+                            "to_address",
+                            "value",
+                            "gas_price",
+                            "gas_limit",
+                            "nonce",
+                            "input"
+                        ]
+                    }
+                }
+            },
+            "required": ["page", "pages", "result"]
+        }
+    },
+    {
+        "uri": "/admin/profile",
+        "method": "POST",
+        "description": "Sample the stacks of every thread in the worker answering.  Needs the admin_token in the X-Admin-Token header",
+        "request": {
+            "title": "Request",
+            "type": "object",
+            "properties": {
+                "seconds": {
+                    "type": "integer",
+                    "minimum": 1,
+                    "maximum": 300,
+                    "default": 10,
+                    "description": "How long to sample for"
+                },
+                "hz": {
+                    "type": "integer",
+                    "minimum": 1,
+                    "maximum": 1000,
+                    "default": 100,
+                    "description": "Samples a second"
+                }
+            },
+            "required": []
+        },
+        "response": {
+            "title": "Response",
+            "type": "string",
+            "description": "Collapsed stacks: each distinct stack, outermost frame first and separated by semicolons, then the number of samples it was in"
+        }
+    }
+]
@@ -0,0 +1,239 @@
+""" Response encodings negotiated from the Accept header
+
+JSON is always available.  MessagePack, CBOR and Arrow IPC are offered when
+msgpack, cbor2 and pyarrow are installed (pip install blocksapi[binary]).  The
+binary encodings send hashes, addresses and input data as raw bytes and are
+built per column from each model's column_types.
+"""
+import json
+import decimal
+from importlib.util import find_spec
+from datetime import datetime, timezone
+from functools import lru_cache
+from collections import namedtuple
+from rawl import RawlResult
+from .db import JSONEncoder
+from .records import Record
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+# pyarrow is slow to import, so it's only looked for here and imported when
+# first used
+HAS_ARROW = find_spec('pyarrow') is not None
+
+Format = namedtuple('Format', ['name', 'content_type', 'aliases'])
+
+JSON = Format('json', 'application/json', ())
+MSGPACK = Format('msgpack', 'application/msgpack', ('application/x-msgpack',))
+CBOR = Format('cbor', 'application/cbor', ())
+ARROW = Format('arrow', 'application/vnd.apache.arrow.stream', ())
+
+# In order of preference when the client accepts several equally
+FORMATS = [JSON]
+if msgpack is not None:
+    FORMATS.append(MSGPACK)
+if cbor2 is not None:
+    FORMATS.append(CBOR)
+if HAS_ARROW:
+    FORMATS.append(ARROW)
+
+# Column name to kind, registered from the models.  Kinds are int, uint (may
+# not fit a signed 64 bit int), wei (may not fit 64 bits at all), number,
+# hex, datetime and string.
+COLUMN_TYPES = {}
+
+
+def register_columns(column_types: dict):
+    """ Add a model's column kinds to the registry """
+    for column, kind in column_types.items():
+        if COLUMN_TYPES.get(column, kind) != kind:
+            raise ValueError("Column {} is registered as {}".format(
+                column, COLUMN_TYPES[column]))
+        COLUMN_TYPES[column] = kind
+    make_row_encoder.cache_clear()
+
+
+def negotiate(accept: str) -> Format:
+    """ Pick the best available format for an Accept header, JSON if none of
+        them are acceptable
+    """
+    if not accept:
+        return JSON
+
+    best = None
+    best_q = 0
+    for part in accept.split(','):
+        params = part.strip().split(';')
+        media_type = params[0].strip().lower()
+        q = 1.0
+        for param in params[1:]:
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0
+        for fmt in FORMATS:
+            if media_type in (fmt.content_type,) + fmt.aliases \
+                    and q > best_q:
+                best, best_q = fmt, q
+    return best or JSON
+
+
+def _hex(v):
+    if v is None:
+        return None
+    if v[:2] in ('0x', '\\x'):
+        v = v[2:]
+    return bytes.fromhex(v)
+
+def _int(v):
+    return None if v is None else int(v)
+
+def _wei_str(v):
+    """ MessagePack ints stop at 64 bits, so send anything larger as a string """
+    if v is None:
+        return None
+    v = int(v)
+    return v if v < 2 ** 64 else str(v)
+
+def _number(v):
+    if type(v) == decimal.Decimal:
+        return int(v) if v == v.to_integral_value() else float(v)
+    return v
+
+def _datetime(v):
+    if isinstance(v, datetime) and v.tzinfo is None:
+        return v.replace(tzinfo=timezone.utc)
+    return v
+
+CONVERTERS = {
+    'int': _int,
+    'uint': _int,
+    'wei': _int,
+    'number': _number,
+    'hex': _hex,
+    'datetime': _datetime,
+    'string': lambda v: v,
+}
+
+
+@lru_cache(maxsize=64)
+def make_row_encoder(columns: tuple, bigints: bool=True):
+    """ Build a function turning a row with these columns into a dict of
+        binary-friendly values.  Without bigints, wei values too large for 64
+        bits become strings.
+    """
+    converters = []
+    for col in columns:
+        kind = COLUMN_TYPES.get(col, 'number')
+        if kind == 'wei' and not bigints:
+            converters.append((col, _wei_str))
+        else:
+            converters.append((col, CONVERTERS[kind]))
+
+    def encode_row(row):
+        return {col: convert(row[col]) for col, convert in converters}
+
+    return encode_row
+
+
+def _plain(o, bigints=True):
+    """ Convert a response value to types the binary encoders understand """
+    if isinstance(o, dict):
+        return {k: _plain(v, bigints) for k, v in o.items()}
+    elif isinstance(o, (list, tuple)):
+        if o and isinstance(o[0], (RawlResult, Record)):
+            encode_row = make_row_encoder(tuple(o[0].columns), bigints)
+            return [encode_row(row) for row in o]
+        return [_plain(v, bigints) for v in o]
+    elif isinstance(o, (RawlResult, Record)):
+        return make_row_encoder(tuple(o.columns), bigints)(o)
+    elif isinstance(o, datetime):
+        return _datetime(o)
+    elif isinstance(o, decimal.Decimal):
+        return _number(o)
+    return o
+
+
+def _arrow_type(kind):
+    import pyarrow
+    return {
+        'int': pyarrow.int64(),
+        'uint': pyarrow.uint64(),
+        'wei': pyarrow.decimal128(38, 0),
+        'number': pyarrow.float64(),
+        'hex': pyarrow.binary(),
+        'datetime': pyarrow.timestamp('s', tz='UTC'),
+        'string': pyarrow.string(),
+    }[kind]
+
+
+def arrow_batch(rows: list, columns: list):
+    """ Build an Arrow record batch from rows with the given columns """
+    import pyarrow
+    arrays = []
+    for col in columns:
+        kind = COLUMN_TYPES.get(col, 'number')
+        values = [row[col] for row in rows]
+        if kind == 'hex':
+            values = [_hex(v) for v in values]
+        elif kind == 'wei':
+            values = [None if v is None else decimal.Decimal(v) for v in values]
+        elif kind in ('int', 'uint'):
+            values = [_int(v) for v in values]
+        elif kind == 'number':
+            values = [None if v is None else float(v) for v in values]
+        arrays.append(pyarrow.array(values, type=_arrow_type(kind)))
+
+    return pyarrow.record_batch(arrays, names=columns)
+
+
+def arrow_schema(columns: list):
+    """ The Arrow schema arrow_batch produces for these columns """
+    import pyarrow
+    return pyarrow.schema([(col, _arrow_type(COLUMN_TYPES.get(col, 'number')))
+                           for col in columns])
+
+
+def _encode_arrow(response: dict) -> bytes:
+    """ Results as a single record batch, the rest of the response as JSON in
+        the schema metadata
+    """
+    import pyarrow.ipc
+    rows = response.get('results')
+    envelope = {k: v for k, v in response.items() if k != 'results'}
+    metadata = {'response': json.dumps(envelope, cls=JSONEncoder)}
+
+    batch = arrow_batch(rows, list(rows[0].columns))
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, batch.schema.with_metadata(metadata)) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def is_tabular(response: dict) -> bool:
+    """ Whether a response has rows Arrow can encode """
+    rows = response.get('results')
+    return isinstance(rows, list) and len(rows) > 0 \
+        and isinstance(rows[0], (RawlResult, Record))
+
+
+def encode(fmt: Format, response: dict):
+    """ Encode a response dict in a negotiated format """
+    if fmt is MSGPACK:
+        return msgpack.packb(_plain(response, bigints=False), use_bin_type=True,
+                             datetime=True)
+    elif fmt is CBOR:
+        return cbor2.dumps(_plain(response))
+    elif fmt is ARROW:
+        return _encode_arrow(response)
+    return json.dumps(response, cls=JSONEncoder)
@@ -0,0 +1,199 @@
+""" Bulk export of block and transaction ranges as CSV, JSON lines or Parquet
+
+Rows are streamed from a server-side cursor in block number order, so memory
+use is constant however large the range.  An interrupted export can be resumed
+by starting again from the last block received; that block is sent again in
+full, so drop its rows from the partial output first.
+
+Also available from the command line:
+
+    blocksapi-export --type transaction --start 46147 --end 50000 > txs.csv
+"""
+import io
+import csv
+import sys
+import argparse
+from datetime import datetime
+from .config import configure_logging, settings
+from .db import JSONEncoder, BlockModel, TransactionModel
+from .replicas import Router
+from .encoders import HAS_ARROW, arrow_batch, arrow_schema, register_columns
+from .validate import be_datetime
+
+
+class CSVExporter(object):
+    """ Encodes batches of rows as CSV, with a header row first """
+    content_type = 'text/csv'
+    extension = 'csv'
+
+    def __init__(self, columns: list):
+        self.columns = columns
+        self.header = True
+
+    def write(self, rows: list) -> bytes:
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        if self.header:
+            writer.writerow(self.columns)
+            self.header = False
+        for row in rows:
+            writer.writerow([self._value(row[col]) for col in self.columns])
+        return buf.getvalue().encode('utf-8')
+
+    def close(self) -> bytes:
+        if self.header:
+            return self.write([])
+        return b''
+
+    @staticmethod
+    def _value(v):
+        if isinstance(v, datetime):
+            return v.isoformat()
+        return v
+
+
+class JSONLinesExporter(object):
+    """ Encodes batches of rows as newline delimited JSON objects """
+    content_type = 'application/x-ndjson'
+    extension = 'jsonl'
+
+    def __init__(self, columns: list):
+        self.columns = columns
+        self.encoder = JSONEncoder()
+
+    def write(self, rows: list) -> bytes:
+        return ''.join(self.encoder.encode(row) + '\n'
+                       for row in rows).encode('utf-8')
+
+    def close(self) -> bytes:
+        return b''
+
+
+class _Chunks(io.RawIOBase):
+    """ A write-only file collecting bytes until drained """
+    def __init__(self):
+        self.parts = []
+        self.written = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.parts.append(bytes(b))
+        self.written += len(b)
+        return len(b)
+
+    def tell(self):
+        return self.written
+
+    def drain(self) -> bytes:
+        out = b''.join(self.parts)
+        self.parts = []
+        return out
+
+
+class ParquetExporter(object):
+    """ Encodes batches of rows as row groups of a Parquet file """
+    content_type = 'application/vnd.apache.parquet'
+    extension = 'parquet'
+
+    def __init__(self, columns: list):
+        import pyarrow.parquet
+        self.columns = columns
+        self.sink = _Chunks()
+        self.writer = pyarrow.parquet.ParquetWriter(self.sink,
+                                                    arrow_schema(columns))
+
+    def write(self, rows: list) -> bytes:
+        import pyarrow
+        batch = arrow_batch(rows, self.columns)
+        self.writer.write_table(pyarrow.Table.from_batches([batch]))
+        return self.sink.drain()
+
+    def close(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+
+EXPORTERS = {'csv': CSVExporter, 'jsonl': JSONLinesExporter}
+if HAS_ARROW:
+    EXPORTERS['parquet'] = ParquetExporter
+
+
+# Transaction filters an export accepts, and the model iterator for each
+ADDRESS_FILTERS = {
+    'address': 'iter_by_address',
+    'from_address': 'iter_from',
+    'to_address': 'iter_to',
+}
+
+
+def export_batches(blocks: BlockModel, transactions: TransactionModel,
+                   kind: str, start: int, end: int, filters: dict=None):
+    """ Get the model and batch iterator for an export.  filters may hold one
+        of ADDRESS_FILTERS for transaction exports.
+    """
+    if kind == 'block':
+        return blocks, blocks.iter_range_number(start, end)
+
+    for name, method in ADDRESS_FILTERS.items():
+        if filters and filters.get(name):
+            batches = getattr(transactions, method)(filters[name], start, end)
+            return transactions, batches
+
+    return transactions, transactions.iter_block_range(start, end)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export blocks or transactions")
+    parser.add_argument('--type', choices=['block', 'transaction'],
+                        default='block')
+    parser.add_argument('--format', choices=sorted(EXPORTERS), default='csv')
+    parser.add_argument('--start', type=int, help="First block number")
+    parser.add_argument('--end', type=int, help="Last block number")
+    parser.add_argument('--start-time', help="Start of a time range")
+    parser.add_argument('--end-time', help="End of a time range")
+    parser.add_argument('--address', help="Only transactions to or from this address")
+    parser.add_argument('--from-address', help="Only transactions from this address")
+    parser.add_argument('--to-address', help="Only transactions to this address")
+    parser.add_argument('--output', help="File to write, default stdout")
+    args = parser.parse_args()
+
+    current = settings()
+    configure_logging(current)
+    router = None
+    if current.replicas:
+        router = Router(current.dsn, current.replicas)
+        router.check()
+    blocks = BlockModel(current.dsn, router=router)
+    transactions = TransactionModel(current.dsn, router)
+    register_columns(blocks.column_types)
+    register_columns(transactions.column_types)
+
+    if args.start_time and args.end_time:
+        start, end = blocks.get_range(be_datetime(args.start_time),
+                                      be_datetime(args.end_time))
+    elif args.start is not None:
+        start = args.start
+        end = args.end if args.end is not None else blocks.get_latest()
+    else:
+        parser.error("--start or --start-time and --end-time are required")
+
+    if start is None or end is None or start > end:
+        parser.error("No blocks in range")
+
+    model, batches = export_batches(blocks, transactions, args.type, start, end,
+                                    vars(args))
+    exporter = EXPORTERS[args.format](model.columns)
+
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for batch in batches:
+            out.write(exporter.write(batch))
+        out.write(exporter.close())
+    finally:
+        if args.output:
+            out.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+""" Coalesce identical queries running at the same time
+
+When a new block lands many clients ask for the same block or address page at
+once.  Queries run on a thread pool and a query arriving while an identical one
+is still running waits for that one instead of running again.  Callers share
+the result and its encodings, so they must not modify them.
+
+A flight runs under the Deadline of the caller that started it, and is
+cancelled once every caller waiting on it has left.  Its queries are traced
+under that caller's span, and profiled with the caller's profile if it has
+one.  With a limiter, new
+flights need a slot from it, while joining a running flight is always allowed.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+import psycopg2
+from tornado.ioloop import IOLoop
+from .config import settings
+from .concurrency import AIMDLimiter, Overloaded
+from .deadline import Deadline, DeadlineExceeded, within
+from .metrics import METRICS
+from .tracing import Span, traced
+from .profiling import RequestProfile, profiled
+
+
+class Shared(object):
+    """ The result of one flight, with the encodings made from it so far """
+    __slots__ = ('value', 'encoded')
+
+    def __init__(self, value):
+        self.value = value
+        # Format name to encoded bytes
+        self.encoded = {}
+
+
+class Flight(object):
+    """ A running call and the callers waiting on it """
+    __slots__ = ('future', 'deadline', 'waiters')
+
+    def __init__(self, future, deadline):
+        self.future = future
+        self.deadline = deadline
+        self.waiters = 1
+
+
+class SingleFlight(object):
+    """ Runs each distinct key once at a time
+
+    Only call run() and leave() from the IOLoop thread.
+    """
+    def __init__(self, threads: int=None, limiter: AIMDLimiter=None):
+        self.executor = ThreadPoolExecutor(threads or settings().query_threads,
+                                           thread_name_prefix='query')
+        self.limiter = limiter
+        # Key to the Flight running it
+        self.flights = {}
+
+    def __len__(self):
+        return len(self.flights)
+
+    def resize(self, threads: int):
+        """ Run new flights on a pool of threads threads.  Flights already
+            started finish on the old pool.
+        """
+        if threads == self.executor._max_workers:
+            return
+        old, self.executor = self.executor, ThreadPoolExecutor(
+            threads, thread_name_prefix='query')
+        old.shutdown(wait=False)
+
+    def run(self, key: tuple, fn, *args, deadline: Deadline=None,
+            cheap: bool=False, span: Span=None,
+            profile: RequestProfile=None):
+        """ Run fn(*args) on the pool, or join the call already running under
+            key.  Returns a future resolving to a Shared.  fn's queries are
+            limited by deadline, traced under span and profiled by profile.
+            Raises Overloaded if the limiter has no room, with priority for
+            cheap calls.
+        """
+        flight = self.flights.get(key)
+        if flight is not None:
+            METRICS.incr('queries_coalesced')
+            flight.waiters += 1
+            return flight.future
+
+        if self.limiter is not None and not self.limiter.acquire(cheap):
+            METRICS.incr('queries_shed')
+            raise Overloaded()
+
+        METRICS.incr('queries_executed')
+        started = time.monotonic()
+        future = IOLoop.current().run_in_executor(self.executor, self._call,
+                                                  fn, args, deadline, span,
+                                                  profile)
+        flight = self.flights[key] = Flight(future, deadline)
+        future.add_done_callback(lambda f: self._done(key, flight, started))
+        return future
+
+    def leave(self, key: tuple):
+        """ A caller stopped waiting for key.  When none are left the flight is
+            cancelled.
+        """
+        flight = self.flights.get(key)
+        if flight is None:
+            return
+        flight.waiters -= 1
+        if flight.waiters <= 0 and flight.deadline is not None:
+            METRICS.incr('queries_cancelled')
+            flight.deadline.cancel()
+            # Later callers start afresh rather than join a cancelled flight
+            self._land(key, flight)
+
+    def _land(self, key, flight):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+
+    def _done(self, key, flight, started):
+        self._land(key, flight)
+        if self.limiter is None:
+            return
+        error = flight.future.exception()
+        # Queries cancelled because their clients left say nothing of load
+        timed_out = isinstance(error, (DeadlineExceeded,
+                                       psycopg2.extensions.QueryCanceledError)) \
+            and not (flight.deadline and flight.deadline.cancelled)
+        self.limiter.release(time.monotonic() - started, timed_out)
+
+    @staticmethod
+    def _call(fn, args, deadline, span, profile):
+        with within(deadline), traced(span), profiled(profile):
+            return Shared(fn(*args))
@@ -0,0 +1,172 @@
+""" Track the chain head in memory
+
+Each worker runs one HeadTracker.  It polls for the newest block (and, with
+head_listen, also wakes up on NOTIFY from sql/notify.sql) so callers can read
+the head, its age and whether the indexer has fallen behind without a query.
+Polls query on a thread under the head deadline, so a slow primary doesn't
+hold up the IOLoop, and publish on the loop.
+"""
+import json
+import time
+from collections import namedtuple
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from tornado.ioloop import IOLoop, PeriodicCallback
+from .config import LOGGER, HEAD_CHANNEL, settings
+from .deadline import Deadline, DeadlineExceeded, within
+from .utils import pg_varchar_to_hex
+
+log = LOGGER.getChild('head')
+
+# block_timestamp is seconds since the epoch
+Head = namedtuple('Head', ['block_number', 'hash', 'block_timestamp'])
+
+
+class HeadTracker(object):
+    """ Publishes the newest block in the DB to in-process subscribers """
+    def __init__(self, blocks, dsn: str, poll: int=None, listen: bool=None,
+                 stale_after: int=None):
+        current = settings()
+        self.blocks = blocks
+        self.dsn = dsn
+        self.poll_interval = poll or current.head_poll
+        self.listen = current.head_listen if listen is None else listen
+        self.stale_after = stale_after or current.stale_after
+        self.head = None
+        self.listeners = []
+        self.conn = None
+        self.periodic = None
+        # Whether a poll's query is running
+        self.polling = False
+
+    @property
+    def block_number(self) -> int:
+        return self.head.block_number if self.head else None
+
+    @property
+    def lag(self) -> int:
+        """ Seconds between the head block's timestamp and now """
+        if self.head is None:
+            return None
+        return max(int(time.time()) - self.head.block_timestamp, 0)
+
+    @property
+    def stale(self) -> bool:
+        """ Whether the indexer has fallen behind the chain """
+        return self.head is None or self.lag > self.stale_after
+
+    def subscribe(self, callback):
+        """ Call callback(head) whenever a new head arrives """
+        self.listeners.append(callback)
+
+    def start(self):
+        """ Start tracking on the current IOLoop """
+        self.poll()
+        self.periodic = PeriodicCallback(self.poll, self.poll_interval * 1000)
+        self.periodic.start()
+
+    def configure(self, poll: int, stale_after: int):
+        """ Change the poll interval and staleness threshold while running """
+        self.poll_interval = poll
+        self.stale_after = stale_after
+        if self.periodic is not None:
+            self.periodic.callback_time = poll * 1000
+
+    def poll(self):
+        """ Query for the newest block off the IOLoop, unless the last poll's
+            query is still running
+        """
+        if self.listen and self.conn is None:
+            self._listen()
+
+        if self.polling:
+            return
+        self.polling = True
+        loop = IOLoop.current()
+        loop.add_future(loop.run_in_executor(None, self.fetch), self._polled)
+
+    def fetch(self) -> Head:
+        """ The newest block, queried within the head deadline """
+        with within(Deadline(settings().deadlines.get('head'))):
+            return self.blocks.get_head()
+
+    def _polled(self, future):
+        self.polling = False
+        try:
+            head = future.result()
+        except (psycopg2.Error, DeadlineExceeded):
+            log.exception("Unable to poll for the chain head")
+            return
+
+        if head is not None:
+            self.update(head)
+
+    def update(self, head: Head):
+        """ Publish head if it differs from the current one """
+        if head == self.head:
+            return
+
+        if self.head is not None and head.block_number < self.head.block_number:
+            log.warning("Head moved back from {} to {}".format(
+                self.head.block_number, head.block_number))
+
+        self.head = head
+        for callback in self.listeners:
+            try:
+                callback(head)
+            except Exception:
+                log.exception("Head subscriber failed")
+
+    def _listen(self):
+        """ LISTEN for new blocks on a dedicated connection """
+        try:
+            self.conn = psycopg2.connect(self.dsn)
+            self.conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with self.conn.cursor() as curs:
+                curs.execute("LISTEN {};".format(HEAD_CHANNEL))
+        except psycopg2.Error:
+            log.exception("Unable to LISTEN for new blocks, polling only")
+            self._close()
+            return
+
+        IOLoop.current().add_handler(self.conn.fileno(), self._on_notify,
+                                     IOLoop.READ)
+        log.info("Listening for new blocks on {}".format(HEAD_CHANNEL))
+
+    def _close(self):
+        if self.conn is not None:
+            try:
+                IOLoop.current().remove_handler(self.conn.fileno())
+                self.conn.close()
+            except (psycopg2.Error, ValueError):
+                pass
+        self.conn = None
+
+    def _on_notify(self, fd, events):
+        try:
+            self.conn.poll()
+        except psycopg2.Error:
+            # Reconnects on the next poll
+            log.exception("Lost LISTEN connection")
+            self._close()
+            return
+
+        newest = None
+        while self.conn.notifies:
+            notify = self.conn.notifies.pop(0)
+            try:
+                payload = json.loads(notify.payload)
+                head = Head(int(payload['block_number']),
+                            pg_varchar_to_hex(payload['hash']),
+                            int(payload['block_timestamp']))
+            except (ValueError, KeyError, TypeError):
+                log.warning("Bad {} payload: {}".format(HEAD_CHANNEL,
+                                                        notify.payload))
+                continue
+            if newest is None or head.block_number >= newest.block_number:
+                newest = head
+
+        # Ignore backfilled blocks, polling catches any real move backwards
+        if newest is not None and (self.head is None
+                                   or newest.block_number >= self.head.block_number):
+            self.update(newest)
@@ -0,0 +1,26 @@
+""" In-process counters, served at /metrics
+
+Counters are per worker and reset on restart.
+"""
+import threading
+
+
+class Metrics(object):
+    """ Named counters safe to bump from any thread """
+    def __init__(self):
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def incr(self, name: str, value: int=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def get(self, name: str) -> int:
+        return self.counters.get(name, 0)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return dict(self.counters)
+
+
+METRICS = Metrics()
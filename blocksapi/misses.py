@@ -0,0 +1,210 @@
+""" Answer lookups for things that aren't there without a query
+
+Scrapers and wallets ask for transaction hashes and addresses the chain has
+never seen, and for blocks that haven't been mined yet.  Each of those costs a
+full index probe, or a lower() scan for addresses, only to return a 404.
+
+- NegativeCache remembers lookups that found nothing for negative_ttl seconds.
+  Anything new arrives with a new head, so the cache is emptied on every head,
+  and a lookup that started before the head is not remembered.
+- AddressFilter is a bloom filter of every address in the transaction table,
+  loaded in the background at startup and extended as heads arrive.  An
+  address it has never seen definitely has no transactions.  One it has may
+  not, at about address_filter_error of the time once address_filter_capacity
+  addresses are in.  Each worker keeps its own, about 1.2 bytes an address at
+  a 1% error rate, and loads it with a full read of the transaction table, so
+  it's off unless address_filter is set.
+"""
+import math
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import psycopg2
+from .config import LOGGER, settings
+from .utils import pg_varchar_to_hex
+
+log = LOGGER.getChild('misses')
+
+# Lookups remembered at most, the oldest are forgotten first
+MAX_MISSES = 100000
+
+# Blocks below the last one loaded that a refresh reads again, for
+# transactions inserted after their block
+REFRESH_MARGIN = 10
+
+
+class NegativeCache(object):
+    """ Keys of lookups that found nothing, each forgotten ttl seconds after it
+        was added or when a new head arrives
+    """
+    def __init__(self, ttl: float=None, size: int=MAX_MISSES):
+        self.ttl = settings().negative_ttl if ttl is None else ttl
+        self.size = size
+        # Key to the monotonic time it expires
+        self.entries = OrderedDict()
+        # Bumped by every clear(), so lookups that raced it aren't kept
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key) -> bool:
+        with self.lock:
+            expires = self.entries.get(key)
+            if expires is None:
+                return False
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return False
+            return True
+
+    def configure(self, ttl: float):
+        """ Remember misses for ttl seconds from now on, 0 to stop """
+        self.ttl = ttl
+        if not ttl:
+            self.clear()
+
+    def add(self, key, generation: int):
+        """ Remember that key had no results, unless the cache was cleared
+            since generation was read, before the lookup started
+        """
+        if not self.ttl:
+            return
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[key] = time.monotonic() + self.ttl
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def on_head(self, head):
+        """ Forget every miss, the new block may have what they looked for """
+        self.clear()
+
+
+class BloomFilter(object):
+    """ Set of byte strings in a bit array, which may report items it doesn't
+        have at about error once it holds capacity items, but never misses
+        one it does
+    """
+    def __init__(self, capacity: int, error: float):
+        self.size = max(int(-capacity * math.log(error) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: bytes) -> list:
+        # Double hashing, bits h1 + i * h2 for i below hashes
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item: bytes):
+        # Only ever sets bits, so readers in other threads are safe
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: bytes) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(item))
+
+
+class AddressFilter(object):
+    """ Bloom filter of the from and to addresses of every transaction """
+    def __init__(self, dsn: str, capacity: int=None, error: float=None):
+        current = settings()
+        self.dsn = dsn
+        self.bloom = BloomFilter(capacity or current.address_filter_capacity,
+                                 error or current.address_filter_error)
+        # Highest block loaded
+        self.loaded = None
+        self.ready = False
+        # Held by the thread loading
+        self.loading = threading.Lock()
+
+    def __contains__(self, address: str) -> bool:
+        """ False only if address is in no transaction.  True until loaded. """
+        if not self.ready:
+            return True
+        return address.lower().encode('ascii') in self.bloom
+
+    def add(self, address: str):
+        if address:
+            self.bloom.add(pg_varchar_to_hex(address).lower().encode('ascii'))
+
+    def start(self):
+        """ Load the filter in a background thread """
+        thread = threading.Thread(target=self.load, name='address_filter',
+                                  daemon=True)
+        thread.start()
+
+    def load(self):
+        """ Add the addresses of transactions in blocks after the last one
+            loaded, and a few before it
+        """
+        if not self.loading.acquire(blocking=False):
+            return
+        try:
+            self._load()
+        finally:
+            self.loading.release()
+
+        if not self.ready:
+            log.info("Loaded {} addresses into the address filter".format(
+                self.bloom.count))
+            self.ready = True
+
+    def _load(self):
+        after = -1
+        if self.loaded is not None:
+            after = self.loaded - REFRESH_MARGIN
+
+        conn = psycopg2.connect(self.dsn)
+        try:
+            with conn.cursor() as curs:
+                curs.execute("SELECT max(block_number) FROM transaction;")
+                upto = curs.fetchone()[0]
+            if upto is None:
+                return
+
+            # A named cursor streams the rows instead of fetching them all
+            with conn.cursor(name='address_filter') as curs:
+                curs.itersize = settings().cursor_batch
+                curs.execute(
+                    "SELECT from_address, to_address FROM transaction"
+                    " WHERE block_number > %s AND block_number <= %s;",
+                    (after, upto))
+                for from_address, to_address in curs:
+                    self.add(from_address)
+                    self.add(to_address)
+            self.loaded = upto
+        finally:
+            conn.close()
+
+    def refresh(self):
+        """ Pick up transactions indexed since the last load """
+        if not self.ready:
+            return
+        try:
+            self.load()
+        except psycopg2.Error:
+            log.exception("Unable to refresh address filter")
+
+    def add_head(self, head):
+        """ Load a new head's transactions, off the IOLoop """
+        if not self.ready:
+            return
+        thread = threading.Thread(target=self.refresh, name='address_filter',
+                                  daemon=True)
+        thread.start()
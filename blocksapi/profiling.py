@@ -0,0 +1,160 @@
+""" Profile live workers without redeploying
+
+Two ways in, both for admins only:
+
+- A request with X-Admin-Token and "X-Profile: cprofile" headers runs under
+  cProfile, on the IOLoop thread and on the query thread running its flight.
+  The stats are dumped to profile_dir in pstats format, at the path returned in
+  the X-Profile-File header.  Anything else the IOLoop does meanwhile, like
+  other requests, is in the profile too.  One request is profiled at a time.
+- Sampling every thread's stack with sys._current_frames() for some seconds,
+  through /admin/profile or SIGUSR1, gives collapsed stacks ready for
+  flamegraph.pl or speedscope: one line per distinct stack, outermost frame
+  first, with the number of samples it was seen in.
+"""
+import os
+import sys
+import hmac
+import time
+import cProfile
+import pstats
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from .config import LOGGER, settings
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_FILE_HEADER = 'X-Profile-File'
+TOKEN_HEADER = 'X-Admin-Token'
+
+log = LOGGER.getChild('profiling')
+
+# Held by the request being profiled
+_profiling = threading.Lock()
+
+
+def is_admin(token: str) -> bool:
+    """ Whether token is the admin_token.  Never true without one set. """
+    admin_token = settings().admin_token
+    if not admin_token or not token:
+        return False
+    return hmac.compare_digest(token.encode('utf-8'),
+                               admin_token.encode('utf-8'))
+
+
+def profile_path(name: str, extension: str) -> str:
+    """ Where to store a profile named name """
+    return os.path.join(settings().profile_dir,
+                        'blocksapi-{}-{}.{}'.format(os.getpid(), name,
+                                                    extension))
+
+
+class RequestProfile(object):
+    """ cProfile stats for one request, collected from each thread it runs on
+        with a profiler of its own.  Start with start_profile().
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.profilers = []
+        self.lock = threading.Lock()
+        self.main = cProfile.Profile()
+        self.profilers.append(self.main)
+        self.main.enable()
+
+    @contextmanager
+    def thread(self):
+        """ Profile the block in this thread too """
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12 and later allow one active profiler per process,
+            # so only the IOLoop thread is profiled
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with self.lock:
+                self.profilers.append(profiler)
+
+    def finish(self) -> str:
+        """ Stop profiling and dump the stats, returning their path """
+        try:
+            self.main.disable()
+            with self.lock:
+                profilers = list(self.profilers)
+            stats = pstats.Stats(*profilers)
+            stats.dump_stats(self.path)
+        finally:
+            _profiling.release()
+        log.info("Request profile written to {}".format(self.path))
+        return self.path
+
+
+def start_profile(path: str) -> RequestProfile:
+    """ Profile a request, or None if another is being profiled """
+    if not _profiling.acquire(blocking=False):
+        log.warning("Already profiling a request, not profiling another")
+        return None
+    try:
+        return RequestProfile(path)
+    except Exception:
+        _profiling.release()
+        raise
+
+
+def profiled(profile: RequestProfile):
+    """ Profile the block in this thread as part of profile, if there is one """
+    if profile is None:
+        return nullcontext()
+    return profile.thread()
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return '{}:{}'.format(frame.f_globals.get('__name__', '?'),
+                          getattr(code, 'co_qualname', code.co_name))
+
+
+def sample_stacks(seconds: float, hz: int=100) -> Counter:
+    """ Sample every other thread's stack hz times a second for seconds.
+        Returns a Counter of stacks, each a tuple of the thread name and its
+        frames outermost first.
+    """
+    me = threading.get_ident()
+    interval = 1.0 / hz
+    stacks = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            stacks[tuple(reversed(stack))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def collapse(stacks: Counter) -> str:
+    """ Stacks in the collapsed format flame graph tools read """
+    return ''.join('{} {}\n'.format(';'.join(stack), count)
+                   for stack, count in sorted(stacks.items()))
+
+
+def sample_to_file(seconds: float, hz: int=100) -> str:
+    """ Sample stacks and write them collapsed to profile_dir, returning the
+        path
+    """
+    path = profile_path(time.strftime('%Y%m%d%H%M%S'), 'collapsed')
+    text = collapse(sample_stacks(seconds, hz))
+    with open(path, 'w') as f:
+        f.write(text)
+    log.warning("Stack samples written to {}".format(path))
+    return path
@@ -0,0 +1,124 @@
+""" Push new blocks and address activity to subscribed clients
+
+One Hub per worker is fed by the HeadTracker.  Each new head costs one block
+query and, if anyone watches addresses, one transaction query no matter how
+many clients are connected.  The queries run on the hub's own thread, one head
+after another, under the subscribe deadline, and the results are handed back
+to the IOLoop to publish.  Every message is encoded once and queued on each
+matching subscriber.
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+import psycopg2
+from tornado.ioloop import IOLoop
+from .config import LOGGER, settings
+from .db import JSONEncoder
+from .deadline import Deadline, DeadlineExceeded, within
+
+log = LOGGER.getChild('pubsub')
+
+
+class Hub(object):
+    """ Fan-out of new blocks and transactions to subscribers
+
+    A subscriber is anything with a send(payload) method taking an encoded
+    JSON message.  Call everything but fetch() from the IOLoop thread.
+    """
+    def __init__(self, blocks, transactions, catchup: int=None):
+        self.blocks = blocks
+        self.transactions = transactions
+        # None follows subscriber_catchup
+        self.catchup = catchup
+        self.last_block = None
+        # Subscribers following new blocks
+        self.heads = set()
+        # Lower case address to the subscribers watching it
+        self.addresses = {}
+        # One thread, so heads are fetched and published in order
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix='pubsub')
+
+    def follow_heads(self, subscriber):
+        self.heads.add(subscriber)
+
+    def unfollow_heads(self, subscriber):
+        self.heads.discard(subscriber)
+
+    def watch(self, subscriber, addresses):
+        for address in addresses:
+            self.addresses.setdefault(address.lower(), set()).add(subscriber)
+
+    def unwatch(self, subscriber, addresses):
+        for address in addresses:
+            subs = self.addresses.get(address.lower())
+            if subs is None:
+                continue
+            subs.discard(subscriber)
+            if not subs:
+                del self.addresses[address.lower()]
+
+    def remove(self, subscriber):
+        """ Drop every subscription a subscriber holds """
+        self.unfollow_heads(subscriber)
+        self.unwatch(subscriber, [a for a, subs in self.addresses.items()
+                                  if subscriber in subs])
+
+    def on_head(self, head):
+        """ Publish the blocks since the last head, and their transactions,
+            once the hub's thread has fetched them
+        """
+        last_block = self.last_block
+        self.last_block = head.block_number
+
+        if not self.heads and not self.addresses:
+            return
+
+        # A head at or below the last one is a reorg, resend from there
+        if last_block is None or head.block_number <= last_block:
+            start = head.block_number
+        else:
+            catchup = self.catchup or settings().subscriber_catchup
+            start = max(last_block + 1, head.block_number - catchup + 1)
+
+        self.executor.submit(self.fetch, IOLoop.current(), start,
+                             head.block_number, bool(self.heads),
+                             bool(self.addresses))
+
+    def fetch(self, loop: IOLoop, start: int, end: int, blocks: bool,
+              transactions: bool):
+        """ Query the blocks and transactions from start to end on the hub's
+            thread and publish them on loop
+        """
+        try:
+            with within(Deadline(settings().deadlines.get('subscribe'))):
+                blocks = self.blocks.get_range_number(start, end) \
+                    if blocks else []
+                txs = self.transactions.get_block_range(start, end) \
+                    if transactions else []
+        except (psycopg2.Error, DeadlineExceeded):
+            log.exception("Unable to fetch blocks {} to {} for subscribers"
+                          .format(start, end))
+            return
+        loop.add_callback(self.publish, blocks, txs)
+
+    def publish(self, blocks: list, txs: list):
+        """ Send blocks and transactions to the subscribers following them """
+        for block in blocks:
+            payload = self.encode('block', block)
+            for subscriber in list(self.heads):
+                subscriber.send(payload)
+
+        if self.addresses:
+            for tx in txs:
+                matched = set()
+                for field in ('from_address', 'to_address'):
+                    if tx[field]:
+                        matched |= self.addresses.get(tx[field].lower(), set())
+                if not matched:
+                    continue
+                payload = self.encode('transaction', tx)
+                for subscriber in matched:
+                    subscriber.send(payload)
+
+    @staticmethod
+    def encode(kind: str, result) -> str:
+        return json.dumps({'type': kind, 'result': result}, cls=JSONEncoder)
@@ -1,6 +1,5 @@
-import redis
 from datetime import datetime
-from .config import LOGGER, REDIS, RATE_LIMITER_EXPIRY, RATE_LIMIT
+from .config import LOGGER, RATE_LIMITER_EXPIRY, RATE_LIMIT, settings
 
 log = LOGGER.getChild('ratelimiter')
 
@@ -8,10 +7,13 @@ log = LOGGER.getChild('ratelimiter')
 class IPLimiter(object):
     """ A class for handling IP limiting """
     def __init__(self):
+        # Slow to import, so not until a limiter is needed
+        import redis
+        config = settings().redis
         self.store = redis.Redis(
-            host=REDIS.get('host'),
-            port=REDIS.get('port'),
-            password=REDIS.get('password'),
+            host=config.get('host'),
+            port=config.get('port'),
+            password=config.get('password'),
         )
 
     def request(self, ip):
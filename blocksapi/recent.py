@@ -0,0 +1,230 @@
+""" The newest blocks and their transactions in memory
+
+Most requests are about the last few hundred blocks.  Each worker keeps the
+newest recent_blocks blocks in a ring, each slot holding a block, its
+transactions and their index by address, alongside an index of transaction
+hashes.  A thread loads each new head's blocks and transactions, and the ones
+after the last head, with a query for each.  Blocks fall out of the ring as
+newer ones take their slot.
+
+Every head also reads the hashes of the few blocks below it again.  A block
+whose hash changed was replaced in a reorg and is loaded again with its
+transactions, and blocks above a head that moved back are dropped.  The last
+head's transactions are always loaded again, in case any were indexed after
+the block was.
+
+Lookups hand out copies of the records, so callers may change them.
+"""
+import threading
+from operator import attrgetter
+from .config import LOGGER
+from .records import projection
+
+log = LOGGER.getChild('recent')
+
+# Blocks below the last head checked for a changed hash on every head
+RECHECK_DEPTH = 12
+
+
+class RecentBlock(object):
+    """ A block in the ring with its transactions """
+    __slots__ = ('block', 'transactions', 'addresses')
+
+    def __init__(self, block, transactions: list):
+        self.block = block
+        self.transactions = transactions
+        # Lower case address to its transactions, from or to
+        self.addresses = {}
+        for tx in transactions:
+            for address in {tx.from_address, tx.to_address}:
+                if address:
+                    self.addresses.setdefault(address.lower(), []).append(tx)
+
+    @property
+    def block_number(self) -> int:
+        return self.block.block_number
+
+
+def copy_records(records: list, fields: tuple=None) -> list:
+    """ New records with the values of records, of only the columns in fields
+        in the table's order if there are any
+    """
+    if not records:
+        return []
+    record = type(records[0])
+    columns = tuple(col for col in record.columns
+                    if not fields or col in fields)
+    cls = projection(record, columns)
+    if len(columns) == 1:
+        return [cls((getattr(r, columns[0]),)) for r in records]
+    # Reads the values into a tuple in C
+    values = attrgetter(*columns)
+    return [cls(values(r)) for r in records]
+
+
+class RecentBlocks(object):
+    """ Ring of the newest blocks, with their transactions """
+    def __init__(self, blocks, transactions, size: int):
+        self.blocks = blocks
+        self.transactions = transactions
+        self.size = size
+        # Slot block_number % size to the RecentBlock there
+        self.ring = [None] * size
+        # Transaction hash to the transaction, for every block in the ring
+        self.hashes = {}
+        # Highest block loaded
+        self.newest = None
+        self.head = None
+        self.lock = threading.Lock()
+        # Set when a head arrives for the loading thread
+        self.wake = threading.Event()
+
+    def _get(self, block_number: int) -> RecentBlock:
+        entry = self.ring[block_number % self.size]
+        if entry is None or entry.block_number != block_number:
+            return None
+        return entry
+
+    def _hash(self, block_number: int) -> str:
+        entry = self._get(block_number)
+        return entry.block.hash if entry is not None else None
+
+    def get(self, block_number: int, fields: tuple=None) -> list:
+        """ The block as a list like BlockModel.get(), or None if it isn't in
+            the ring
+        """
+        with self.lock:
+            entry = self._get(block_number)
+        if entry is None:
+            return None
+        return copy_records([entry.block], fields)
+
+    def get_transactions(self, block_number: int) -> list:
+        """ Every transaction in a block, or None if it isn't in the ring """
+        with self.lock:
+            entry = self._get(block_number)
+        if entry is None:
+            return None
+        return entry.transactions
+
+    def get_transaction(self, tx_hash: str, fields: tuple=None) -> list:
+        """ The transaction as a list like TransactionModel.get(), or None if
+            it isn't in the ring
+        """
+        with self.lock:
+            tx = self.hashes.get(tx_hash)
+        if tx is None:
+            return None
+        return copy_records([tx], fields)
+
+    def by_address(self, address: str, limit: int, field: str=None) -> list:
+        """ The newest limit transactions from or to address, or only where
+            field is address, newest block first.  None unless the ring has
+            at least limit, so there are no newer ones anywhere else.
+        """
+        address = address.lower()
+        found = []
+        with self.lock:
+            if self.newest is None:
+                return None
+            for block_number in range(self.newest,
+                                      max(self.newest - self.size, -1), -1):
+                entry = self._get(block_number)
+                if entry is None:
+                    # A gap, older transactions could be in it
+                    return None
+                for tx in entry.addresses.get(address, ()):
+                    if field is None or (getattr(tx, field) or '').lower() \
+                            == address:
+                        found.append(tx)
+                if len(found) >= limit:
+                    return found[:limit]
+        return None
+
+    def _put(self, entry: RecentBlock):
+        """ Put a block in its slot, replacing what was there """
+        self._evict(entry.block_number % self.size)
+        self.ring[entry.block_number % self.size] = entry
+        for tx in entry.transactions:
+            self.hashes[tx.hash] = tx
+
+    def _evict(self, slot: int):
+        entry = self.ring[slot]
+        if entry is None:
+            return
+        self.ring[slot] = None
+        for tx in entry.transactions:
+            if self.hashes.get(tx.hash) is tx:
+                del self.hashes[tx.hash]
+
+    def _drop_from(self, block_number: int):
+        for number in range(max(block_number, self.newest - self.size + 1),
+                            self.newest + 1):
+            if self._get(number) is not None:
+                self._evict(number % self.size)
+
+    def drop_from(self, block_number: int):
+        """ Forget blocks at and above block_number """
+        with self.lock:
+            if self.newest is None or block_number > self.newest:
+                return
+            self._drop_from(block_number)
+            self.newest = block_number - 1 if block_number > 0 else None
+
+    def load(self, head):
+        """ Load the blocks up to head that aren't in the ring yet, and the
+            ones that changed
+        """
+        top = head.block_number
+        low = max(top - self.size + 1, 0)
+        if self.newest is None:
+            start = low
+        else:
+            start = max(min(self.newest, top) - RECHECK_DEPTH, low)
+
+        blocks = self.blocks.get_range_number(start, top,
+                                              limit=top - start + 1)
+        with self.lock:
+            changed = [block for block in blocks
+                       if block.block_number == self.newest
+                       or self._hash(block.block_number) != block.hash]
+
+        transactions = {}
+        if changed:
+            for tx in self.transactions.get_block_range(
+                    changed[0].block_number, top):
+                transactions.setdefault(tx.block_number, []).append(tx)
+
+        with self.lock:
+            # The head moved back, what's above it was reorganized away
+            if self.newest is not None and self.newest > top:
+                log.warning("Head moved back from {} to {}".format(self.newest,
+                                                                   top))
+                self._drop_from(top + 1)
+            for block in changed:
+                if self._hash(block.block_number) not in (None, block.hash):
+                    log.warning("Block {} was reorganized".format(
+                        block.block_number))
+                self._put(RecentBlock(block, transactions.get(
+                    block.block_number, [])))
+            self.newest = top
+
+    def on_head(self, head):
+        """ Load head on the ring's thread """
+        self.head = head
+        self.wake.set()
+
+    def start(self):
+        thread = threading.Thread(target=self.follow, name='recent',
+                                  daemon=True)
+        thread.start()
+
+    def follow(self):
+        """ Load every head that arrives, or the newest of them """
+        while True:
+            self.wake.wait()
+            self.wake.clear()
+            try:
+                self.load(self.head)
+            except Exception:
+                log.exception("Unable to load recent blocks")
@@ -0,0 +1,109 @@
+""" Compact row records for the block and transaction tables
+
+A record keeps its values in slots and is built by unpacking the cursor's row
+tuple, so a row costs one small object instead of rawl's result object, its
+__dict__ and a data dict.  Records read like RawlResults: by column name, by
+position or as attributes.
+
+Queries selecting only some of a table's columns get a record class for just
+those columns from projection().
+"""
+from functools import lru_cache
+
+
+class Record(object):
+    """ A row with the columns named in __slots__ """
+    __slots__ = ()
+
+    # The columns in SELECT order, the same as __slots__
+    columns = []
+
+    def __getitem__(self, k):
+        if type(k) != str:
+            k = self.columns[int(k)]
+        try:
+            return getattr(self, k)
+        except AttributeError:
+            raise KeyError(k)
+
+    def __setitem__(self, k, v):
+        if type(k) != str:
+            k = self.columns[int(k)]
+        setattr(self, k, v)
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __iter__(self):
+        for col in self.columns:
+            yield getattr(self, col)
+
+    def __eq__(self, other):
+        return type(other) == type(self) and list(self) == list(other)
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, self.to_dict())
+
+    def __getstate__(self):
+        return list(self)
+
+    def __setstate__(self, state):
+        self.__init__(state)
+
+    def keys(self):
+        return list(self.columns)
+
+    def values(self):
+        return list(self)
+
+    def to_dict(self) -> dict:
+        return {col: getattr(self, col) for col in self.columns}
+
+
+class Block(Record):
+    __slots__ = ('block_number', 'block_timestamp', 'hash', 'miner', 'nonce',
+                 'difficulty', 'gas_used', 'gas_limit', 'size')
+    columns = list(__slots__)
+
+    def __init__(self, row):
+        (self.block_number, self.block_timestamp, self.hash, self.miner,
+         self.nonce, self.difficulty, self.gas_used, self.gas_limit,
+         self.size) = row
+
+
+class Transaction(Record):
+    __slots__ = ('hash', 'block_number', 'from_address', 'to_address', 'value',
+                 'gas_price', 'gas_limit', 'nonce', 'input')
+    columns = list(__slots__)
+
+    def __init__(self, row):
+        (self.hash, self.block_number, self.from_address, self.to_address,
+         self.value, self.gas_price, self.gas_limit, self.nonce,
+         self.input) = row
+
+
+@lru_cache(maxsize=256)
+def projection(record, columns: tuple):
+    """ A record class for rows of some of record's columns, in the order
+        given
+    """
+    if columns == tuple(record.columns):
+        return record
+
+    def __init__(self, row):
+        for col, v in zip(columns, row):
+            setattr(self, col, v)
+
+    def __reduce__(self):
+        return (_unpickle_projection, (record, columns, tuple(self)))
+
+    return type(record.__name__, (Record,), {
+        '__slots__': columns,
+        '__init__': __init__,
+        '__reduce__': __reduce__,
+        'columns': list(columns),
+    })
+
+
+def _unpickle_projection(record, columns: tuple, row: tuple) -> Record:
+    return projection(record, columns)(row)
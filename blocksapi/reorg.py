@@ -0,0 +1,174 @@
+""" Find reorganized blocks and drop what's cached from them up
+
+A reorg replaces the newest blocks with others at the same numbers, so
+anything cached about them, like recent blocks and misses, is wrong from the
+first replaced block, the fork point, upwards.  The head only tells that the
+chain moved back, not when it moved on through a different block.
+
+Each worker remembers the hash of every block it served within reorg_depth of
+the head.  On every head a thread reads those blocks' hashes from the primary,
+one query, and if any changed or are gone it tells the worker's listeners the
+fork point and publishes it on REORG_CHANNEL so every other worker, on this
+host or any other sharing the Redis server, drops its caches too.  Without
+Redis each worker still catches the reorgs it served.
+"""
+import os
+import json
+import time
+import threading
+import psycopg2
+from .config import LOGGER, REORG_CHANNEL, settings
+
+log = LOGGER.getChild('reorg')
+
+# Seconds between attempts to reach Redis
+RETRY_INTERVAL = 5
+
+
+class ReorgDetector(object):
+    """ Compares the blocks served with the primary's on every head """
+    def __init__(self, blocks, depth: int=None, channel: str=REORG_CHANNEL):
+        self.blocks = blocks
+        self.depth = depth or settings().reorg_depth
+        self.channel = channel
+        # Block number to the hash served, for blocks near the head
+        self.served = {}
+        self.head = None
+        self.listeners = []
+        self.lock = threading.Lock()
+        # Set when a head arrives for the checking thread
+        self.wake = threading.Event()
+        # Tells this worker's announcements from others'
+        self.origin = os.urandom(8).hex()
+        self.store = None
+
+    def subscribe(self, callback):
+        """ Call callback(fork) with the first reorganized block number """
+        self.listeners.append(callback)
+
+    def saw(self, blocks: list):
+        """ Remember the hashes of blocks served, the ones near the head """
+        head = self.head
+        floor = head.block_number - self.depth if head is not None else -1
+        with self.lock:
+            for block in blocks:
+                number = getattr(block, 'block_number', None)
+                block_hash = getattr(block, 'hash', None)
+                if number is not None and block_hash is not None \
+                        and number > floor:
+                    self.served[number] = block_hash
+
+    def check(self, head) -> int:
+        """ Compare the blocks served with the primary's, invalidating from the
+            fork point if any changed.  Returns the fork point or None.
+        """
+        floor = head.block_number - self.depth
+        with self.lock:
+            for number in [n for n in self.served if n <= floor]:
+                del self.served[number]
+            served = dict(self.served)
+        if not served:
+            return None
+
+        hashes = self.blocks.get_hashes(min(served), max(served))
+        changed = [number for number, block_hash in served.items()
+                   if hashes.get(number) != block_hash]
+        if not changed:
+            return None
+
+        fork = min(changed)
+        log.warning("Blocks from {} were reorganized".format(fork))
+        self.invalidate(fork)
+        self.publish(fork)
+        return fork
+
+    def invalidate(self, fork: int):
+        """ Forget blocks served from fork up and tell the listeners """
+        with self.lock:
+            for number in [n for n in self.served if n >= fork]:
+                del self.served[number]
+        for callback in self.listeners:
+            try:
+                callback(fork)
+            except Exception:
+                log.exception("Reorg listener failed")
+
+    def on_head(self, head):
+        """ Check head on the detector's thread """
+        self.head = head
+        self.wake.set()
+
+    def start(self):
+        """ Start checking heads and listening for other workers' reorgs """
+        for target in (self.follow, self.listen):
+            thread = threading.Thread(target=target, name='reorg',
+                                      daemon=True)
+            thread.start()
+
+    def follow(self):
+        """ Check every head that arrives, or the newest of them """
+        while True:
+            self.wake.wait()
+            self.wake.clear()
+            try:
+                self.check(self.head)
+            except psycopg2.Error:
+                log.exception("Unable to check for reorgs")
+
+    def connect(self):
+        # Slow to import, so not until the detector starts
+        import redis
+        config = settings().redis
+        return redis.Redis(
+            host=config.get('host'),
+            port=config.get('port'),
+            password=config.get('password'),
+        )
+
+    def publish(self, fork: int):
+        """ Tell every other worker about a fork point """
+        import redis
+        if self.store is None:
+            self.store = self.connect()
+        try:
+            self.store.publish(self.channel, json.dumps({
+                'fork': fork,
+                'origin': self.origin,
+            }))
+        except redis.RedisError as e:
+            log.warning("Unable to announce reorg from {}: {}".format(fork, e))
+
+    def on_message(self, data):
+        """ Invalidate from the fork point another worker announced """
+        try:
+            message = json.loads(data)
+            fork = int(message['fork'])
+        except (ValueError, KeyError, TypeError):
+            log.warning("Bad {} message: {}".format(self.channel, data))
+            return
+        if message.get('origin') == self.origin:
+            return
+        log.warning("Another worker found blocks from {} reorganized".format(
+            fork))
+        self.invalidate(fork)
+
+    def listen(self):
+        """ Subscribe to other workers' reorgs, reconnecting when Redis goes
+            away
+        """
+        import redis
+        failures = 0
+        while True:
+            try:
+                pubsub = self.connect().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                failures = 0
+                for message in pubsub.listen():
+                    self.on_message(message['data'])
+            except redis.RedisError as e:
+                # Once, not every retry
+                report = log.debug if failures else log.warning
+                report("Not listening for reorgs on {}: {}".format(
+                    self.channel, e))
+                failures += 1
+            time.sleep(RETRY_INTERVAL)
@@ -0,0 +1,315 @@
+""" Route reads to read replicas that have caught up
+
+Writes and reads that must see the newest data go to the primary, other reads
+are spread round robin over the replicas.  A background thread checks every
+replica_check seconds how far each replica's newest block is behind the
+primary's.  Replicas failing replica_failures checks or queries in a row are
+ejected until a check succeeds again.
+
+Reads say how fresh their data must be with routing():
+
+    with routing(block_number):     # a replica that has this block
+    with routing(PRIMARY):          # only the primary
+
+Anything else needs a replica at most replica_max_lag blocks behind.
+"""
+import time
+import threading
+from itertools import count
+from functools import lru_cache
+from contextlib import contextmanager
+import psycopg2
+from psycopg2.extensions import connection, parse_dsn, register_type, STATUS_READY
+from psycopg2.pool import ThreadedConnectionPool
+from .deadline import current_deadline
+from .utils import HEXBYTEA, NUMERIC_INT
+from .config import LOGGER, Settings, settings
+
+log = LOGGER.getChild('replicas')
+
+# Reads that only the primary can answer
+PRIMARY = object()
+
+_route = threading.local()
+
+
+@contextmanager
+def routing(min_block):
+    """ Route queries made in this thread to a database with min_block, or to
+        the primary for PRIMARY
+    """
+    previous = getattr(_route, 'min_block', None)
+    _route.min_block = min_block
+    try:
+        yield
+    finally:
+        _route.min_block = previous
+
+
+def current_route():
+    """ The min_block set by routing() in this thread, None if not set """
+    return getattr(_route, 'min_block', None)
+
+
+class PreparingConnection(connection):
+    """ A connection remembering the statements PREPAREd on it, and reading
+        bytea as 0x hex strings and integral numerics as ints
+    """
+    def __init__(self, *args, **kwargs):
+        super(PreparingConnection, self).__init__(*args, **kwargs)
+        self.prepared = set()
+        register_type(HEXBYTEA, self)
+        register_type(NUMERIC_INT, self)
+
+
+@lru_cache(maxsize=64)
+def dsn_name(dsn: str) -> str:
+    """ host:port/dbname for a DSN, leaving out the credentials """
+    try:
+        params = parse_dsn(dsn)
+    except psycopg2.ProgrammingError:
+        return '?'
+    return '{}:{}/{}'.format(params.get('host', 'localhost'),
+                             params.get('port', 5432),
+                             params.get('dbname', ''))
+
+
+class Database(object):
+    """ A pool of connections to one database and what the last check saw """
+    def __init__(self, dsn: str, pool_size: int=None):
+        self.dsn = dsn
+        self.pool_size = pool_size or settings().pool_size
+        self.pool = None
+        # Pool to its connections handed out, so a replaced pool can be closed
+        # once they're all back
+        self.lent = {}
+        self.lock = threading.Lock()
+        # Newest block number, None until checked
+        self.head = None
+        self.failures = 0
+        self.ejected = False
+
+    @property
+    def name(self) -> str:
+        """ The DSN without credentials """
+        return dsn_name(self.dsn)
+
+    @contextmanager
+    def connection(self):
+        """ A pooled connection, rolled back when returned.  Under a deadline
+            its transaction gets the time left as statement_timeout.
+        """
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.timeout_ms()
+
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadedConnectionPool(
+                    1, self.pool_size, self.dsn,
+                    connection_factory=PreparingConnection)
+            pool = self.pool
+            self.lent[pool] = self.lent.get(pool, 0) + 1
+
+        try:
+            conn = pool.getconn()
+        except Exception:
+            self._returned(pool)
+            raise
+        try:
+            if deadline is not None:
+                self.limit(conn)
+                deadline.attach(conn)
+            yield conn
+        finally:
+            if deadline is not None:
+                deadline.detach(conn)
+            if not conn.closed and conn.status != STATUS_READY:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    pass
+            try:
+                if not pool.closed:
+                    pool.putconn(conn, close=bool(conn.closed) or
+                                 pool is not self.pool)
+            finally:
+                self._returned(pool)
+
+    def _returned(self, pool):
+        """ Count a connection back, closing pool if it was replaced and this
+            was its last one out
+        """
+        with self.lock:
+            self.lent[pool] -= 1
+            if self.lent[pool] or pool is self.pool:
+                return
+            del self.lent[pool]
+        if not pool.closed:
+            pool.closeall()
+
+    def resize(self, pool_size: int):
+        """ Use a pool of pool_size connections from now on.  Connections in
+            use are closed when they're returned.
+        """
+        with self.lock:
+            if pool_size == self.pool_size:
+                return
+            self.pool_size = pool_size
+            pool, idle = self._retire()
+        if idle and not pool.closed:
+            pool.closeall()
+
+    def _retire(self) -> tuple:
+        """ Stop using the current pool, returning it and whether none of its
+            connections are out.  Call holding the lock.
+        """
+        pool, self.pool = self.pool, None
+        if pool is None:
+            return None, False
+        idle = not self.lent.get(pool)
+        if idle:
+            self.lent.pop(pool, None)
+        return pool, idle
+
+    @staticmethod
+    def limit(conn):
+        """ Give conn's transaction the current deadline's time left as its
+            statement_timeout
+        """
+        deadline = current_deadline()
+        if deadline is None:
+            return
+        timeout = deadline.timeout_ms()
+        if timeout is not None:
+            with conn.cursor() as curs:
+                curs.execute("SET LOCAL statement_timeout = %s;", (timeout,))
+
+    def reset(self):
+        """ Start a new pool after the database went away.  The old pool is
+            closed now if it's idle, otherwise when its last connection out is
+            returned, so queries still running on it can finish or fail on
+            their own.
+        """
+        with self.lock:
+            pool, idle = self._retire()
+        if idle and not pool.closed:
+            pool.closeall()
+
+    def fetch_head(self) -> int:
+        with self.connection() as conn:
+            with conn.cursor() as curs:
+                curs.execute("SELECT MAX(block_number) FROM block;")
+                return curs.fetchone()[0]
+
+
+class Router(object):
+    """ Picks the database for each query """
+    def __init__(self, primary: str, replicas: list, max_lag: int=None,
+                 check_interval: int=None, max_failures: int=None):
+        current = settings()
+        self.primary = Database(primary)
+        self.replicas = [Database(dsn) for dsn in replicas]
+        self.max_lag = current.replica_max_lag if max_lag is None else max_lag
+        self.check_interval = check_interval or current.replica_check
+        self.max_failures = max_failures or current.replica_failures
+        self.turn = count()
+
+    def configure(self, current: Settings):
+        """ Apply the replica and pool settings of a reloaded Settings """
+        self.max_lag = current.replica_max_lag
+        self.check_interval = current.replica_check
+        self.max_failures = current.replica_failures
+        for db in [self.primary] + self.replicas:
+            db.resize(current.pool_size)
+
+    @property
+    def head(self) -> int:
+        return self.primary.head
+
+    def on_head(self, head):
+        """ Take the primary's head from the HeadTracker between checks """
+        if self.primary.head is None or head.block_number > self.primary.head:
+            self.primary.head = head.block_number
+
+    def lag(self, replica: Database) -> int:
+        """ Blocks replica is behind the primary, None if unknown """
+        if replica.head is None or self.primary.head is None:
+            return None
+        return max(self.primary.head - replica.head, 0)
+
+    def eligible(self, replica: Database, min_block) -> bool:
+        if replica.ejected or min_block is PRIMARY:
+            return False
+        lag = self.lag(replica)
+        if lag is None:
+            return False
+        if min_block is None:
+            return lag <= self.max_lag
+        # Blocks past the primary's last known head may be on the primary only
+        return min_block <= self.primary.head and replica.head >= min_block
+
+    def pick(self, min_block=None) -> Database:
+        """ A replica able to answer a read, or the primary """
+        candidates = [r for r in self.replicas if self.eligible(r, min_block)]
+        if not candidates:
+            return self.primary
+        return candidates[next(self.turn) % len(candidates)]
+
+    def succeeded(self, db: Database):
+        if db.failures:
+            db.failures = 0
+        if db.ejected:
+            db.ejected = False
+            log.warning("Replica {} is back".format(db.name))
+
+    def failed(self, db: Database):
+        """ Count a failed check or query, ejecting the replica after too many """
+        if db is self.primary:
+            return
+        db.failures += 1
+        if db.failures >= self.max_failures and not db.ejected:
+            db.ejected = True
+            log.warning("Ejected replica {} after {} failures".format(
+                db.name, db.failures))
+        db.reset()
+
+    def check(self):
+        """ Update every database's head """
+        try:
+            head = self.primary.fetch_head()
+            if head is not None:
+                self.primary.head = max(head, self.primary.head or head)
+        except psycopg2.Error:
+            log.exception("Unable to check the primary")
+
+        for replica in self.replicas:
+            try:
+                replica.head = replica.fetch_head()
+            except psycopg2.Error as e:
+                log.warning("Replica {} check failed: {}".format(
+                    replica.name, str(e).strip()))
+                self.failed(replica)
+            else:
+                self.succeeded(replica)
+
+    def start(self):
+        """ Check the replicas in a background thread """
+        if not self.replicas:
+            return
+        thread = threading.Thread(target=self.run, name='replicas', daemon=True)
+        thread.start()
+
+    def run(self):
+        while True:
+            self.check()
+            time.sleep(self.check_interval)
+
+    def status(self) -> list:
+        """ Each replica's name, head, lag and whether it's in use """
+        return [{
+            'name': replica.name,
+            'block_number': replica.head,
+            'lag': self.lag(replica),
+            'ejected': replica.ejected,
+        } for replica in self.replicas]
@@ -0,0 +1,37 @@
+""" Background job keeping the rollup tables current
+
+Run it alongside the API (see conf/blocksapi.supervisor.conf).  Each pass only
+recomputes buckets touched by blocks indexed since the previous pass.
+"""
+import time
+import signal
+from .config import LOGGER, configure_logging, reload, settings
+from .db import AggregateModel, MinerModel, RESOLUTIONS
+
+log = LOGGER.getChild('rollup')
+
+
+def refresh(aggregates: AggregateModel, miners: MinerModel):
+    """ Bring every rollup up to date """
+    for resolution in RESOLUTIONS:
+        aggregates.refresh(resolution)
+    miners.refresh()
+
+
+def main():
+    current = settings()
+    configure_logging(current)
+    print("Starting rollup job, refreshing every {}s".format(
+        current.rollup_interval))
+    aggregates = AggregateModel(current.dsn)
+    miners = MinerModel(current.dsn)
+    signal.signal(signal.SIGHUP, lambda signum, frame: reload())
+    while True:
+        try:
+            refresh(aggregates, miners)
+        except Exception:
+            log.exception("Rollup refresh failed")
+        time.sleep(settings().rollup_interval)
+
+if __name__ == '__main__':
+    main()
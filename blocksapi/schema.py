@@ -0,0 +1,159 @@
+""" Request objects checked against the JSON schemas in docs
+
+Each endpoint's request schema is compiled once into a RequestSchema, with a
+coercer per property built from its type and format:
+
+    integer                 be_integer, with minimum and maximum
+    string                  be_string, with enum
+    string, date-time       be_datetime
+    string, address         be_address
+    string, hash            be_hash
+    array                   a tuple of its items, from a list or a comma
+                            separated string
+
+and "default" filled in when a property is missing.  The alternatives under
+anyOf name the query plans an endpoint can run, each with the properties it
+requires, tried in order.  Parsing a request makes one pass over the arguments
+given and looks up the plan for that set of arguments, so its cost doesn't
+grow with the properties an endpoint declares.
+"""
+from collections import namedtuple
+from .validate import (
+    InvalidInput,
+    be_integer,
+    be_string,
+    be_datetime,
+    be_address,
+    be_hash,
+)
+
+# The query plan a request matched, None when the schema has none, and its
+# coerced values
+Request = namedtuple('Request', ['plan', 'values'])
+
+COERCERS = {
+    ('integer', None): be_integer,
+    ('string', None): be_string,
+    ('string', 'date-time'): be_datetime,
+    ('string', 'address'): be_address,
+    ('string', 'hash'): be_hash,
+}
+
+# Cached in place of a plan when no plan matches
+_NO_PLAN = object()
+
+
+def compile_array(name: str, prop: dict):
+    """ A function coercing a list or comma separated string to a tuple of
+        prop's items, without duplicates
+    """
+    if 'items' not in prop:
+        raise ValueError("Can't validate {} without items".format(name))
+    coerce_item = compile_property(name, prop['items'])
+
+    def coerce_array(v):
+        if isinstance(v, bytes):
+            v = v.decode('utf-8')
+        if isinstance(v, str):
+            v = [item.strip() for item in v.split(',')]
+        if not isinstance(v, list):
+            raise InvalidInput("Invalid {}".format(name))
+        return tuple(dict.fromkeys(coerce_item(item) for item in v))
+
+    return coerce_array
+
+
+def compile_property(name: str, prop: dict):
+    """ A function coercing a value for prop or raising InvalidInput """
+    if prop.get('type') == 'array':
+        return compile_array(name, prop)
+
+    kind = (prop.get('type'), prop.get('format'))
+    if kind not in COERCERS:
+        raise ValueError("Can't validate {} of type {}".format(name, kind))
+    coerce = COERCERS[kind]
+
+    enum = frozenset(prop.get('enum', ()))
+    minimum = prop.get('minimum')
+    maximum = prop.get('maximum')
+    if not enum and minimum is None and maximum is None:
+        return coerce
+
+    def coerce_checked(v):
+        v = coerce(v)
+        if enum and v not in enum:
+            raise InvalidInput("Invalid {}".format(name))
+        if minimum is not None and v < minimum:
+            raise InvalidInput("Invalid {}".format(name))
+        if maximum is not None and v > maximum:
+            raise InvalidInput("Invalid {}".format(name))
+        return v
+
+    return coerce_checked
+
+
+class RequestSchema(object):
+    """ A request object schema compiled to coerce requests and pick their
+        query plan
+    """
+    def __init__(self, schema: dict):
+        properties = schema.get('properties', {})
+        self.coercers = {name: compile_property(name, prop)
+                         for name, prop in properties.items()}
+        self.defaults = {name: prop['default'] for name, prop in properties.items()
+                         if 'default' in prop}
+        self.required = frozenset(schema.get('required', ()))
+        self.plans = [(plan['title'], frozenset(plan['required']))
+                      for plan in schema.get('anyOf', ())]
+        for title, required in self.plans:
+            if not required <= set(properties):
+                raise ValueError("Plan {} requires undeclared properties".format(
+                    title))
+        # Arguments given to the plan they match
+        self.dispatch = {}
+
+    def parse(self, arguments: dict) -> Request:
+        """ Coerce the declared arguments and pick the plan they match.
+            Missing, None and empty string arguments are left out.
+        """
+        values = dict(self.defaults)
+        given = []
+        for name, value in arguments.items():
+            coerce = self.coercers.get(name)
+            if coerce is None:
+                continue
+            # Query string arguments come from tornado as lists of bytes
+            if isinstance(value, list) and value and isinstance(value[-1], bytes):
+                value = value[-1]
+            if value is None or value == '' or value == b'':
+                continue
+            values[name] = coerce(value)
+            given.append(name)
+
+        given = frozenset(given)
+        plan = self.dispatch.get(given)
+        if plan is None:
+            plan = self.dispatch[given] = self.match(given)
+
+        if plan is _NO_PLAN or not self.required <= given:
+            raise InvalidInput("Invalid request")
+
+        return Request(plan, values)
+
+    def match(self, given: frozenset):
+        """ The first plan with every property it requires given """
+        if not self.plans:
+            return None
+        for title, required in self.plans:
+            if required <= given:
+                return title
+        return _NO_PLAN
+
+
+def compile_schemas(endpoints: list) -> dict:
+    """ Endpoint URI to the RequestSchema of each endpoint with a request
+        object
+    """
+    return {endpoint['uri']: RequestSchema(endpoint['request'])
+            for endpoint in endpoints
+            if endpoint['method'] == 'POST' and endpoint.get('request')}
@@ -0,0 +1,18 @@
+-- Store block and transaction hashes as bytea instead of '\x' prefixed hex
+-- varchar.  That halves the size of the hash columns and their indexes, and
+-- lets the API read hashes as 0x hex without converting them in every query.
+-- Lookups by hash still use the existing indexes, which are rebuilt in place.
+--
+-- The indexer can keep inserting '\x' hex strings, which are bytea input.
+-- Rewrites both tables under an exclusive lock, so run it when the indexer is
+-- stopped.
+
+BEGIN;
+
+ALTER TABLE block
+    ALTER COLUMN hash TYPE bytea USING decode(substr(hash, 3), 'hex');
+
+ALTER TABLE transaction
+    ALTER COLUMN hash TYPE bytea USING decode(substr(hash, 3), 'hex');
+
+COMMIT;
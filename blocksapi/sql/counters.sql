@@ -0,0 +1,52 @@
+-- Exact row counts for the API's count service, maintained by statement-level
+-- triggers so bulk inserts from the indexer cost one UPDATE per statement.
+-- Requires PostgreSQL 10+ for transition tables.  Seed the counts while the
+-- indexer is stopped, otherwise they may be off by the rows inserted meanwhile.
+
+CREATE TABLE IF NOT EXISTS row_counter (
+    table_name      varchar(64) PRIMARY KEY,
+    row_count       bigint NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION row_counter_insert() RETURNS trigger AS $$
+BEGIN
+    UPDATE row_counter SET row_count = row_count + (SELECT COUNT(*) FROM inserted)
+    WHERE table_name = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION row_counter_delete() RETURNS trigger AS $$
+BEGIN
+    UPDATE row_counter SET row_count = row_count - (SELECT COUNT(*) FROM deleted)
+    WHERE table_name = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS block_count_insert ON block;
+CREATE TRIGGER block_count_insert AFTER INSERT ON block
+    REFERENCING NEW TABLE AS inserted
+    FOR EACH STATEMENT EXECUTE PROCEDURE row_counter_insert();
+
+DROP TRIGGER IF EXISTS block_count_delete ON block;
+CREATE TRIGGER block_count_delete AFTER DELETE ON block
+    REFERENCING OLD TABLE AS deleted
+    FOR EACH STATEMENT EXECUTE PROCEDURE row_counter_delete();
+
+DROP TRIGGER IF EXISTS transaction_count_insert ON transaction;
+CREATE TRIGGER transaction_count_insert AFTER INSERT ON transaction
+    REFERENCING NEW TABLE AS inserted
+    FOR EACH STATEMENT EXECUTE PROCEDURE row_counter_insert();
+
+DROP TRIGGER IF EXISTS transaction_count_delete ON transaction;
+CREATE TRIGGER transaction_count_delete AFTER DELETE ON transaction
+    REFERENCING OLD TABLE AS deleted
+    FOR EACH STATEMENT EXECUTE PROCEDURE row_counter_delete();
+
+INSERT INTO row_counter (table_name, row_count)
+    SELECT 'block', COUNT(*) FROM block
+    ON CONFLICT (table_name) DO UPDATE SET row_count = EXCLUDED.row_count;
+INSERT INTO row_counter (table_name, row_count)
+    SELECT 'transaction', COUNT(*) FROM transaction
+    ON CONFLICT (table_name) DO UPDATE SET row_count = EXCLUDED.row_count;
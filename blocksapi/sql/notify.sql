@@ -0,0 +1,17 @@
+-- Announce new blocks to API workers listening on the new_block channel.  Only
+-- needed with head_listen = true; without it the API polls for new blocks.
+
+CREATE OR REPLACE FUNCTION notify_new_block() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('new_block', json_build_object(
+        'block_number', NEW.block_number,
+        'hash', NEW.hash,
+        'block_timestamp', extract(epoch FROM NEW.block_timestamp)::bigint
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS block_notify ON block;
+CREATE TRIGGER block_notify AFTER INSERT OR UPDATE ON block
+    FOR EACH ROW EXECUTE PROCEDURE notify_new_block();
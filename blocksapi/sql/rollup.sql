@@ -0,0 +1,34 @@
+-- Rollup tables maintained by `blocksapi-rollup`.  These are owned by the API,
+-- not the indexer, and can be dropped and rebuilt at any time.
+
+-- Highest block number each rollup has been refreshed through
+CREATE TABLE IF NOT EXISTS rollup_state (
+    name            varchar(64) PRIMARY KEY,
+    block_number    bigint NOT NULL
+);
+
+-- Per-bucket block and transaction aggregates.  difficulty and size are sums,
+-- the API divides them by block_count to serve means.
+CREATE TABLE IF NOT EXISTS block_aggregate (
+    resolution          varchar(6) NOT NULL,
+    bucket              timestamp NOT NULL,
+    block_count         integer NOT NULL,
+    transaction_count   bigint NOT NULL,
+    gas_used            numeric NOT NULL,
+    gas_limit           numeric NOT NULL,
+    difficulty          numeric NOT NULL,
+    size                bigint NOT NULL,
+    first_block         bigint NOT NULL,
+    last_block          bigint NOT NULL,
+    PRIMARY KEY (resolution, bucket)
+);
+
+-- Blocks and gas per miner per UTC day.  miner is stored lower case.
+CREATE TABLE IF NOT EXISTS miner_daily (
+    day             date NOT NULL,
+    miner           varchar(42) NOT NULL,
+    block_count     integer NOT NULL,
+    gas_used        numeric NOT NULL,
+    last_block      bigint NOT NULL,
+    PRIMARY KEY (day, miner)
+);
@@ -0,0 +1,158 @@
+""" In-memory map of block timestamps to block numbers
+
+Block timestamps only move forward, so a sorted array of timestamps can be
+binary searched to turn a time window into a block number range.  The index
+costs 8 bytes per block (two 4 byte arrays) and lets time range queries use
+the block_number primary key.
+"""
+import calendar
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+import psycopg2
+from .config import LOGGER, settings
+
+log = LOGGER.getChild('timeindex')
+
+
+def to_epoch(dt: datetime) -> int:
+    """ Seconds since the epoch for a datetime.  Naive datetimes are UTC, like
+        block_timestamp.
+    """
+    return calendar.timegm(dt.utctimetuple())
+
+
+class TimestampIndex(object):
+    """ Sorted (block_number, timestamp) pairs for every block in the DB
+
+    Timestamps are stored as the running maximum so the array stays sorted even
+    if a block ever has an earlier timestamp than its parent.
+    """
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.numbers = array('I')
+        self.timestamps = array('I')
+        self.ready = False
+        self.lock = threading.Lock()
+        # Held by the thread loading
+        self.loading = threading.Lock()
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def start(self):
+        """ Load the index in a background thread """
+        thread = threading.Thread(target=self.load, name='timeindex',
+                                  daemon=True)
+        thread.start()
+
+    def load(self):
+        """ Load every block after the last one indexed, unless another
+            thread is already loading.  The index answers from the blocks it
+            has until the new ones are all in.
+        """
+        if not self.loading.acquire(blocking=False):
+            return
+        try:
+            self._load()
+        finally:
+            self.loading.release()
+
+        if not self.ready:
+            log.info("Loaded timestamps for {} blocks".format(len(self)))
+            self.ready = True
+
+    def _load(self):
+        with self.lock:
+            after = self.numbers[-1] if self.numbers else -1
+            latest = self.timestamps[-1] if self.timestamps else 0
+
+        numbers = array('I')
+        timestamps = array('I')
+        conn = psycopg2.connect(self.dsn)
+        try:
+            # A named cursor streams the rows instead of fetching them all
+            with conn.cursor(name='timestamp_index') as curs:
+                curs.itersize = settings().cursor_batch
+                curs.execute(
+                    "SELECT block_number,"
+                    " extract(epoch FROM block_timestamp)::bigint"
+                    " FROM block WHERE block_number > %s"
+                    " ORDER BY block_number;", (after,))
+                for block_number, timestamp in curs:
+                    latest = max(timestamp, latest)
+                    numbers.append(block_number)
+                    timestamps.append(latest)
+        finally:
+            conn.close()
+
+        with self.lock:
+            if self.numbers and numbers and numbers[0] <= self.numbers[-1]:
+                cut = bisect_left(self.numbers, numbers[0])
+                del self.numbers[cut:]
+                del self.timestamps[cut:]
+            self.numbers.extend(numbers)
+            self.timestamps.extend(timestamps)
+
+    def refresh(self):
+        """ Pick up blocks indexed since the last load """
+        if not self.ready:
+            return
+        try:
+            self.load()
+        except psycopg2.Error:
+            log.exception("Unable to refresh timestamp index")
+
+    def add_head(self, head):
+        """ Extend the index with a new chain head, loading any blocks in
+            between from the DB in a background thread.  Heads arriving while
+            it loads are left to the next head after it.
+        """
+        if not self.ready or self.loading.locked():
+            return
+        if self.numbers and head.block_number > self.numbers[-1] + 1:
+            thread = threading.Thread(target=self.refresh, name='timeindex',
+                                      daemon=True)
+            thread.start()
+        else:
+            self.extend(head.block_number, head.block_timestamp)
+
+    def extend(self, block_number: int, timestamp: int):
+        """ Add a block.  A block number at or below the last one indexed means
+            the chain was reorganized and drops everything from there up.
+        """
+        with self.lock:
+            if self.numbers and block_number <= self.numbers[-1]:
+                cut = bisect_left(self.numbers, block_number)
+                del self.numbers[cut:]
+                del self.timestamps[cut:]
+
+            if self.timestamps:
+                timestamp = max(timestamp, self.timestamps[-1])
+
+            self.numbers.append(block_number)
+            self.timestamps.append(timestamp)
+
+    def block_range(self, start_time: datetime, end_time: datetime) -> tuple:
+        """ Get the (first, last, count) block numbers for a time window, or
+            None if the index isn't loaded.  last is None when the window runs
+            past the newest indexed block, and first > last when no blocks fall
+            inside it.
+        """
+        start = to_epoch(start_time)
+        end = to_epoch(end_time)
+
+        with self.lock:
+            if not self.ready or not self.timestamps:
+                return None
+
+            i = bisect_left(self.timestamps, start)
+            j = bisect_right(self.timestamps, end)
+
+            if i == len(self.timestamps):
+                return (self.numbers[-1] + 1, None, None)
+            elif j == len(self.timestamps):
+                return (self.numbers[i], None, None)
+            else:
+                return (self.numbers[i], self.numbers[j] - 1, j - i)
@@ -0,0 +1,208 @@
+""" Per-request tracing spans written as JSON lines
+
+Each request gets a Trace with a root span, and the handler adds child spans
+for rate limiting, body parsing, validation, the query flight and encoding.
+Queries run on the flight's thread under traced(), where span() adds spans for
+each database round trip under the flight's span.
+
+Every request records its spans, which is a few clock reads and small objects.
+Only the ones sampled when they started, or that took longer than the slow
+threshold, are written: one JSON object a line, appended with a single write
+so workers can share the file.  Sampled traces' IDs go back in the X-Trace-Id
+header.  Whether a trace is slow is only known once the response has been
+sent, so slow traces are found in the file by name and start time instead.
+"""
+import os
+import json
+import time
+import random
+import itertools
+import threading
+from contextlib import contextmanager, nullcontext
+
+TRACE_HEADER = 'X-Trace-Id'
+
+_local = threading.local()
+
+# Entered in place of a span when nothing is being traced
+_NO_SPAN = nullcontext()
+
+
+class Span(object):
+    """ A timed operation within a trace, ended when its with block exits.
+        A threaded span is the current span of its thread while it runs.
+    """
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'start', 'duration',
+                 'attrs', 'threaded', 'outer')
+
+    def __init__(self, trace, span_id: int, parent_id: int, name: str,
+                 attrs: dict, threaded: bool=False):
+        self.trace = trace
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.threaded = threaded
+        self.outer = None
+        self.start = time.perf_counter()
+        self.duration = None
+
+    def __enter__(self):
+        if self.threaded:
+            self.outer = getattr(_local, 'parent', None)
+            _local.parent = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end()
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        if self.threaded:
+            _local.parent = self.outer
+
+    def end(self):
+        self.duration = time.perf_counter() - self.start
+
+    def to_dict(self, origin: float) -> dict:
+        return {
+            'id': self.span_id,
+            'parent': self.parent_id,
+            'name': self.name,
+            'start_ms': round((self.start - origin) * 1e3, 3),
+            'duration_ms': None if self.duration is None
+                           else round(self.duration * 1e3, 3),
+            'attrs': self.attrs,
+        }
+
+
+class Trace(object):
+    """ The spans of one request, under a root span named for it """
+    def __init__(self, name: str, sampled: bool=False):
+        self.trace_id = os.urandom(16).hex()
+        self.sampled = sampled
+        self.started = time.time()
+        self.spans = []
+        self._ids = itertools.count(1)
+        self.root = self.start_span(name, None)
+
+    def start_span(self, name: str, parent: Span=None, attrs: dict=None,
+                   threaded: bool=False) -> Span:
+        """ Start a span, to be used in a with block or end()ed """
+        span = Span(self, next(self._ids),
+                    parent.span_id if parent is not None else None, name,
+                    attrs or {}, threaded)
+        # Appending is atomic, so query threads can add spans too
+        self.spans.append(span)
+        return span
+
+    def span(self, name: str, parent: Span=None, **attrs) -> Span:
+        """ A span under parent, or the root span, to time a with block """
+        return self.start_span(name, parent or self.root, attrs)
+
+    @property
+    def duration(self) -> float:
+        return self.root.duration
+
+    def to_dict(self) -> dict:
+        origin = self.root.start
+        return {
+            'trace_id': self.trace_id,
+            'name': self.root.name,
+            'time': self.started,
+            'duration_ms': round(self.duration * 1e3, 3),
+            'sampled': self.sampled,
+            'attrs': self.root.attrs,
+            'spans': [span.to_dict(origin) for span in self.spans[1:]],
+        }
+
+
+class NoTrace(object):
+    """ Stands in for a Trace when tracing is off """
+    trace_id = None
+    root = None
+    sampled = False
+
+    def __bool__(self):
+        return False
+
+    def span(self, name: str, parent: Span=None, **attrs):
+        return _NO_SPAN
+
+
+NO_TRACE = NoTrace()
+
+
+class Tracer(object):
+    """ Starts traces and appends the ones kept to path.  Without a path
+        nothing is traced.
+    """
+    def __init__(self, path: str=None, sample: float=0.0, slow: float=None):
+        self.path = None
+        self.fd = None
+        self.lock = threading.Lock()
+        self.configure(path, sample, slow)
+
+    def configure(self, path: str, sample: float, slow: float):
+        """ Write to path from the next trace kept, keeping a sample rate of
+            traces and every one slower than slow seconds
+        """
+        self.sample = sample
+        self.slow = slow
+        if path != self.path:
+            with self.lock:
+                if self.fd is not None:
+                    os.close(self.fd)
+                self.path = path or None
+                # Opened on first write, in the worker process
+                self.fd = None
+
+    def start(self, name: str):
+        """ A new Trace, or NO_TRACE when tracing is off """
+        if self.path is None:
+            return NO_TRACE
+        return Trace(name, random.random() < self.sample)
+
+    def finish(self, trace, **attrs) -> bool:
+        """ End the trace's root span and write the trace if it was sampled or
+            slow.  Returns whether it was written.
+        """
+        if not trace:
+            return False
+        trace.root.attrs.update(attrs)
+        trace.root.end()
+        if not trace.sampled \
+                and (self.slow is None or trace.duration < self.slow):
+            return False
+        self.write(trace)
+        return True
+
+    def write(self, trace: Trace):
+        line = (json.dumps(trace.to_dict(), default=str) + '\n').encode('utf-8')
+        with self.lock:
+            if self.path is None:
+                return
+            if self.fd is None:
+                self.fd = os.open(self.path,
+                                  os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            os.write(self.fd, line)
+
+
+@contextmanager
+def traced(parent: Span):
+    """ Add spans made with span() in this thread under parent """
+    previous = getattr(_local, 'parent', None)
+    _local.parent = parent
+    try:
+        yield
+    finally:
+        _local.parent = previous
+
+
+def span(name: str, **attrs):
+    """ A span under the current span of this thread, if traced() set one, to
+        time a with block
+    """
+    parent = getattr(_local, 'parent', None)
+    if parent is None:
+        return _NO_SPAN
+    return parent.trace.start_span(name, parent, attrs, threaded=True)
@@ -1,4 +1,30 @@
 """ Various utility functions """
+from decimal import Decimal
+from psycopg2.extensions import new_type
+
+
+def bytea_to_hex(value, cursor):
+    """ Typecaster reading bytea, which Postgres sends as \\x and hex, as 0x
+        and hex
+    """
+    if value is None:
+        return None
+    return '0x' + value[2:]
+
+HEXBYTEA = new_type((17,), 'HEXBYTEA', bytea_to_hex)
+
+
+def numeric_to_int(value, cursor):
+    """ Typecaster reading numerics without a fractional part as ints, which
+        are smaller and faster than Decimal
+    """
+    if value is None:
+        return None
+    if '.' in value or value == 'NaN':
+        return Decimal(value)
+    return int(value)
+
+NUMERIC_INT = new_type((1700,), 'NUMERIC_INT', numeric_to_int)
 
 def pg_varchar_to_hex(h):
     if h[:2] == "\\x":
@@ -1,8 +1,20 @@
-""" Data validation and coercion """
+""" Data validation and coercion
+
+eth_utils and dateutil are slow to import, so they aren't until first needed.
+Addresses and hashes are checked against precompiled patterns, and the results
+for the most recent ones are cached, as a few hot addresses make up most
+requests.  eth_utils is only needed for mixed case addresses, to verify their
+checksum.
+"""
 import re
 from datetime import datetime
-from dateutil.parser import parse as parse_date
-from eth_utils.address import is_address, to_normalized_address
+from functools import lru_cache
+
+# Addresses and hashes remembered
+CACHE_SIZE = 4096
+
+ADDRESS = re.compile(r'(?:0[xX])?([A-Fa-f0-9]{40})')
+HASH = re.compile(r'(0x)?[A-Fa-f0-9]+')
 
 
 class InvalidInput(ValueError):
@@ -17,7 +29,7 @@ def be_integer(v):
     else:
         try:
             return int(v)
-        except ValueError:
+        except (ValueError, TypeError):
             raise InvalidInput("Input needs to be an integer")
 
 def be_string(v):
@@ -32,37 +44,63 @@ def be_string(v):
 
 def be_hash(v):
     """ Make sure v is a hexidecimal hash """
-    
-    v = be_string(v)
+    return _normalize_hash(be_string(v))
 
-    if not re.match(r'^(0x)?[A-Fa-f0-9]+$', v):
+@lru_cache(maxsize=CACHE_SIZE)
+def _normalize_hash(v: str) -> str:
+    match = HASH.fullmatch(v)
+    if match is None:
         raise InvalidInput("String is not a hash")
 
-    if len(v) not in (64,66):
+    # Add the prefix if it doesn't have it
+    if match.group(1) is None:
+        v = '0x' + v
+
+    if len(v) != 66:
         raise InvalidInput("Hash is an invalid length")
 
-    # Add the prefix if it doesn't have it
-    if v[:2] != '0x':
-        return '0x' + v
-    else:
-        return v
+    return v
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_address(v: str) -> str:
+    """ v as a lower case 0x address, or None if it isn't a valid address.
+        Mixed case addresses must have a valid checksum.
+    """
+    match = ADDRESS.fullmatch(v)
+    if match is None:
+        return None
+
+    digits = match.group(1)
+    lower = digits.lower()
+    if digits != lower and digits != digits.upper():
+        from eth_utils.address import is_checksum_address
+        if not is_checksum_address(v):
+            return None
+
+    return '0x' + lower
+
+def is_address(v) -> bool:
+    """ Whether v is a valid Ethereum address """
+    return isinstance(v, str) and normalize_address(v) is not None
 
 def be_address(v):
     """ Make sure v is an Ethereum address """
-    
-    v = be_string(v)
 
-    if not is_address(v):
+    address = normalize_address(be_string(v))
+
+    if address is None:
         raise InvalidInput("Address is invalid")
 
-    # Add the prefix if it doesn't have it
-    return to_normalized_address(v)
+    return address
 
 def be_datetime(v):
     """ Make sure v is a date """
     if isinstance(v, datetime):
         return v
-    elif isinstance(v, str):
+    if isinstance(v, bytes):
+        v = v.decode('utf-8')
+    if isinstance(v, str):
+        from dateutil.parser import parse as parse_date
         try:
             return parse_date(v)
         except ValueError as e:
@@ -1,33 +1,169 @@
+import os
+import sys
 import json
+import math
+import signal
+import threading
+import psycopg2
 from tornado import httpserver
-from tornado import gen
 from tornado.ioloop import IOLoop
 import tornado.web
-from eth_utils.address import is_address
-from .config import DSN, DEFAULT_LIMIT, LOGGER
-from .db import JSONEncoder, BlockModel, TransactionModel
-from .validate import (
-    InvalidInput,
-    be_integer,
-    be_hash,
-    be_datetime,
-    be_address,
-    be_string,
+import tornado.websocket
+from tornado.iostream import StreamClosedError
+from tornado.netutil import bind_sockets
+from collections import deque
+from .config import LOGGER, Settings, configure_logging, on_reload, reload, settings
+from .db import (
+    EXACT,
+    Count,
+    JSONEncoder,
+    InvalidRange,
+    BlockModel,
+    TransactionModel,
+    AggregateModel,
+    MinerModel,
 )
-from .utils import results_hex_format, has_to_pg_varchar
-from .docs import JSON_SCHEMA
+from .validate import InvalidInput, be_address, be_integer, be_string
+from .docs import JSON_SCHEMA, UNLISTED_SCHEMA
+from .schema import compile_schemas
 from .ratelimiter import IPLimiter
-
-BLOCKS = BlockModel(DSN)
-TRANSACTIONS = TransactionModel(DSN)
+from .timeindex import TimestampIndex
+from .head import HeadTracker
+from .pubsub import Hub
+from .flight import SingleFlight
+from .deadline import Deadline, DeadlineExceeded
+from .concurrency import AIMDLimiter, Overloaded
+from .replicas import Router
+from .metrics import METRICS
+from .tracing import NO_TRACE, TRACE_HEADER, Tracer
+from .misses import AddressFilter, NegativeCache
+from .recent import RecentBlocks, copy_records
+from .reorg import ReorgDetector
+from .profiling import (
+    PROFILE_HEADER,
+    PROFILE_FILE_HEADER,
+    TOKEN_HEADER,
+    collapse,
+    is_admin,
+    profile_path,
+    sample_stacks,
+    sample_to_file,
+    start_profile,
+)
+from .export import EXPORTERS, ADDRESS_FILTERS, export_batches
+from .encoders import ARROW, JSON, encode, is_tabular, negotiate, register_columns
+
+# The worker's models and services, built by setup() in the process serving
+# requests, so nothing is connected or started before workers are forked
+TIME_INDEX = None
+# Also holds the connection pools prepared statements need
+ROUTER = None
+BLOCKS = None
+TRANSACTIONS = None
+AGGREGATES = None
+MINERS = None
+HEAD = None
+HUB = None
+LIMITER = None
+FLIGHTS = None
+TRACER = None
+MISSES = None
+# None when address_filter is off
+ADDRESSES = None
+# None when recent_blocks is 0
+RECENT = None
+# None when reorg_depth is 0
+REORGS = None
+_setup_pid = None
 log = LOGGER.getChild('web')
 
+# Endpoint URI to the RequestSchema its requests are parsed with, compiled from
+# the schemas the docs serve so the two can't disagree
+SCHEMAS = compile_schemas(JSON_SCHEMA + UNLISTED_SCHEMA)
+
+
+def setup():
+    """ Build the module's services for this process, once """
+    global TIME_INDEX, ROUTER, BLOCKS, TRANSACTIONS, AGGREGATES, MINERS
+    global HEAD, HUB, LIMITER, FLIGHTS, TRACER, MISSES, ADDRESSES, RECENT
+    global REORGS, _setup_pid
+    if _setup_pid == os.getpid():
+        return
+
+    current = settings()
+    TIME_INDEX = TimestampIndex(current.dsn) if current.timestamp_index else None
+    ROUTER = Router(current.dsn, current.replicas)
+    BLOCKS = BlockModel(current.dsn, TIME_INDEX, ROUTER)
+    TRANSACTIONS = TransactionModel(current.dsn, ROUTER)
+    AGGREGATES = AggregateModel(current.dsn, ROUTER)
+    MINERS = MinerModel(current.dsn, ROUTER)
+    HEAD = HeadTracker(BLOCKS, current.dsn)
+    HUB = Hub(BLOCKS, TRANSACTIONS)
+    LIMITER = AIMDLimiter()
+    FLIGHTS = SingleFlight(limiter=LIMITER)
+    TRACER = Tracer(current.trace_file, current.trace_sample, current.trace_slow)
+    MISSES = NegativeCache(current.negative_ttl)
+    ADDRESSES = AddressFilter(current.dsn) if current.address_filter else None
+    RECENT = RecentBlocks(BLOCKS, TRANSACTIONS, current.recent_blocks) \
+        if current.recent_blocks else None
+    REORGS = ReorgDetector(BLOCKS) if current.reorg_depth else None
+    for model in (BLOCKS, TRANSACTIONS, AGGREGATES, MINERS):
+        register_columns(model.column_types)
+    _setup_pid = os.getpid()
+
+
+def apply_settings(old: Settings, new: Settings):
+    """ Carry reloaded settings over to the running services.  Queries in
+        flight finish with the pools and limits they started with.
+    """
+    if _setup_pid != os.getpid():
+        return
+    LIMITER.configure(new.concurrency_min, new.concurrency_max,
+                      new.concurrency_latency)
+    FLIGHTS.resize(new.query_threads)
+    ROUTER.configure(new)
+    HEAD.configure(new.head_poll, new.stale_after)
+    TRACER.configure(new.trace_file, new.trace_sample, new.trace_slow)
+    MISSES.configure(new.negative_ttl)
+
+on_reload(apply_settings)
+
+
+def on_reorg(fork: int):
+    """ Drop what the worker's caches hold from a fork point up """
+    MISSES.clear()
+    if RECENT is not None:
+        RECENT.drop_from(fork)
+        # Load the replacements now rather than on the next head
+        if HEAD.head is not None:
+            RECENT.on_head(HEAD.head)
+
+
+def served(blocks: list):
+    """ Note the hashes of blocks served, to check them for reorgs """
+    if REORGS is not None:
+        REORGS.saw(blocks)
+
 
 class JsonHandler(tornado.web.RequestHandler):
     """Request handler where requests and responses speak JSON."""
+    # The deadlines setting limiting this handler's queries
+    endpoint = None
+    # The RequestSchema checking this handler's requests
+    schema = None
+
     def __init__(self, *args, **kwargs):
         super(JsonHandler, self).__init__(*args, **kwargs)
+        self.trace = TRACER.start('{} {}'.format(self.request.method,
+                                                 self.request.path))
+        if self.trace.sampled:
+            self.set_header(TRACE_HEADER, self.trace.trace_id)
         self.limiter = IPLimiter()
+        # Key of the flight this request waits on
+        self.flight = None
+        self.closed = False
+        # The RequestProfile when an admin asked for one
+        self.profile = None
         
     def prepare(self):
         # Init the limiter if needed
@@ -35,16 +171,26 @@ class JsonHandler(tornado.web.RequestHandler):
             self.limiter = IPLimiter()
         # Handle rate limiting if the subsystem is available
         if self.limiter and self.request.remote_ip:
-            allow = self.limiter.request(self.request.remote_ip)
+            with self.trace.span('ratelimit'):
+                allow = self.limiter.request(self.request.remote_ip)
             if not allow:
                 log.warning("Request rate limited from {}".format(self.request.remote_ip))
                 self.send_error(429, message="Request has been rate limited")
                 return
 
+        if self.request.headers.get(PROFILE_HEADER) == 'cprofile' \
+                and is_admin(self.request.headers.get(TOKEN_HEADER)):
+            self.profile = start_profile(profile_path(
+                self.trace.trace_id or os.urandom(8).hex(), 'prof'))
+            if self.profile is not None:
+                self.set_header(PROFILE_FILE_HEADER, self.profile.path)
+
         # Incorporate request JSON into arguments dictionary.
         if self.request.body:
             try:
-                json_data = json.loads(self.request.body)
+                with self.trace.span('parse_json',
+                                     bytes=len(self.request.body)):
+                    json_data = json.loads(self.request.body)
                 self.request.arguments.update(json_data)
             except json.JSONDecodeError:
                 message = 'Unable to parse JSON.'
@@ -53,7 +199,30 @@ class JsonHandler(tornado.web.RequestHandler):
         # Set up response dictionary.
         self.response = {}
 
+    def on_finish(self):
+        TRACER.finish(self.trace, status=self.get_status())
+        self.finish_profile()
+
+    def finish_profile(self):
+        if self.profile is not None:
+            profile, self.profile = self.profile, None
+            profile.finish()
+
+    def on_connection_close(self):
+        self.closed = True
+        self.finish_profile()
+        if self.flight is not None:
+            FLIGHTS.leave(self.flight)
+            self.flight = None
+
     def set_default_headers(self):
+        # Called again by send_error(), and before __init__ starts the trace
+        trace = getattr(self, 'trace', NO_TRACE)
+        if trace.sampled:
+            self.set_header(TRACE_HEADER, trace.trace_id)
+        profile = getattr(self, 'profile', None)
+        if profile is not None:
+            self.set_header(PROFILE_FILE_HEADER, profile.path)
         self.set_header('Content-Type', 'application/json')
         self.set_header('Access-Control-Allow-Origin', '*')
         self.set_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
@@ -68,300 +237,754 @@ class JsonHandler(tornado.web.RequestHandler):
         self.response = kwargs
         self.write_json()
 
-    def write_json(self):
-        output = json.dumps(self.response, cls=JSONEncoder)
-        self.write(output)
-
-
-class MainHandler(JsonHandler):
-    def get(self):
-        self.response['endpoints'] = JSON_SCHEMA
-        self.write_json()
-
-class HealthHandler(JsonHandler):
-    def get(self):
-        max_block = BLOCKS.get_latest()
-        self.response['message'] = 'ok'
-        self.response['blockNumber'] = max_block
-        self.write_json()
-
-class BlockHandler(JsonHandler):
-    def post(self):
-
-        # Single block request
-        if self.request.arguments.get('block_number'):
-
+    def parse_request(self):
+        """ The Request parsed from the arguments by the handler's schema, or
+            None after writing an error
+        """
+        try:
+            with self.trace.span('validate'):
+                return self.schema.parse(self.request.arguments)
+        except InvalidInput as e:
+            self.write_error(400, message=str(e))
+            return None
+
+    async def coalesce(self, key: tuple, query, *args, cheap: bool=False):
+        """ Respond with query(*args), which returns (status, response).  An
+            identical request already in flight shares its query and encoding.
+            Queries are limited by the endpoint's deadline and cancelled if
+            every client waiting on them disconnects.  When the worker is at
+            its concurrency limit new queries are refused, cheap ones last.
+        """
+        deadline = Deadline(settings().deadlines.get(self.endpoint))
+        # A profiled query runs on its own rather than join another
+        if self.profile is not None:
+            key += ('profile',)
+        with self.trace.span('flight', query=query.__name__,
+                             coalesced=key in FLIGHTS.flights) as span:
             try:
-                block_number = be_integer(self.request.arguments['block_number'])
-            except InvalidInput as e:
-                self.write_error(400, message=str(e))
+                future = FLIGHTS.run(key, query, *args, deadline=deadline,
+                                     cheap=cheap, span=span,
+                                     profile=self.profile)
+            except Overloaded:
+                log.warning("Shedding {}".format(key))
+                self.set_header('Retry-After', 1)
+                self.write_error(503, message="Server busy, try again")
                 return
-            
-            res = BLOCKS.get(block_number)
 
-            if len(res) == 0:
-                self.set_status(404)
+            self.flight = key
+            try:
+                shared = await future
+            except DeadlineExceeded:
+                if self.closed:
+                    return
+                # Waited for a thread or connection until there was no time
+                # left
+                METRICS.incr('deadline_rejected')
+                self.set_header('Retry-After', 1)
+                self.write_error(503, message="Server busy, try again")
+                return
+            except psycopg2.extensions.QueryCanceledError:
+                if self.closed:
+                    log.info("Cancelled query for {}".format(key))
+                    return
+                METRICS.incr('deadline_exceeded')
+                log.warning("Deadline exceeded for {}".format(key))
+                self.write_error(504, message="Query took too long")
+                return
+            finally:
+                self.flight = None
+
+        status, self.response = shared.value
+        self.set_status(status)
+        self.write_json(shared)
+
+    def write_json(self, shared=None):
+        """ Write the response in the encoding negotiated from Accept, reusing
+            encodings of a Shared response
+        """
+        fmt = negotiate(self.request.headers.get('Accept'))
+        # Arrow only carries rows
+        if fmt is ARROW and not is_tabular(self.response):
+            fmt = JSON
+        if fmt is not JSON:
+            self.set_header('Content-Type', fmt.content_type)
+        self.set_header('Vary', 'Accept')
+        with self.trace.span('encode', format=fmt.name) as span:
+            if shared is None:
+                output = encode(fmt, self.response)
+            elif fmt.name in shared.encoded:
+                output = shared.encoded[fmt.name]
             else:
-                # Format the hash field properly
-                res = results_hex_format(res, 'hash')
+                output = shared.encoded[fmt.name] = encode(fmt, self.response)
+            if span is not None:
+                span.attrs['bytes'] = len(output)
+        self.write(output)
 
-            self.response['page'] = 1
-            self.response['pages'] = 1
-            self.response['results'] = res
 
-            self.write_json()
+def totals(count) -> dict:
+    """ The total result count and number of pages for a response """
+    return {
+        'total': count.value,
+        'total_type': count.kind,
+        'pages': max(math.ceil(count.value / settings().page_limit), 1),
+    }
 
-        # Block range request
-        elif self.request.arguments.get('start') \
-            and self.request.arguments.get('end'):
 
-            try:
-                start = be_integer(self.request.arguments['start'])
-                end = be_integer(self.request.arguments['end'])
-            except InvalidInput as e:
-                self.write_error(400, message=str(e))
-                return
+# The count of a lookup known to have no results
+NO_RESULTS = Count(0, EXACT)
 
-            offset = 0
-            if self.request.arguments.get('page'):
-                try:
-                    offset = int(self.request.arguments['page']) * DEFAULT_LIMIT
-                except ValueError:
-                    self.write_error(400, message="Invalid page")
-                    return
-            
-            res = BLOCKS.get_range_number(start, end, offset=offset)
 
-            if len(res) == 0:
-                self.set_status(404)
-            else:
-                # Format the hash field properly
-                res = results_hex_format(res, 'hash')
+def results_response(res: list, count=None, **response) -> tuple:
+    """ The (status, response) for a list of results, 404 if it's empty """
+    if count is not None:
+        response.update(totals(count))
+    response['results'] = res
+    return (200 if len(res) else 404, response)
 
-            self.response['page'] = self.request.arguments.get('page', 1)
-            self.response['results'] = res
 
-            self.write_json()
+def is_missing_block(block_number: int) -> bool:
+    """ Whether a block above the head was looked up recently and not found """
+    head = HEAD.block_number
+    return head is not None and block_number > head \
+        and ('block', block_number) in MISSES
 
-        # Block range(date) request
-        elif self.request.arguments.get('start_time') \
-            and self.request.arguments.get('end_time'):
 
-            try:
-                start_time = be_datetime(self.request.arguments['start_time'])
-                end_time = be_datetime(self.request.arguments['end_time'])
-            except InvalidInput as e:
-                self.write_error(400, message=str(e))
-                return
+def miss_block(block_number: int, generation: int):
+    """ Remember a block wasn't found if it's above the head, when it may
+        yet be mined.  generation is MISSES' from before the lookup.
+    """
+    head = HEAD.block_number
+    if head is not None and block_number > head:
+        MISSES.add(('block', block_number), generation)
 
-            offset = 0
-            if self.request.arguments.get('page'):
-                try:
-                    offset = int(self.request.arguments['page']) * DEFAULT_LIMIT
-                except ValueError:
-                    self.write_error(400, message="Invalid page")
-                    return
 
-            res = BLOCKS.get_range_date(start_time, end_time, offset=offset)
+class MainHandler(JsonHandler):
+    def get(self):
+        self.response['endpoints'] = JSON_SCHEMA
+        self.write_json()
 
-            if len(res) == 0:
-                self.set_status(404)
-            else:
-                # Format the hash field properly
-                res = results_hex_format(res, 'hash')
+class HealthHandler(JsonHandler):
+    def get(self):
+        # Only query if the head tracker isn't running
+        if HEAD.head is None:
+            self.response['message'] = 'ok'
+            self.response['blockNumber'] = BLOCKS.get_latest()
+        else:
+            self.response['message'] = 'stale' if HEAD.stale else 'ok'
+            self.response['blockNumber'] = HEAD.block_number
+            self.response['lag'] = HEAD.lag
+        if ROUTER.replicas:
+            self.response['replicas'] = ROUTER.status()
+        self.write_json()
 
-            self.response['page'] = self.request.arguments.get('page', 1)
-            self.response['results'] = res
+class MetricsHandler(JsonHandler):
+    def get(self):
+        self.response['counters'] = METRICS.snapshot()
+        self.response['in_flight'] = len(FLIGHTS)
+        self.response['concurrency'] = LIMITER.status()
+        self.write_json()
 
-            self.write_json()
+class QueryHandler(JsonHandler):
+    """ Handler running the query plan from its schema that a request matches
+    """
+    # Query plan title to the name of the staticmethod running it, the
+    # request values it's called with and whether the query is cheap
+    plans = {}
+
+    def missing(self, request) -> tuple:
+        """ The (status, response) for a request known to have no results
+            without a query, or None
+        """
+        return None
+
+    def recent(self, request) -> tuple:
+        """ The (status, response) for a request answered from RECENT, or
+            None
+        """
+        return None
+
+    def respond(self, answer: tuple):
+        status, self.response = answer
+        self.set_status(status)
+        self.write_json()
 
+    async def post(self):
+        request = self.parse_request()
+        if request is None:
+            return
+
+        missing = self.missing(request)
+        if missing is not None:
+            METRICS.incr('negative_hits')
+            self.respond(missing)
+            return
+
+        if RECENT is not None:
+            recent = self.recent(request)
+            if recent is not None:
+                METRICS.incr('recent_hits')
+                self.respond(recent)
+                return
+
+        name, fields, cheap = self.plans[request.plan]
+        args = tuple(request.values.get(field) for field in fields)
+        await self.coalesce((self.endpoint, request.plan) + args,
+                            getattr(self, name), *args, cheap=cheap)
+
+
+class BlockHandler(QueryHandler):
+    endpoint = 'block'
+    schema = SCHEMAS['/block']
+    plans = {
+        'block': ('get_block', ('block_number', 'fields'), True),
+        'range_number': ('get_range_number',
+                         ('start', 'end', 'page', 'fields'), False),
+        'range_date': ('get_range_date',
+                       ('start_time', 'end_time', 'page', 'fields'), False),
+    }
+
+    def missing(self, request) -> tuple:
+        if request.plan == 'block' \
+                and is_missing_block(request.values['block_number']):
+            return results_response([], page=1, pages=1)
+        return None
+
+    def recent(self, request) -> tuple:
+        if request.plan == 'block':
+            res = RECENT.get(request.values['block_number'],
+                             request.values.get('fields'))
+            if res is not None:
+                served(res)
+                return results_response(res, page=1, pages=1)
+        return None
+
+    @staticmethod
+    def get_block(block_number, fields):
+        generation = MISSES.generation
+        res = BLOCKS.get(block_number, fields=fields)
+        if not res:
+            miss_block(block_number, generation)
+        served(res)
+        return results_response(res, page=1, pages=1)
+
+    @staticmethod
+    def get_range_number(start, end, page, fields):
+        res = BLOCKS.get_range_number(start, end,
+                                      offset=page * settings().page_limit,
+                                      fields=fields)
+        served(res)
+        return results_response(res, BLOCKS.count_range_number(start, end),
+                                page=page or 1)
+
+    @staticmethod
+    def get_range_date(start_time, end_time, page, fields):
+        res = BLOCKS.get_range_date(start_time, end_time,
+                                    offset=page * settings().page_limit,
+                                    fields=fields)
+        served(res)
+        return results_response(res,
+                                BLOCKS.count_range_date(start_time, end_time),
+                                page=page or 1)
+
+
+def truncate_input(res: list, input_limit: int) -> dict:
+    """ Cut input data longer than input_limit bytes, returning the response
+        fields saying whether any was
+    """
+    if input_limit is None or not res or 'input' not in res[0].columns:
+        return {}
+
+    # 0x and two hex digits a byte
+    length = 2 + input_limit * 2
+    truncated = False
+    for row in res:
+        if row.input is not None and len(row.input) > length:
+            row.input = row.input[:length]
+            truncated = True
+    return {'input_truncated': truncated}
+
+
+class TransactionHandler(QueryHandler):
+    endpoint = 'transaction'
+    schema = SCHEMAS['/transaction']
+    plans = {
+        'hash': ('get_transaction', ('hash', 'fields', 'input_limit'), True),
+        'block_number': ('get_block',
+                         ('block_number', 'page', 'fields', 'input_limit'),
+                         False),
+        'from_address': ('get_from',
+                         ('from_address', 'page', 'fields', 'input_limit'),
+                         False),
+        'to_address': ('get_to',
+                       ('to_address', 'page', 'fields', 'input_limit'),
+                       False),
+        'address': ('get_by_address',
+                    ('address', 'page', 'fields', 'input_limit'), False),
+    }
+
+    # Plans looking up the address in the request value of the same name
+    address_plans = ('from_address', 'to_address', 'address')
+
+    def missing(self, request) -> tuple:
+        values = request.values
+        if request.plan == 'hash' and ('hash', values['hash']) in MISSES:
+            return results_response([])
+        if request.plan == 'block_number' \
+                and is_missing_block(values['block_number']):
+            return results_response([], NO_RESULTS)
+        # Without a query or a lower() scan for addresses never seen
+        if request.plan in self.address_plans and ADDRESSES is not None \
+                and values[request.plan] not in ADDRESSES:
+            return results_response([], NO_RESULTS)
+        return None
+
+    def recent(self, request) -> tuple:
+        values = request.values
+        fields = values.get('fields')
+        if request.plan == 'hash':
+            res = RECENT.get_transaction(values['hash'], fields)
+            count = None
+        elif request.plan == 'block_number':
+            txs = RECENT.get_transactions(values['block_number'])
+            if txs is None:
+                return None
+            limit = settings().page_limit
+            offset = values['page'] * limit
+            res = copy_records(txs[offset:offset + limit], fields)
+            count = Count(len(txs), EXACT)
         else:
-            self.write_error(400, message="Invalid request")
+            return None
+        if res is None:
+            return None
+        return results_response(res, count,
+                                **truncate_input(res, values.get('input_limit')))
+
+    @staticmethod
+    def recent_address(address, page, fields, field=None) -> list:
+        """ The first page of an address' transactions if they're all in
+            RECENT, otherwise None.  Their count still needs the database, as
+            the ring can't tell if there are older ones.
+        """
+        if RECENT is None or page:
+            return None
+        res = RECENT.by_address(address, settings().page_limit, field)
+        if res is None:
+            return None
+        METRICS.incr('recent_hits')
+        return copy_records(res, fields)
+
+    @staticmethod
+    def get_transaction(tx_hash, fields, input_limit):
+        generation = MISSES.generation
+        res = TRANSACTIONS.get(tx_hash, fields=fields)
+        if not res:
+            MISSES.add(('hash', tx_hash), generation)
+        return results_response(res, **truncate_input(res, input_limit))
+
+    @staticmethod
+    def get_block(block_number, page, fields, input_limit):
+        generation = MISSES.generation
+        res = TRANSACTIONS.get_block(block_number,
+                                     offset=page * settings().page_limit,
+                                     fields=fields)
+        if not res:
+            miss_block(block_number, generation)
+        return results_response(res, TRANSACTIONS.count_block(block_number),
+                                **truncate_input(res, input_limit))
+
+    @staticmethod
+    def get_from(address, page, fields, input_limit):
+        res = TransactionHandler.recent_address(address, page, fields,
+                                                'from_address')
+        if res is None:
+            res = TRANSACTIONS.get_from(address,
+                                        offset=page * settings().page_limit,
+                                        fields=fields)
+        return results_response(res, TRANSACTIONS.count_from(address),
+                                **truncate_input(res, input_limit))
+
+    @staticmethod
+    def get_to(address, page, fields, input_limit):
+        res = TransactionHandler.recent_address(address, page, fields,
+                                                'to_address')
+        if res is None:
+            res = TRANSACTIONS.get_to(address,
+                                      offset=page * settings().page_limit,
+                                      fields=fields)
+        return results_response(res, TRANSACTIONS.count_to(address),
+                                **truncate_input(res, input_limit))
+
+    @staticmethod
+    def get_by_address(address, page, fields, input_limit):
+        res = TransactionHandler.recent_address(address, page, fields)
+        if res is None:
+            res = TRANSACTIONS.get_by_address(
+                address, offset=page * settings().page_limit, fields=fields)
+        return results_response(res, TRANSACTIONS.count_by_address(address),
+                                **truncate_input(res, input_limit))
 
 
-class TransactionHandler(JsonHandler):
+class GasPriceHandler(JsonHandler):
     def post(self):
         
-        # Single transaction request
-        if self.request.arguments.get('hash'):
-
-            try:
-                tx_hash = be_hash(self.request.arguments['hash'])
-            except InvalidInput as e:
-                self.write_error(400, message=str(e))
-                return
+        try:
+            calc_type = be_string(self.request.arguments['type'])
+        except InvalidInput as e:
+            self.write_error(400, message=str(e))
+            return
 
-            # Garbage due to weird storage in DB.  TODO Fix this
-            if tx_hash[:2] == "0x":
-                tx_hash = has_to_pg_varchar(tx_hash)
-            
-            res = TRANSACTIONS.get(tx_hash)
+        try:
+            block_length = be_integer(self.request.arguments.get('block_length'))
+        except InvalidInput:
+            block_length = 500
 
-            if len(res) == 0:
-                self.set_status(404)
-            else:
-                res = results_hex_format(res, 'hash')
+        if calc_type == 'mean':
+            res = TRANSACTIONS.get_mean_gas_price(block_length)
+        else:
+            res = TRANSACTIONS.get_average_gas_price(block_length)
 
-            self.response['results'] = res
+        self.response['results'] = int(res)
 
-            self.write_json()
+        self.write_json()
 
-        # Transactions for a block
-        elif self.request.arguments.get('block_number'):
 
-            try:
-                block_number = be_integer(self.request.arguments['block_number'])
-            except InvalidInput as e:
-                self.write_error(400, message=str(e))
-                return
+class AggregateHandler(QueryHandler):
+    endpoint = 'aggregate'
+    schema = SCHEMAS['/aggregate']
+    plans = {
+        'range': ('get_range', ('interval', 'start_time', 'end_time', 'page'),
+                  False),
+    }
 
-            offset = 0
-            if self.request.arguments.get('page'):
-                try:
-                    offset = int(self.request.arguments['page']) * DEFAULT_LIMIT
-                except ValueError:
-                    self.write_error(400, message="Invalid page")
-                    return
-            
-            res = TRANSACTIONS.get_block(block_number, offset=offset)
+    @staticmethod
+    def get_range(resolution, start_time, end_time, page):
+        try:
+            res = AGGREGATES.get_range(resolution, start_time, end_time,
+                                       offset=page * settings().page_limit)
+        except InvalidRange as e:
+            return (400, {'message': str(e)})
+
+        return (200 if len(res) else 404, {
+            'page': page or 1,
+            'interval': resolution,
+            'results': res,
+        })
+
+
+class MinerHandler(QueryHandler):
+    endpoint = 'miner'
+    schema = SCHEMAS['/miner']
+    plans = {
+        'stats': ('get_stats', ('start_time', 'end_time', 'miner', 'page'),
+                  False),
+    }
+
+    @staticmethod
+    def get_stats(start_time, end_time, miner, page):
+        try:
+            res = MINERS.get_stats(start_time, end_time, miner,
+                                   offset=page * settings().page_limit)
+        except InvalidRange as e:
+            return (400, {'message': str(e)})
 
-            if len(res) == 0:
-                self.set_status(404)
-            else:
-                res = results_hex_format(res, 'hash')
+        return (200 if len(res) else 404, {
+            'page': page or 1,
+            'results': res,
+        })
 
-            self.response['results'] = res
 
-            self.write_json()
+class ProfileHandler(JsonHandler):
+    """ Sample this worker's stacks for admins, see profiling """
+    schema = SCHEMAS['/admin/profile']
 
-        # Transactions for an account
-        elif self.request.arguments.get('from_address'):
+    async def post(self):
+        if not is_admin(self.request.headers.get(TOKEN_HEADER)):
+            self.write_error(403, message="Forbidden")
+            return
 
-            try:
-                if self.request.arguments.get('from_address'):
-                    from_address = be_address(self.request.arguments['from_address'])
-            except InvalidInput as e:
-                self.write_error(400, message=str(e))
-                return
+        request = self.parse_request()
+        if request is None:
+            return
 
-            offset = 0
-            if self.request.arguments.get('page'):
-                try:
-                    offset = int(self.request.arguments['page']) * DEFAULT_LIMIT
-                except ValueError:
-                    self.write_error(400, message="Invalid page")
-                    return
+        # On another thread so the IOLoop carries on and gets sampled
+        stacks = await IOLoop.current().run_in_executor(
+            None, sample_stacks, request.values['seconds'],
+            request.values['hz'])
+        self.set_header('Content-Type', 'text/plain; charset=utf-8')
+        self.write(collapse(stacks))
 
-            res = TRANSACTIONS.get_from(from_address)
 
-            if len(res) == 0:
-                self.set_status(404)
-            else:
-                res = results_hex_format(res, 'hash')
+class SubscribeHandler(tornado.websocket.WebSocketHandler):
+    """ WebSocket pushing new blocks and address activity
 
-            self.response['results'] = res
+    Clients send {"subscribe": "blocks"} or
+    {"subscribe": "transactions", "addresses": [...]}, and the same with
+    "unsubscribe".  A client that lets too many messages queue up is
+    disconnected.
+    """
+    def prepare(self):
+        if self.request.remote_ip:
+            limiter = IPLimiter()
+            if not limiter.request(self.request.remote_ip):
+                log.warning("Request rate limited from {}".format(self.request.remote_ip))
+                self.set_status(429)
+                self.finish()
 
-            self.write_json()
+    def check_origin(self, origin):
+        return True
 
-        # Transactions for an account
-        elif self.request.arguments.get('to_address'):
+    def open(self):
+        self.queue = deque()
+        self.sending = False
+        self.watching = set()
 
-            try:
-                if self.request.arguments.get('to_address'):
-                    to_address = be_address(self.request.arguments['to_address'])
-            except InvalidInput as e:
-                self.write_error(400, message=str(e))
-                return
+    def on_message(self, message):
+        try:
+            msg = json.loads(message)
+            action = 'subscribe' if 'subscribe' in msg else 'unsubscribe'
+            topic = be_string(msg[action])
+            addresses = [be_address(a) for a in msg.get('addresses', [])]
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self.reply('error', message=str(e) or "Invalid message")
+            return
 
-            offset = 0
-            if self.request.arguments.get('page'):
-                try:
-                    offset = int(self.request.arguments['page']) * DEFAULT_LIMIT
-                except ValueError:
-                    self.write_error(400, message="Invalid page")
+        if topic == 'blocks':
+            if action == 'subscribe':
+                HUB.follow_heads(self)
+            else:
+                HUB.unfollow_heads(self)
+        elif topic == 'transactions':
+            if action == 'subscribe':
+                if len(self.watching | set(addresses)) > settings().subscriber_addresses:
+                    self.reply('error', message="Too many addresses")
                     return
-
-            res = TRANSACTIONS.get_to(to_address)
-
-            if len(res) == 0:
-                self.set_status(404)
+                HUB.watch(self, addresses)
+                self.watching.update(addresses)
             else:
-                res = results_hex_format(res, 'hash')
+                HUB.unwatch(self, addresses)
+                self.watching.difference_update(addresses)
+        else:
+            self.reply('error', message="Unknown topic")
+            return
 
-            self.response['results'] = res
+        self.reply(action + 'd', topic=topic, addresses=sorted(self.watching))
 
-            self.write_json()
+    def on_close(self):
+        HUB.remove(self)
+        self.queue.clear()
 
-        # Transactions for an account
-        elif self.request.arguments.get('address'):
+    def reply(self, kind, **kwargs):
+        kwargs['type'] = kind
+        self.send(json.dumps(kwargs, cls=JSONEncoder))
 
+    def send(self, payload):
+        """ Queue an encoded message, dropping the client if it's too slow """
+        if len(self.queue) >= settings().subscriber_queue:
+            log.warning("Disconnecting slow subscriber {}".format(self.request.remote_ip))
+            HUB.remove(self)
+            self.queue.clear()
+            self.close(1008, "Too slow")
+            return
+        self.queue.append(payload)
+        if not self.sending:
+            self.sending = True
+            IOLoop.current().add_callback(self.drain)
+
+    async def drain(self):
+        try:
+            while self.queue:
+                await self.write_message(self.queue.popleft())
+        except tornado.websocket.WebSocketClosedError:
+            HUB.remove(self)
+            self.queue.clear()
+        finally:
+            self.sending = False
+
+
+def next_chunk(batches, exporter):
+    """ Fetch and encode the next batch of an export, None after the last.
+        Blocks, so run it off the IOLoop.
+    """
+    batch = next(batches, None)
+    return None if batch is None else exporter.write(batch)
+
+
+class ExportHandler(JsonHandler):
+    """ Stream a range of blocks or transactions as CSV, JSON lines or
+        Parquet.  Batches are fetched and encoded on a thread, one at a time,
+        and only written on the IOLoop.
+    """
+    schema = SCHEMAS['/export']
+
+    async def post(self):
+
+        request = self.parse_request()
+        if request is None:
+            return
+        values = request.values
+        kind = values['type']
+        fmt = values['format']
+
+        if request.plan == 'range_number':
+            start = values['start']
+            end = values.get('end')
+            if end is None:
+                end = HEAD.block_number or BLOCKS.get_latest()
+        else:
             try:
-                if self.request.arguments.get('address'):
-                    address = be_address(self.request.arguments['address'])
-            except InvalidInput as e:
+                start, end = BLOCKS.get_range(values['start_time'],
+                                              values['end_time'])
+            except InvalidRange as e:
                 self.write_error(400, message=str(e))
                 return
 
-            offset = 0
-            if self.request.arguments.get('page'):
-                try:
-                    offset = int(self.request.arguments['page']) * DEFAULT_LIMIT
-                except ValueError:
-                    self.write_error(400, message="Invalid page")
-                    return
-
-            res = TRANSACTIONS.get_by_address(address)
-
-            if len(res) == 0:
-                self.set_status(404)
-            else:
-                res = results_hex_format(res, 'hash')
-
-            self.response['results'] = res
-
-            self.write_json()
-
+        # Offered when pyarrow is installed
+        if fmt not in EXPORTERS:
+            self.write_error(400, message="Invalid format")
+            return
 
-class GasPriceHandler(JsonHandler):
-    def post(self):
-        
-        try:
-            calc_type = be_string(self.request.arguments['type'])
-        except InvalidInput as e:
-            self.write_error(400, message=str(e))
+        if start is None or end is None or start > end:
+            self.write_error(404, message="No blocks in range")
             return
 
-        try:
-            block_length = be_integer(self.request.arguments.get('block_length'))
-        except InvalidInput as e:
-            block_length = 500
+        filters = {name: values[name] for name in ADDRESS_FILTERS
+                   if name in values}
 
-        if calc_type == 'mean':
-            res = TRANSACTIONS.get_mean_gas_price(block_length)
-        else:
-            res = TRANSACTIONS.get_average_gas_price(block_length)
+        model, batches = export_batches(BLOCKS, TRANSACTIONS, kind, start, end,
+                                        filters)
+        exporter = EXPORTERS[fmt](model.columns)
 
-        self.response['results'] = int(res)
+        self.set_header('Content-Type', exporter.content_type)
+        self.set_header('Content-Disposition',
+            'attachment; filename="{}-{}-{}.{}"'.format(
+                kind, start, end, exporter.extension))
+        self.set_header('X-Export-Start', start)
+        self.set_header('X-Export-End', end)
 
-        self.write_json()
+        loop = IOLoop.current()
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, next_chunk, batches,
+                                                   exporter)
+                if chunk is None:
+                    break
+                self.write(chunk)
+                # Waits for the client to take the chunk before fetching more
+                await self.flush()
+            self.write(await loop.run_in_executor(None, exporter.close))
+            self.finish()
+        except StreamClosedError:
+            log.info("Export of {} {}-{} interrupted".format(kind, start, end))
+        finally:
+            batches.close()
 
 
 class Application(tornado.web.Application):
     def __init__(self):
         handlers = [
             (r"/block/?", BlockHandler),
+            (r"/aggregate/?", AggregateHandler),
+            (r"/miner/?", MinerHandler),
+            (r"/subscribe/?", SubscribeHandler),
+            (r"/export/?", ExportHandler),
             # Disabled until we have more data
             # (r"/gas-price/?", GasPriceHandler),
             # (r"/transaction/?", TransactionHandler),
             (r"/health/?", HealthHandler),
+            (r"/metrics/?", MetricsHandler),
+            (r"/admin/profile/?", ProfileHandler),
             (r"/?", MainHandler),
         ]
+        setup()
         tornado.web.Application.__init__(self, handlers)
 
+# Sent on from the parent to every worker
+FORWARDED_SIGNALS = (signal.SIGHUP, signal.SIGTERM, signal.SIGUSR1)
+
+
+def sample_worker():
+    """ Sample stacks to a file in profile_dir, off the IOLoop """
+    threading.Thread(target=sample_to_file,
+                     args=(settings().profile_seconds,),
+                     name='profile', daemon=True).start()
+
+
+def fork_workers(count: int, max_restarts: int=100):
+    """ Fork count worker processes and return in each of them.  The parent
+        stays to pass SIGHUP, SIGTERM and SIGUSR1 on to the workers and
+        replace any that crash, and exits once they've all stopped.
+    """
+    children = set()
+    stopping = []
+
+    def forward(signum, frame):
+        if signum == signal.SIGTERM:
+            stopping.append(signum)
+        for pid in list(children):
+            os.kill(pid, signum)
+
+    def fork() -> bool:
+        pid = os.fork()
+        if pid == 0:
+            for signum in FORWARDED_SIGNALS:
+                signal.signal(signum, signal.SIG_DFL)
+            return True
+        children.add(pid)
+        return False
+
+    for signum in FORWARDED_SIGNALS:
+        signal.signal(signum, forward)
+    for i in range(count):
+        if fork():
+            return
+
+    restarts = 0
+    while children:
+        pid, status = os.wait()
+        children.discard(pid)
+        if stopping or (os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0):
+            continue
+        log.warning("Worker {} died with status {}".format(pid, status))
+        restarts += 1
+        if restarts > max_restarts:
+            log.error("Too many worker restarts, giving up")
+            continue
+        if fork():
+            return
+    sys.exit(0)
+
+
 def main(port=8081):
+    current = settings()
+    configure_logging(current)
     print("Starting server on port {}".format(port))
+    sockets = bind_sockets(port)
+    if current.workers > 1:
+        fork_workers(current.workers)
     app = Application()
-    app.listen(port)
+    server = httpserver.HTTPServer(app)
+    server.add_sockets(sockets)
+    IOLoop.current().asyncio_loop.add_signal_handler(signal.SIGHUP, reload)
+    IOLoop.current().asyncio_loop.add_signal_handler(signal.SIGUSR1,
+                                                     sample_worker)
+    if TIME_INDEX is not None:
+        TIME_INDEX.start()
+        HEAD.subscribe(TIME_INDEX.add_head)
+    if ADDRESSES is not None:
+        ADDRESSES.start()
+        HEAD.subscribe(ADDRESSES.add_head)
+    HEAD.subscribe(MISSES.on_head)
+    if RECENT is not None:
+        RECENT.start()
+        HEAD.subscribe(RECENT.on_head)
+    if REORGS is not None:
+        REORGS.subscribe(on_reorg)
+        REORGS.start()
+        HEAD.subscribe(REORGS.on_head)
+    HEAD.subscribe(HUB.on_head)
+    HEAD.subscribe(ROUTER.on_head)
+    ROUTER.start()
+    HEAD.start()
     IOLoop.instance().start()
 
 if __name__ == '__main__':
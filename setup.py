@@ -21,6 +21,7 @@ setup(
     keywords='ethereum',
     packages=find_packages(exclude=['build', 'dist']),
     #package_data={'': ['README.md', 'sql/initial.sql']},
+    package_data={'blocksapi': ['sql/*.sql']},
     install_requires=[
         'rawl>=0.2.6b1',
         'tornado>=4.5.2',
@@ -31,6 +32,14 @@ setup(
         'eth-hash==0.1.3', # Bug in 0.1.3 install
         'eth_utils>=1.0.3',
     ],
+    extras_require={
+        # Binary response encodings, see blocksapi/encoders.py
+        'binary': [
+            'msgpack>=1.0',
+            'cbor2>=4.0.0',
+            'pyarrow>=0.12.0',
+        ],
+    },
     # Every damned Ethereum python package in PyPi seems afflicted with a pypandoc
     # related issue.  For some reason, their releases on github work just fine, so
     # for now, we use these:
@@ -42,7 +51,9 @@ setup(
     ],
     entry_points={
         'console_scripts': [
-            'blocksapi = blocksapi.web:main'
+            'blocksapi = blocksapi.web:main',
+            'blocksapi-rollup = blocksapi.rollup:main',
+            'blocksapi-export = blocksapi.export:main',
         ]
     },
 )
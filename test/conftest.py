@@ -0,0 +1,16 @@
+from configparser import ConfigParser
+import pytest
+from blocksapi import config
+
+# What unit tests run with instead of the host's configuration files
+TEST_CONFIG = "[default]\ndsn = postgresql://localhost/blocks\n"
+
+
+@pytest.fixture
+def settings():
+    """ Settings parsed from TEST_CONFIG, current for the test """
+    parser = ConfigParser()
+    parser.read_string(TEST_CONFIG)
+    previous = config.use(config.parse(parser))
+    yield config.settings()
+    config.use(previous)
@@ -0,0 +1,126 @@
+import pytest
+import requests
+import threading
+import json
+from dateutil.parser import parse
+from blocksapi.web import Application, IOLoop
+    
+TEST_PORT = 8082
+LOOP = IOLoop.instance()
+
+def start():
+    global thread, LOOP
+    app = Application()
+    app.listen(TEST_PORT)
+    thread = threading.Thread(target=LOOP.start)
+    thread.start()
+    return "http://localhost:{}".format(TEST_PORT)
+
+def stop():
+    global thread, LOOP
+    LOOP.add_callback(LOOP.stop)
+    thread.join()
+
+def is_valid_aggregate_schema(agg):
+    """ Test that an object is the correct schema for an aggregate bucket """
+
+    try:
+        assert 'bucket' in agg
+        assert 'block_count' in agg
+        assert 'transaction_count' in agg
+        assert 'gas_used' in agg
+        assert 'gas_limit' in agg
+        assert 'difficulty' in agg
+        assert 'size' in agg
+        return True
+    except AssertionError:
+        return False
+
+@pytest.yield_fixture(scope="session")
+def server():
+    yield start()
+    return stop()
+
+class TestAggregate(object):
+    def make_call(self, server, payload):
+        """ Make an API call to the /aggregate endpoint """
+        return requests.post('{}/aggregate'.format(server), data=json.dumps(payload))
+
+    def test_hourly(self, server):
+        """ Test /aggregate with hourly buckets """
+
+        start_time = parse('2016-01-01 00:00:00').isoformat()
+        end_time = parse('2016-01-01 05:59:59').isoformat()
+
+        req = self.make_call(server, {
+            'interval': 'hour',
+            'start_time': start_time,
+            'end_time': end_time,
+            })
+
+        assert req.status_code == 200
+
+        resp = req.json()
+
+        # Make sure the output is sane
+        assert 'results' in resp
+        assert resp['interval'] == 'hour'
+        assert len(resp['results']) == 6
+        for agg in resp['results']:
+            assert is_valid_aggregate_schema(agg)
+            assert agg['block_count'] > 0
+
+    def test_daily_matches_blocks(self, server):
+        """ Test that a daily bucket agrees with the raw block count """
+
+        start_time = parse('2016-01-01 00:00:00').isoformat()
+        end_time = parse('2016-01-01 23:59:59').isoformat()
+
+        req = self.make_call(server, {
+            'interval': 'day',
+            'start_time': start_time,
+            'end_time': end_time,
+            })
+
+        assert req.status_code == 200
+
+        resp = req.json()
+        assert len(resp['results']) == 1
+
+        req = self.make_call(server, {
+            'interval': 'hour',
+            'start_time': start_time,
+            'end_time': end_time,
+            })
+        hourly = req.json()['results']
+
+        assert len(hourly) == 24
+        assert sum(h['block_count'] for h in hourly) == resp['results'][0]['block_count']
+
+    def test_invalid_aggregate_requests(self, server):
+        """ Test /aggregate with invalid parameters """
+
+        start_time = parse('2016-01-01 00:00:00').isoformat()
+        end_time = parse('2016-01-01 00:10:00').isoformat()
+
+        req = self.make_call(server, { 'start_time': start_time })
+        assert req.status_code == 400
+
+        req = self.make_call(server, { 'end_time': end_time })
+        assert req.status_code == 400
+
+        req = self.make_call(server, {
+            'interval': 'fortnight',
+            'start_time': start_time,
+            'end_time': end_time,
+            })
+        assert req.status_code == 400
+
+    def test_aggregate_not_found(self, server):
+        """ Test /aggregate for a range with no blocks """
+
+        future_date1 = parse('3016-01-01 00:10:00').isoformat()
+        future_date2 = parse('4016-01-01 00:10:00').isoformat()
+
+        req = self.make_call(server, { 'start_time': future_date1, 'end_time': future_date2 })
+        assert req.status_code == 404
@@ -87,6 +87,9 @@ class TestBlock(object):
         # Make sure the output is sane
         assert 'results' in resp
         assert len(resp['results']) == 10
+        assert resp['total_type'] in ('exact', 'estimate')
+        assert resp['total'] > 0
+        assert resp['pages'] >= 1
         for blk in resp['results']:
             assert is_valid_block_schema(blk)
 
@@ -0,0 +1,52 @@
+import pytest
+from blocksapi.concurrency import AIMDLimiter
+
+# Unit tests, on settings that don't come from the host
+pytestmark = pytest.mark.usefixtures('settings')
+
+class TestAIMDLimiter(object):
+    def test_limit(self):
+        """ Queries over the limit are refused """
+
+        limiter = AIMDLimiter(initial=2, latency=1)
+        assert limiter.acquire(cheap=True)
+        assert limiter.acquire(cheap=True)
+        assert not limiter.acquire(cheap=True)
+
+        limiter.release(0.1)
+        assert limiter.acquire(cheap=True)
+
+    def test_priority(self):
+        """ Cheap queries can use room scans can't """
+
+        limiter = AIMDLimiter(initial=10, latency=1, scan_share=0.5)
+        for i in range(5):
+            assert limiter.acquire()
+        assert not limiter.acquire()
+        assert limiter.acquire(cheap=True)
+
+    def test_increase(self):
+        """ Fast queries grow the limit by about one per limit's worth """
+
+        limiter = AIMDLimiter(initial=10, maximum=100, latency=1)
+        for i in range(10):
+            limiter.acquire()
+            limiter.release(0.1)
+        assert 10.9 < limiter.limit < 11
+
+    def test_decrease(self):
+        """ Slow and timed out queries shrink the limit, down to the minimum """
+
+        limiter = AIMDLimiter(initial=10, minimum=2, latency=1)
+        limiter.acquire()
+        limiter.release(5)
+        assert limiter.limit == 9
+
+        limiter.acquire()
+        limiter.release(0.1, timed_out=True)
+        assert limiter.limit == 8.1
+
+        for i in range(50):
+            limiter.acquire()
+            limiter.release(5)
+        assert limiter.limit == 2
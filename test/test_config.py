@@ -0,0 +1,63 @@
+from configparser import ConfigParser
+import pytest
+from blocksapi import config
+from blocksapi.config import ConfigError, parse
+
+# Unit tests, on settings that don't come from the host
+pytestmark = pytest.mark.usefixtures('settings')
+
+
+def make_config(text: str) -> ConfigParser:
+    parser = ConfigParser()
+    parser.read_string(text)
+    return parser
+
+
+class TestSettings(object):
+    def test_defaults(self):
+        """ Unset options get their defaults """
+
+        current = parse(make_config("[default]\ndsn = postgresql://u@h/db\n"))
+        assert current.dsn == 'postgresql://u@h/db'
+        assert current.page_limit == 500
+        assert current.concurrency_max == current.query_threads * 4
+        assert current.replicas == ()
+        assert current.deadlines['miner'] == 30
+
+    def test_sections(self):
+        """ The DSN can come from [postgresql] and deadlines from [deadlines] """
+
+        current = parse(make_config(
+            "[default]\nquery_threads = 5\n"
+            "[postgresql]\nuser = u\npass = p\n"
+            "[deadlines]\nblock = 2.5\n"))
+        assert current.dsn == 'postgresql://u:p@localhost:5432/blocks'
+        assert current.concurrency_max == 20
+        assert current.deadlines['block'] == 2.5
+
+    def test_immutable(self):
+        current = parse(make_config("[default]\ndsn = postgresql://u@h/db\n"))
+        with pytest.raises(AttributeError):
+            current.page_limit = 1
+        with pytest.raises(TypeError):
+            current.deadlines['block'] = 1
+
+    def test_invalid(self):
+        with pytest.raises(ConfigError):
+            parse(make_config("[default]\n"))
+        with pytest.raises(ConfigError):
+            parse(make_config("[default]\ndsn = x\npage_limit = many\n"))
+
+    def test_override(self):
+        """ Swapping settings notifies listeners with the old and new ones """
+
+        seen = []
+        config.on_reload(lambda old, new: seen.append((old, new)))
+        before = config.settings()
+        try:
+            after = config.override(page_limit=before.page_limit + 1)
+            assert config.settings() is after
+            assert seen[-1] == (before, after)
+        finally:
+            config.override(page_limit=before.page_limit)
+            config._listeners.pop()
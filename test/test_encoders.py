@@ -0,0 +1,139 @@
+import json
+import pytest
+from datetime import datetime, timezone
+from blocksapi import encoders
+from blocksapi.db import BlockModel, TransactionModel
+from blocksapi.encoders import (
+    ARROW,
+    CBOR,
+    JSON,
+    MSGPACK,
+    encode,
+    negotiate,
+    register_columns,
+)
+from blocksapi.records import Block, Transaction
+
+HASH = '0x5c504ed432cb51138bcf09aa5e8a410dd4a1e204ef84bfed1be16dfba1b22060'
+FROM = '0xa1e4380a3b1f749673e270229993ee55f35663b4'
+TO = '0x5df9b87991262f6ba471f09758cde1c0fc1de734'
+# More wei than fits 64 bits
+BIG = 3 * 10 ** 24
+TIMESTAMP = datetime(2018, 1, 2, 3, 4, 5)
+
+register_columns(BlockModel.column_types)
+register_columns(TransactionModel.column_types)
+
+
+def transactions() -> list:
+    return [
+        Transaction((HASH, 1, FROM, TO, BIG, 50000000000, 21000, 0, '0x')),
+        Transaction((HASH, 2, FROM, None, 7, 1, 53000, 2 ** 63, '0x6060')),
+    ]
+
+
+def blocks() -> list:
+    return [Block((1, TIMESTAMP, HASH, FROM, 2 ** 63, 17, 21000, 8000000,
+                   540))]
+
+
+def response(results: list) -> dict:
+    return {'results': results, 'count': len(results)}
+
+
+class TestNegotiate(object):
+    def test_default(self):
+        assert negotiate(None) is JSON
+        assert negotiate('') is JSON
+        assert negotiate('*/*') is JSON
+        assert negotiate('text/html') is JSON
+
+    def test_q(self):
+        """ The highest q wins, the first listed among equals """
+
+        accept = 'application/json;q=0.5, application/cbor, application/msgpack'
+        assert negotiate(accept) is CBOR
+        assert negotiate('application/cbor;q=0.2, application/msgpack;q=0.9') \
+            is MSGPACK
+        assert negotiate('application/msgpack;q=0') is JSON
+        assert negotiate('application/msgpack;q=x') is JSON
+
+    def test_alias(self):
+        assert negotiate('application/x-msgpack') is MSGPACK
+        assert negotiate('Application/MsgPack') is MSGPACK
+        assert negotiate('application/vnd.apache.arrow.stream') is ARROW
+
+    def test_unavailable(self, monkeypatch):
+        """ Formats whose library isn't installed are never picked """
+
+        monkeypatch.setattr(encoders, 'FORMATS', [JSON])
+        assert negotiate('application/cbor') is JSON
+        assert negotiate('application/msgpack, application/json;q=0.1') \
+            is JSON
+
+
+class TestEncode(object):
+    def test_json(self):
+        decoded = json.loads(encode(JSON, response(transactions())))
+        assert decoded['results'][0]['value'] == BIG
+        assert decoded['results'][0]['hash'] == HASH
+
+    @pytest.mark.skipif(encoders.msgpack is None, reason="msgpack is missing")
+    def test_msgpack(self):
+        msgpack = encoders.msgpack
+        decoded = msgpack.unpackb(encode(MSGPACK, response(transactions())),
+                                  raw=False)
+        first, second = decoded['results']
+        assert first['hash'] == bytes.fromhex(HASH[2:])
+        assert first['from_address'] == bytes.fromhex(FROM[2:])
+        assert first['input'] == b''
+        # Too big for a MessagePack int
+        assert first['value'] == str(BIG)
+        assert second['value'] == 7
+        assert second['to_address'] is None
+        assert second['nonce'] == 2 ** 63
+        assert decoded['count'] == 2
+
+        decoded = msgpack.unpackb(encode(MSGPACK, response(blocks())),
+                                  raw=False, timestamp=3)
+        block = decoded['results'][0]
+        assert block['block_timestamp'] == \
+            TIMESTAMP.replace(tzinfo=timezone.utc)
+        assert block['miner'] == bytes.fromhex(FROM[2:])
+
+    @pytest.mark.skipif(encoders.cbor2 is None, reason="cbor2 is missing")
+    def test_cbor(self):
+        cbor2 = encoders.cbor2
+        decoded = cbor2.loads(encode(CBOR, response(transactions())))
+        first, second = decoded['results']
+        assert first['hash'] == bytes.fromhex(HASH[2:])
+        assert first['value'] == BIG
+        assert second['input'] == bytes.fromhex('6060')
+        assert second['to_address'] is None
+
+        decoded = cbor2.loads(encode(CBOR, response(blocks())))
+        block = decoded['results'][0]
+        assert block['block_timestamp'] == \
+            TIMESTAMP.replace(tzinfo=timezone.utc)
+        assert block['nonce'] == 2 ** 63
+
+    @pytest.mark.skipif(not encoders.HAS_ARROW, reason="pyarrow is missing")
+    def test_arrow(self):
+        """ Results are the batch, the rest of the response is metadata """
+
+        import pyarrow.ipc
+        reader = pyarrow.ipc.open_stream(encode(ARROW,
+                                                response(transactions())))
+        metadata = json.loads(reader.schema.metadata[b'response'])
+        assert metadata == {'count': 2}
+        rows = reader.read_all().to_pylist()
+        assert rows[0]['hash'] == bytes.fromhex(HASH[2:])
+        assert rows[0]['value'] == BIG
+        assert rows[1]['to_address'] is None
+        assert rows[1]['nonce'] == 2 ** 63
+
+        reader = pyarrow.ipc.open_stream(encode(ARROW, response(blocks())))
+        block = reader.read_all().to_pylist()[0]
+        assert block['block_timestamp'] == \
+            TIMESTAMP.replace(tzinfo=timezone.utc)
+        assert block['difficulty'] == 17
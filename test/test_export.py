@@ -0,0 +1,110 @@
+import io
+import csv
+import pytest
+import requests
+import threading
+import json
+from blocksapi.web import Application, IOLoop
+    
+TEST_PORT = 8085
+LOOP = IOLoop.instance()
+
+def start():
+    global thread, LOOP
+    app = Application()
+    app.listen(TEST_PORT)
+    thread = threading.Thread(target=LOOP.start)
+    thread.start()
+    return "http://localhost:{}".format(TEST_PORT)
+
+def stop():
+    global thread, LOOP
+    LOOP.add_callback(LOOP.stop)
+    thread.join()
+
+@pytest.yield_fixture(scope="session")
+def server():
+    yield start()
+    return stop()
+
+class TestExport(object):
+    def make_call(self, server, payload):
+        """ Make an API call to the /export endpoint """
+        return requests.post('{}/export'.format(server), data=json.dumps(payload))
+
+    def test_block_csv(self, server):
+        """ Test exporting a block range as CSV """
+
+        req = self.make_call(server, { 'start': 123, 'end': 132 })
+
+        assert req.status_code == 200
+        assert req.headers['Content-Type'].startswith('text/csv')
+        assert req.headers['X-Export-Start'] == '123'
+        assert req.headers['X-Export-End'] == '132'
+
+        rows = list(csv.DictReader(io.StringIO(req.text)))
+        assert len(rows) == 10
+        assert rows[0]['block_number'] == '123'
+        assert rows[0]['hash'] == '0x37cb73b97d28b4c6530c925d669e4b0e07f16e4ff41f45d10d44f4c166d650e5'
+
+    def test_resume(self, server):
+        """ Test that resuming from a block picks up where a range left off """
+
+        full = self.make_call(server, { 'start': 123, 'end': 132 })
+        resumed = self.make_call(server, { 'start': 128, 'end': 132 })
+
+        full_rows = list(csv.DictReader(io.StringIO(full.text)))
+        resumed_rows = list(csv.DictReader(io.StringIO(resumed.text)))
+        assert resumed_rows == full_rows[5:]
+
+    def test_transaction_csv(self, server):
+        """ Test exporting the transactions of a block range """
+
+        req = self.make_call(server, {
+            'type': 'transaction',
+            'start': 46147,
+            'end': 46147,
+            })
+
+        assert req.status_code == 200
+
+        rows = list(csv.DictReader(io.StringIO(req.text)))
+        assert len(rows) == 1
+        assert rows[0]['hash'] == '0x5c504ed432cb51138bcf09aa5e8a410dd4a1e204ef84bfed1be16dfba1b22060'
+
+    def test_address_jsonl(self, server):
+        """ Test exporting an address's transactions as JSON lines """
+
+        req = self.make_call(server, {
+            'type': 'transaction',
+            'format': 'jsonl',
+            'from_address': '0xa1e4380a3b1f749673e270229993ee55f35663b4',
+            'start': 46000,
+            'end': 46200,
+            })
+
+        assert req.status_code == 200
+        assert req.headers['Content-Type'].startswith('application/x-ndjson')
+
+        rows = [json.loads(line) for line in req.text.splitlines()]
+        assert len(rows) == 1
+        assert rows[0]['to_address'].lower() == '0x5df9b87991262f6ba471f09758cde1c0fc1de734'
+
+    def test_invalid_export_requests(self, server):
+        """ Test /export with invalid parameters """
+
+        req = self.make_call(server, { 'type': 'receipt', 'start': 1, 'end': 2 })
+        assert req.status_code == 400
+
+        req = self.make_call(server, { 'format': 'xls', 'start': 1, 'end': 2 })
+        assert req.status_code == 400
+
+        req = self.make_call(server, { 'start': 'abc' })
+        assert req.status_code == 400
+
+        req = self.make_call(server, { 'type': 'transaction', 'address': 'abc',
+                                       'start': 1, 'end': 2 })
+        assert req.status_code == 400
+
+        req = self.make_call(server, { 'start': 10, 'end': 2 })
+        assert req.status_code == 404
@@ -0,0 +1,181 @@
+import threading
+import pytest
+from tornado.ioloop import IOLoop
+from tornado import gen
+from blocksapi.flight import SingleFlight
+from blocksapi.concurrency import AIMDLimiter, Overloaded
+from blocksapi.deadline import Deadline, DeadlineExceeded, current_deadline
+from blocksapi.metrics import METRICS
+
+# Unit tests, on settings that don't come from the host
+pytestmark = pytest.mark.usefixtures('settings')
+
+class TestSingleFlight(object):
+    def test_coalesce(self):
+        """ Identical calls in flight share one execution """
+
+        flights = SingleFlight(4)
+        release = threading.Event()
+        calls = []
+
+        def query(n):
+            calls.append(n)
+            release.wait(5)
+            return n * 2
+
+        async def run():
+            coalesced = METRICS.get('queries_coalesced')
+            futures = [flights.run(('double', 21), query, 21) for i in range(5)]
+            assert len(flights) == 1
+            release.set()
+            results = await gen.multi(futures)
+            assert METRICS.get('queries_coalesced') - coalesced == 4
+            return results
+
+        results = IOLoop.current().run_sync(run)
+        assert calls == [21]
+        assert [r.value for r in results] == [42] * 5
+        # Every caller gets the same object, encodings included
+        assert all(r is results[0] for r in results)
+        assert len(flights) == 0
+
+    def test_distinct_keys(self):
+        """ Different keys run separately """
+
+        flights = SingleFlight(4)
+
+        async def run():
+            return await gen.multi([
+                flights.run(('double', 1), lambda n: n * 2, 1),
+                flights.run(('double', 2), lambda n: n * 2, 2),
+            ])
+
+        results = IOLoop.current().run_sync(run)
+        assert [r.value for r in results] == [2, 4]
+
+    def test_error(self):
+        """ Every caller sees the error, and the key can run again after """
+
+        flights = SingleFlight(4)
+
+        def fail():
+            raise ValueError("nope")
+
+        async def run():
+            futures = [flights.run(('fail',), fail) for i in range(2)]
+            for future in futures:
+                with pytest.raises(ValueError):
+                    await future
+            return await flights.run(('fail',), lambda: 'ok')
+
+        assert IOLoop.current().run_sync(run).value == 'ok'
+
+    def test_leave(self):
+        """ A flight is cancelled once every caller has left """
+
+        flights = SingleFlight(4)
+        release = threading.Event()
+        seen = []
+
+        def query():
+            release.wait(5)
+            seen.append(current_deadline().cancelled)
+            return 'done'
+
+        async def run():
+            deadline = Deadline()
+            future = flights.run(('slow',), query, deadline=deadline)
+            flights.run(('slow',), query)
+            flights.leave(('slow',))
+            assert not deadline.cancelled
+            flights.leave(('slow',))
+            assert deadline.cancelled
+            # New callers don't join the cancelled flight
+            assert len(flights) == 0
+            release.set()
+            return await future
+
+        assert IOLoop.current().run_sync(run).value == 'done'
+        assert seen == [True]
+
+    def test_resize(self):
+        """ A flight running on the old pool finishes after a resize """
+
+        flights = SingleFlight(1)
+        release = threading.Event()
+
+        def query(n):
+            release.wait(5)
+            return n
+
+        async def run():
+            before = flights.run(('n', 1), query, 1)
+            flights.resize(2)
+            after = flights.run(('n', 2), lambda n: n, 2)
+            # Not stuck behind the flight holding the old pool's only thread
+            assert (await after).value == 2
+            release.set()
+            return (await before).value
+
+        assert IOLoop.current().run_sync(run) == 1
+
+    def test_shed(self):
+        """ New flights over the limit are refused, joining one is not """
+
+        flights = SingleFlight(4, AIMDLimiter(initial=1, latency=10))
+        release = threading.Event()
+
+        def query():
+            release.wait(5)
+            return 'done'
+
+        async def run():
+            future = flights.run(('slow',), query, cheap=True)
+            joined = flights.run(('slow',), query, cheap=True)
+            with pytest.raises(Overloaded):
+                flights.run(('other',), query, cheap=True)
+            release.set()
+            await future
+            assert flights.limiter.in_flight == 0
+            return await joined
+
+        assert IOLoop.current().run_sync(run).value == 'done'
+
+class TestDeadline(object):
+    def test_timeout(self):
+        """ Queries get the time left, and none once it has passed """
+
+        deadline = Deadline(10)
+        assert 9000 < deadline.timeout_ms() <= 10000
+
+        deadline.expires -= 10
+        with pytest.raises(DeadlineExceeded):
+            deadline.timeout_ms()
+
+    def test_no_limit(self):
+        """ A deadline without seconds only stops when cancelled """
+
+        deadline = Deadline()
+        assert deadline.timeout_ms() is None
+
+        deadline.cancel()
+        with pytest.raises(DeadlineExceeded):
+            deadline.timeout_ms()
+
+    def test_cancel(self):
+        """ Cancelling interrupts attached connections """
+
+        class Connection(object):
+            cancelled = False
+            def cancel(self):
+                self.cancelled = True
+
+        deadline = Deadline(10)
+        running, done = Connection(), Connection()
+        deadline.attach(running)
+        deadline.attach(done)
+        deadline.detach(done)
+        deadline.cancel()
+
+        assert running.cancelled
+        assert not done.cancelled
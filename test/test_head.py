@@ -0,0 +1,52 @@
+import threading
+import psycopg2
+import pytest
+from tornado import gen
+from tornado.ioloop import IOLoop
+from blocksapi.head import Head, HeadTracker
+
+# Unit tests, on settings that don't come from the host
+pytestmark = pytest.mark.usefixtures('settings')
+
+
+class Blocks(object):
+    """ Stands in for the block model, noting the threads it's queried on """
+    def __init__(self, *heads):
+        self.heads = list(heads)
+        self.threads = []
+
+    def get_head(self):
+        self.threads.append(threading.current_thread())
+        head = self.heads.pop(0)
+        if isinstance(head, Exception):
+            raise head
+        return head
+
+
+class TestHeadTracker(object):
+    def test_poll(self):
+        """ Polls query off the IOLoop and publish on it """
+
+        blocks = Blocks(psycopg2.OperationalError("gone"), Head(10, '0x0a', 0))
+        tracker = HeadTracker(blocks, None, poll=5, listen=False,
+                              stale_after=60)
+        published = []
+        tracker.subscribe(lambda head: published.append(
+            (threading.current_thread(), head)))
+
+        async def run():
+            tracker.poll()
+            # Only one poll's query runs at a time
+            tracker.poll()
+            while tracker.polling:
+                await gen.sleep(0.01)
+            tracker.poll()
+            while tracker.polling:
+                await gen.sleep(0.01)
+            return threading.current_thread()
+
+        loop_thread = IOLoop.current().run_sync(run, timeout=5)
+        assert len(blocks.threads) == 2
+        assert all(thread is not loop_thread for thread in blocks.threads)
+        assert published == [(loop_thread, Head(10, '0x0a', 0))]
+        assert tracker.block_number == 10
@@ -0,0 +1,106 @@
+import pytest
+import requests
+import threading
+import json
+from dateutil.parser import parse
+from blocksapi.web import Application, IOLoop
+    
+TEST_PORT = 8083
+LOOP = IOLoop.instance()
+
+def start():
+    global thread, LOOP
+    app = Application()
+    app.listen(TEST_PORT)
+    thread = threading.Thread(target=LOOP.start)
+    thread.start()
+    return "http://localhost:{}".format(TEST_PORT)
+
+def stop():
+    global thread, LOOP
+    LOOP.add_callback(LOOP.stop)
+    thread.join()
+
+def is_valid_miner_schema(stat):
+    """ Test that an object is the correct schema for miner statistics """
+
+    try:
+        assert 'miner' in stat
+        assert 'block_count' in stat
+        assert 'gas_used' in stat
+        assert 'share' in stat
+        return True
+    except AssertionError:
+        return False
+
+@pytest.yield_fixture(scope="session")
+def server():
+    yield start()
+    return stop()
+
+class TestMiner(object):
+    def make_call(self, server, payload):
+        """ Make an API call to the /miner endpoint """
+        return requests.post('{}/miner'.format(server), data=json.dumps(payload))
+
+    def test_week(self, server):
+        """ Test /miner over a week, spanning partial days """
+
+        start_time = parse('2016-01-01 12:00:00').isoformat()
+        end_time = parse('2016-01-08 12:00:00').isoformat()
+
+        req = self.make_call(server, { 'start_time': start_time, 'end_time': end_time })
+
+        assert req.status_code == 200
+
+        resp = req.json()
+
+        # Make sure the output is sane
+        assert 'results' in resp
+        assert len(resp['results']) > 0
+        for stat in resp['results']:
+            assert is_valid_miner_schema(stat)
+
+        # Largest first
+        counts = [stat['block_count'] for stat in resp['results']]
+        assert counts == sorted(counts, reverse=True)
+
+    def test_single_miner(self, server):
+        """ Test /miner filtered to one miner matches the unfiltered share """
+
+        start_time = parse('2016-01-01 00:00:00').isoformat()
+        end_time = parse('2016-01-01 00:10:00').isoformat()
+
+        req = self.make_call(server, { 'start_time': start_time, 'end_time': end_time })
+        assert req.status_code == 200
+        top = req.json()['results'][0]
+
+        req = self.make_call(server, {
+            'start_time': start_time,
+            'end_time': end_time,
+            'miner': top['miner'],
+            })
+        assert req.status_code == 200
+
+        resp = req.json()
+        assert len(resp['results']) == 1
+        assert resp['results'][0] == top
+
+    def test_invalid_miner_requests(self, server):
+        """ Test /miner with invalid parameters """
+
+        start_time = parse('2016-01-01 00:00:00').isoformat()
+        end_time = parse('2016-01-01 00:10:00').isoformat()
+
+        req = self.make_call(server, { 'start_time': start_time })
+        assert req.status_code == 400
+
+        req = self.make_call(server, {
+            'start_time': start_time,
+            'end_time': end_time,
+            'miner': '0xDeadBEEF',
+            })
+        assert req.status_code == 400
+
+        req = self.make_call(server, { 'start_time': end_time, 'end_time': start_time })
+        assert req.status_code == 400
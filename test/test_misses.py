@@ -0,0 +1,75 @@
+import pytest
+import os
+import time
+from blocksapi.head import Head
+from blocksapi.misses import AddressFilter, BloomFilter, NegativeCache
+
+# Unit tests, on settings that don't come from the host
+pytestmark = pytest.mark.usefixtures('settings')
+
+ADDRESS = '0x5aaeb6053f3e94c9b9a09f33669435e7ef1beaed'
+
+
+class TestNegativeCache(object):
+    def test_ttl(self):
+        cache = NegativeCache(ttl=0.05)
+        cache.add(('hash', '0x01'), cache.generation)
+        assert ('hash', '0x01') in cache
+        assert ('hash', '0x02') not in cache
+        time.sleep(0.06)
+        assert ('hash', '0x01') not in cache
+        assert len(cache) == 0
+
+    def test_head(self):
+        """ A new head forgets misses, and lookups from before it """
+
+        cache = NegativeCache(ttl=60)
+        generation = cache.generation
+        cache.add(('block', 10), generation)
+        cache.on_head(Head(10, '0x' + 'ab' * 32, 0))
+        assert ('block', 10) not in cache
+        cache.add(('block', 11), generation)
+        assert ('block', 11) not in cache
+        cache.add(('block', 11), cache.generation)
+        assert ('block', 11) in cache
+
+    def test_bounded(self):
+        cache = NegativeCache(ttl=60, size=2)
+        for i in range(3):
+            cache.add(i, cache.generation)
+        assert 0 not in cache
+        assert 1 in cache and 2 in cache
+
+    def test_off(self):
+        cache = NegativeCache(ttl=60)
+        cache.add(1, cache.generation)
+        cache.configure(0)
+        cache.add(2, cache.generation)
+        assert 1 not in cache and 2 not in cache
+
+
+class TestBloomFilter(object):
+    def test_error(self):
+        """ Everything added is found, and not much else """
+
+        bloom = BloomFilter(10000, 0.01)
+        added = [os.urandom(20) for i in range(10000)]
+        for item in added:
+            bloom.add(item)
+        assert all(item in bloom for item in added)
+        false = sum(os.urandom(20) in bloom for i in range(10000))
+        assert false < 200
+
+
+class TestAddressFilter(object):
+    def test_ready(self):
+        """ Nothing is ruled out until the filter is loaded """
+
+        addresses = AddressFilter(None, capacity=1000, error=0.01)
+        other = '0x' + '00' * 20
+        assert other in addresses
+        addresses.add(ADDRESS.upper().replace('0X', '0x'))
+        addresses.add(None)
+        addresses.ready = True
+        assert ADDRESS in addresses
+        assert other not in addresses
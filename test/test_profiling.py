@@ -0,0 +1,91 @@
+import pytest
+import time
+import pstats
+import threading
+from blocksapi import config
+from blocksapi.profiling import (
+    collapse,
+    is_admin,
+    profiled,
+    sample_stacks,
+    start_profile,
+)
+
+# Unit tests, on settings that don't come from the host
+pytestmark = pytest.mark.usefixtures('settings')
+
+
+def busy_wait(stop: threading.Event):
+    while not stop.is_set():
+        time.sleep(0.001)
+
+
+def query_work():
+    return sum(range(1000))
+
+
+class TestSampling(object):
+    def test_stacks(self):
+        """ Samples name the thread and its frames, outermost first """
+
+        stop = threading.Event()
+        thread = threading.Thread(target=busy_wait, args=(stop,),
+                                  name='busy')
+        thread.start()
+        try:
+            stacks = sample_stacks(0.2, hz=100)
+        finally:
+            stop.set()
+            thread.join()
+
+        busy = [stack for stack in stacks if stack[0] == 'busy']
+        assert busy
+        assert all('test_profiling:busy_wait' in stack for stack in busy)
+        assert sum(stacks[stack] for stack in busy) > 1
+
+    def test_collapse(self):
+        text = collapse({('main', 'a:f', 'b:g'): 3, ('query', 'c:h'): 1})
+        assert text == "main;a:f;b:g 3\nquery;c:h 1\n"
+
+
+class TestRequestProfile(object):
+    def test_threads(self, tmp_path):
+        """ Work profiled on another thread lands in the request's stats """
+
+        path = str(tmp_path / 'request.prof')
+        profile = start_profile(path)
+        assert start_profile(str(tmp_path / 'other.prof')) is None
+
+        def query():
+            with profiled(profile):
+                query_work()
+
+        thread = threading.Thread(target=query)
+        thread.start()
+        thread.join()
+        assert profile.finish() == path
+
+        functions = [name for (filename, line, name)
+                     in pstats.Stats(path).stats]
+        assert 'query_work' in functions
+        # The next request can be profiled
+        start_profile(str(tmp_path / 'next.prof')).finish()
+
+    def test_unprofiled(self):
+        with profiled(None):
+            query_work()
+
+
+class TestAdmin(object):
+    def test_token(self):
+        before = config.settings()
+        try:
+            config.override(admin_token=None)
+            assert not is_admin('')
+            assert not is_admin(None)
+            config.override(admin_token='s3cret')
+            assert is_admin('s3cret')
+            assert not is_admin('s3cre')
+            assert not is_admin(None)
+        finally:
+            config.override(admin_token=before.admin_token)
@@ -0,0 +1,54 @@
+import json
+import threading
+import pytest
+from tornado import gen
+from tornado.ioloop import IOLoop
+from blocksapi.head import Head
+from blocksapi.pubsub import Hub
+from blocksapi.records import Block
+
+# Unit tests, on settings that don't come from the host
+pytestmark = pytest.mark.usefixtures('settings')
+
+
+class Blocks(object):
+    """ Stands in for the block model, noting the threads it's queried on """
+    def __init__(self):
+        self.threads = []
+
+    def get_range_number(self, start, end):
+        self.threads.append(threading.current_thread())
+        return [Block((n, None, None, None, 0, 0, 0, 0, 0))
+                for n in range(start, end + 1)]
+
+
+class Subscriber(object):
+    def __init__(self):
+        self.sent = []
+
+    def send(self, payload):
+        self.sent.append((threading.current_thread(), json.loads(payload)))
+
+
+class TestHub(object):
+    def test_off_loop(self):
+        """ Blocks are fetched off the IOLoop and published on it, in order """
+
+        blocks = Blocks()
+        hub = Hub(blocks, None, catchup=5)
+        subscriber = Subscriber()
+        hub.follow_heads(subscriber)
+        loop_thread = []
+
+        async def run():
+            loop_thread.append(threading.current_thread())
+            hub.on_head(Head(10, None, 0))
+            hub.on_head(Head(12, None, 0))
+            while len(subscriber.sent) < 3:
+                await gen.sleep(0.01)
+
+        IOLoop.current().run_sync(run, timeout=5)
+        assert all(thread is not loop_thread[0] for thread in blocks.threads)
+        assert all(thread is loop_thread[0] for thread, _ in subscriber.sent)
+        assert [message['result']['block_number']
+                for _, message in subscriber.sent] == [10, 11, 12]
@@ -0,0 +1,117 @@
+from blocksapi.head import Head
+from blocksapi.records import Block, Transaction
+from blocksapi.recent import RecentBlocks
+
+ADDRESS = '0x5aaeb6053f3e94c9b9a09f33669435e7ef1beaed'
+OTHER = '0x' + '11' * 20
+
+
+def block_hash(number: int, fork: str='a') -> str:
+    return '0x' + fork * 2 + '{:062x}'.format(number)
+
+
+class Chain(object):
+    """ Blocks with two transactions each, from ADDRESS and to it, standing
+        in for the block and transaction models
+    """
+    def __init__(self):
+        self.forks = {}
+        self.queries = 0
+
+    def fork(self, number: int) -> str:
+        return self.forks.get(number, 'a')
+
+    def block(self, number: int) -> Block:
+        return Block((number, None, block_hash(number, self.fork(number)),
+                      OTHER, 0, 0, 0, 0, 0))
+
+    def transactions(self, number: int) -> list:
+        prefix = '0x' + self.fork(number) * 2 + '{:060x}'.format(number)
+        return [
+            Transaction((prefix + '01', number, ADDRESS, OTHER, 0, 0, 0, 0,
+                         '0xabcd')),
+            Transaction((prefix + '02', number, OTHER, ADDRESS, 0, 0, 0, 0,
+                         '0x')),
+        ]
+
+    def get_range_number(self, start, end, limit=None):
+        self.queries += 1
+        return [self.block(n) for n in range(start, end + 1)]
+
+    def get_block_range(self, start, end):
+        self.queries += 1
+        return [tx for n in range(start, end + 1)
+                for tx in self.transactions(n)]
+
+
+def head(chain: Chain, number: int) -> Head:
+    return Head(number, chain.block(number).hash, 0)
+
+
+class TestRecentBlocks(object):
+    def setup_method(self):
+        self.chain = Chain()
+        self.recent = RecentBlocks(self.chain, self.chain, 8)
+
+    def test_window(self):
+        """ The newest blocks are kept, and older ones evicted """
+
+        self.recent.load(head(self.chain, 20))
+        assert self.recent.get(12) is None
+        assert self.recent.get(21) is None
+        assert self.recent.get(13) == [self.chain.block(13)]
+        self.recent.load(head(self.chain, 22))
+        assert self.recent.get(14) is None
+        assert self.recent.get(22) == [self.chain.block(22)]
+        assert len(self.recent.get_transactions(22)) == 2
+
+        old = self.chain.transactions(14)[0]
+        new = self.chain.transactions(22)[0]
+        assert self.recent.get_transaction(old.hash) is None
+        assert self.recent.get_transaction(new.hash) == [new]
+
+    def test_copies(self):
+        """ Lookups hand out copies, of only the fields asked for """
+
+        self.recent.load(head(self.chain, 20))
+        tx = self.chain.transactions(20)[0]
+        res = self.recent.get_transaction(tx.hash, ('input', 'hash'))
+        assert res[0].columns == ['hash', 'input']
+        res[0].input = '0x'
+        assert self.recent.get_transaction(tx.hash)[0].input == '0xabcd'
+
+    def test_reorg(self):
+        """ Blocks whose hash changed are replaced with their transactions """
+
+        self.recent.load(head(self.chain, 20))
+        replaced = self.chain.transactions(19)[0]
+        self.chain.forks.update({19: 'b', 20: 'b', 21: 'b'})
+        self.recent.load(head(self.chain, 21))
+        assert self.recent.get(19)[0].hash == block_hash(19, 'b')
+        assert self.recent.get_transaction(replaced.hash) is None
+        tx = self.chain.transactions(19)[0]
+        assert self.recent.get_transaction(tx.hash) == [tx]
+        assert self.recent.get(18)[0].hash == block_hash(18)
+
+    def test_head_back(self):
+        """ Blocks above a head that moved back are dropped """
+
+        self.recent.load(head(self.chain, 20))
+        self.recent.load(head(self.chain, 18))
+        assert self.recent.get(19) is None
+        assert self.recent.get(18) is not None
+        self.recent.drop_from(17)
+        assert self.recent.get(17) is None
+        assert self.recent.newest == 16
+
+    def test_by_address(self):
+        """ Only answered when the ring holds a whole page """
+
+        self.recent.load(head(self.chain, 20))
+        res = self.recent.by_address(ADDRESS.upper().replace('0X', '0x'), 4)
+        assert [tx.block_number for tx in res] == [20, 20, 19, 19]
+        res = self.recent.by_address(ADDRESS, 3, 'from_address')
+        assert [tx.block_number for tx in res] == [20, 19, 18]
+        assert all(tx.from_address == ADDRESS for tx in res)
+        assert self.recent.by_address(ADDRESS, 17) is None
+        assert self.recent.by_address('0x' + '22' * 20, 1) is None
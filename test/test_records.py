@@ -0,0 +1,186 @@
+import json
+import pickle
+import pytest
+from datetime import datetime
+from blocksapi.db import (
+    ESTIMATE,
+    EXACT,
+    Count,
+    JSONEncoder,
+    TransactionModel,
+    _results,
+)
+from blocksapi.encoders import _plain, register_columns
+from blocksapi.records import Block, Transaction, projection
+
+TX_ROW = (
+    '0x5c504ed432cb51138bcf09aa5e8a410dd4a1e204ef84bfed1be16dfba1b22060',
+    1,
+    '0xA1E4380A3B1f749673E270229993eE55F35663b4',
+    '0x5DF9B87991262F6BA471F09758CDE1c0FC1De734',
+    31337,
+    50000000000000,
+    21000,
+    0,
+    '0x',
+)
+
+# Unit tests, on settings that don't come from the host
+pytestmark = pytest.mark.usefixtures('settings')
+
+
+def unconnected() -> TransactionModel:
+    """ A transaction model built without its constructor, so it can't open
+        a connection
+    """
+    model = TransactionModel.__new__(TransactionModel)
+    model.table = 'transaction'
+    model.columns = list(Transaction.columns)
+    model.varchar_hash = None
+    model.row_counter = None
+    return model
+
+
+class TestRecords(object):
+    def test_access(self):
+        """ Records read by name, position and attribute """
+
+        tx = Transaction(TX_ROW)
+        assert tx['hash'] == TX_ROW[0]
+        assert tx[4] == 31337
+        assert tx.to_address == TX_ROW[3]
+        assert len(tx) == 9
+        assert list(tx) == list(TX_ROW)
+        assert tx.keys() == Transaction.columns
+
+        tx['value'] = 1
+        assert tx.value == 1
+
+        try:
+            tx['nope']
+            assert False, "Expected KeyError"
+        except KeyError:
+            pass
+
+    def test_no_dict(self):
+        """ Values live in slots only """
+
+        tx = Transaction(TX_ROW)
+        assert not hasattr(tx, '__dict__')
+
+    def test_json(self):
+        """ Records encode as objects keyed by column """
+
+        block = Block((1, datetime(2016, 1, 1), '0x88e9', '0x05a5', 6024642674226568900,
+                       17171480576, 0, 5000, 537))
+        encoded = json.loads(json.dumps({'results': [block]}, cls=JSONEncoder))
+        assert encoded['results'][0]['block_number'] == 1
+        assert encoded['results'][0]['block_timestamp'] == '2016-01-01T00:00:00'
+        assert encoded['results'][0]['nonce'] == 6024642674226568900
+
+    def test_plain(self):
+        """ The binary encoders convert records like rawl results """
+
+        register_columns(TransactionModel.column_types)
+        plain = _plain({'results': [Transaction(TX_ROW)]})
+        assert plain['results'][0]['hash'] == bytes.fromhex(TX_ROW[0][2:])
+        assert plain['results'][0]['value'] == 31337
+
+    def test_results(self):
+        """ Full rows become records, others stay rawl results """
+
+        assert _results([TX_ROW], Transaction.columns, Transaction) == [
+            Transaction(TX_ROW)]
+        partial = _results([(1,)], ['block_number'], Transaction)
+        assert not isinstance(partial[0], Transaction)
+        assert partial[0]['block_number'] == 1
+
+    def test_pickle(self):
+        tx = Transaction(TX_ROW)
+        assert pickle.loads(pickle.dumps(tx)) == tx
+
+
+class TestProjection(object):
+    def test_projected(self):
+        """ Rows of some columns become records of just those columns """
+
+        rows = _results([(TX_ROW[0], 31337)], ['hash', 'value'], Transaction)
+        tx = rows[0]
+        assert tx.columns == ['hash', 'value']
+        assert tx['value'] == 31337
+        assert tx.to_dict() == {'hash': TX_ROW[0], 'value': 31337}
+        assert not hasattr(tx, '__dict__')
+        assert not hasattr(tx, 'input')
+        assert type(tx) is projection(Transaction, ('hash', 'value'))
+        assert projection(Transaction, tuple(Transaction.columns)) is Transaction
+
+    def test_encoded(self):
+        tx = projection(Transaction, ('block_number', 'value'))((1, 2))
+        assert json.loads(json.dumps(tx, cls=JSONEncoder)) == {
+            'block_number': 1, 'value': 2}
+        register_columns(TransactionModel.column_types)
+        assert _plain([tx]) == [{'block_number': 1, 'value': 2}]
+
+    def test_pickle(self):
+        tx = projection(Transaction, ('hash',))((TX_ROW[0],))
+        assert pickle.loads(pickle.dumps(tx)) == tx
+
+    def test_project(self):
+        """ Models select the fields asked for in their own column order """
+
+        model = unconnected()
+        assert model.project(None) == Transaction.columns
+        assert model.project(('value', 'hash')) == ['hash', 'value']
+        assert model.aliased(('input',)) == ['t.input']
+        with pytest.raises(ValueError):
+            model.project(('hash', 'nope'))
+
+
+class TestCount(object):
+    def counted(self, installed: bool):
+        """ A model whose queries answer as if row_counter is installed or not,
+            keeping the queries run
+        """
+        model = unconnected()
+        model.queries = []
+
+        def query(sql_string, *args, columns=None):
+            model.queries.append(sql_string)
+            if 'to_regclass' in sql_string:
+                return [[installed]]
+            if 'FROM row_counter' in sql_string:
+                assert installed, "row_counter queried without the table"
+                return [[7]]
+            return [[42]]
+        model.query = query
+        return model
+
+    def test_exact(self):
+        model = self.counted(True)
+        assert model.count_rows() == Count(7, EXACT)
+
+    def test_fallback(self):
+        """ Without sql/counters.sql the planner's estimate is used, and the
+            table is only looked for once
+        """
+        model = self.counted(False)
+        assert model.count_rows() == Count(42, ESTIMATE)
+        assert model.count_rows() == Count(42, ESTIMATE)
+        assert sum('to_regclass' in q for q in model.queries) == 1
+
+
+class TestHashes(object):
+    def test_varchar(self):
+        """ Varchar hashes are turned into hex by the query """
+
+        model = unconnected()
+        model.varchar_hash = True
+        column = repr(model.select_column('t.hash'))
+        assert "'0x' || substr(" in column
+        assert column.endswith("AS '), Identifier('hash')])")
+        assert 'substr' not in repr(model.select_column('value'))
+
+    def test_bytea(self):
+        model = unconnected()
+        model.varchar_hash = False
+        assert 'substr' not in repr(model.select_column('hash'))
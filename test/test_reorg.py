@@ -0,0 +1,77 @@
+import json
+from blocksapi.head import Head
+from blocksapi.records import Block, projection
+from blocksapi.reorg import ReorgDetector
+
+
+def block(number: int, fork: str='a') -> Block:
+    return Block((number, None, '0x' + fork * 2 + '{:062x}'.format(number),
+                  None, 0, 0, 0, 0, 0))
+
+
+class Chain(object):
+    """ Stands in for the block model """
+    def __init__(self):
+        self.forks = {}
+
+    def get_hashes(self, start, end):
+        return {n: block(n, self.forks.get(n, 'a')).hash
+                for n in range(start, end + 1)}
+
+
+class Store(object):
+    """ Stands in for Redis, keeping what's published """
+    def __init__(self):
+        self.published = []
+
+    def publish(self, channel, message):
+        self.published.append((channel, json.loads(message)))
+
+
+class TestReorgDetector(object):
+    def setup_method(self):
+        self.chain = Chain()
+        self.detector = ReorgDetector(self.chain, depth=10, channel='reorg')
+        self.detector.store = Store()
+        self.forks = []
+        self.detector.subscribe(self.forks.append)
+        self.detector.head = Head(100, block(100).hash, 0)
+
+    def test_unchanged(self):
+        self.detector.saw([block(n) for n in range(95, 101)])
+        assert self.detector.check(self.detector.head) is None
+        assert self.forks == []
+
+    def test_fork(self):
+        """ The first changed block is the fork point, announced to all """
+
+        self.detector.saw([block(n) for n in range(95, 101)])
+        self.chain.forks.update({98: 'b', 99: 'b', 100: 'b'})
+        assert self.detector.check(self.detector.head) == 98
+        assert self.forks == [98]
+        assert sorted(self.detector.served) == [95, 96, 97]
+        channel, message = self.detector.store.published[0]
+        assert channel == 'reorg'
+        assert message['fork'] == 98
+        assert message['origin'] == self.detector.origin
+
+    def test_depth(self):
+        """ Only blocks near the head are checked """
+
+        fields = projection(Block, ('block_number',))
+        self.detector.saw([block(80), block(95), fields((96,))])
+        assert sorted(self.detector.served) == [95]
+        self.chain.forks[95] = 'b'
+        assert self.detector.check(Head(106, None, 0)) is None
+        assert self.detector.served == {}
+
+    def test_messages(self):
+        """ Other workers' fork points invalidate, this worker's don't """
+
+        self.detector.on_message(json.dumps({'fork': 97, 'origin': 'other'}))
+        self.detector.on_message(json.dumps({
+            'fork': 96,
+            'origin': self.detector.origin,
+        }))
+        self.detector.on_message(b'{"fork": "x"}')
+        assert self.forks == [97]
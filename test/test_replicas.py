@@ -0,0 +1,119 @@
+import pytest
+from blocksapi.head import Head
+from blocksapi.replicas import Database, Router, PRIMARY, routing, current_route
+
+# Unit tests, on settings that don't come from the host
+pytestmark = pytest.mark.usefixtures('settings')
+
+def make_router(*heads, max_lag=2):
+    """ A router with a primary at 100 and replicas at the given heads """
+    router = Router('postgresql://localhost/primary',
+                    ['postgresql://localhost/r{}'.format(i)
+                     for i in range(len(heads))],
+                    max_lag=max_lag, max_failures=2)
+    router.primary.head = 100
+    for replica, head in zip(router.replicas, heads):
+        replica.head = head
+    return router
+
+class TestRouter(object):
+    def test_round_robin(self):
+        """ Reads are spread over replicas within the lag """
+
+        router = make_router(100, 99)
+        picked = {router.pick().name for i in range(4)}
+        assert picked == {r.name for r in router.replicas}
+
+    def test_lagging(self):
+        """ Replicas too far behind only answer for blocks they have """
+
+        router = make_router(90)
+        assert router.pick() is router.primary
+        assert router.pick(80) is router.replicas[0]
+        assert router.pick(95) is router.primary
+
+    def test_primary_only(self):
+        """ PRIMARY and blocks past the primary's known head skip replicas """
+
+        router = make_router(100)
+        assert router.pick(PRIMARY) is router.primary
+        assert router.pick(101) is router.primary
+
+        router.on_head(Head(101, '0x00', 0))
+        assert router.lag(router.replicas[0]) == 1
+        assert router.pick(101) is router.primary
+
+    def test_unchecked(self):
+        """ A replica never checked isn't used """
+
+        router = make_router(None)
+        assert router.pick() is router.primary
+        assert router.pick(1) is router.primary
+
+    def test_eject(self):
+        """ Replicas are ejected after repeated failures and come back """
+
+        router = make_router(100)
+        replica = router.replicas[0]
+
+        router.failed(replica)
+        assert not replica.ejected
+        router.failed(replica)
+        assert replica.ejected
+        assert router.pick() is router.primary
+
+        router.succeeded(replica)
+        assert router.pick() is replica
+
+    def test_routing(self):
+        """ routing() scopes the route to the block """
+
+        assert current_route() is None
+        with routing(5):
+            assert current_route() == 5
+            with routing(PRIMARY):
+                assert current_route() is PRIMARY
+            assert current_route() == 5
+        assert current_route() is None
+
+
+class Pool(object):
+    """ Stands in for a ThreadedConnectionPool """
+    def __init__(self):
+        self.closed = False
+        self.returned = []
+
+    def getconn(self):
+        return Connection()
+
+    def putconn(self, conn, close=False):
+        assert not self.closed
+        self.returned.append(close)
+
+    def closeall(self):
+        self.closed = True
+
+
+class Connection(object):
+    closed = 0
+    status = 1
+
+
+class TestDatabase(object):
+    def test_reset_lent(self):
+        """ A reset leaves connections in use to be returned, then closes """
+
+        db = Database('postgresql://localhost/r0', pool_size=1)
+        db.pool = pool = Pool()
+        with db.connection():
+            db.reset()
+            assert not pool.closed
+            assert db.pool is None
+        assert pool.returned == [True]
+        assert pool.closed
+
+    def test_reset_idle(self):
+        db = Database('postgresql://localhost/r0', pool_size=1)
+        db.pool = pool = Pool()
+        db.reset()
+        assert pool.closed
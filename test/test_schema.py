@@ -0,0 +1,151 @@
+import pytest
+from datetime import datetime
+from blocksapi.db import RESOLUTIONS
+from blocksapi.docs import JSON_SCHEMA, UNLISTED_SCHEMA
+from blocksapi.schema import RequestSchema, compile_schemas
+from blocksapi.validate import InvalidInput
+from blocksapi.records import Block, Transaction
+from blocksapi import web
+
+ADDRESS = '0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed'
+TX_ROW = ('0x' + 'ab' * 32, 1, ADDRESS, ADDRESS, 0, 0, 21000, 0, '0x')
+
+
+class TestParse(object):
+    def setup_method(self):
+        self.schemas = compile_schemas(JSON_SCHEMA + UNLISTED_SCHEMA)
+
+    def test_plans(self):
+        """ Requests dispatch to the first plan they have arguments for """
+
+        block = self.schemas['/block']
+        assert block.parse({'block_number': 5}) == ('block', {
+            'block_number': 5,
+            'page': 0,
+        })
+        assert block.parse({'start': '1', 'end': 2, 'page': 3}).plan \
+            == 'range_number'
+        assert block.parse({
+            'start_time': '2018-01-01',
+            'end_time': '2018-01-02',
+        }).values['start_time'] == datetime(2018, 1, 1)
+        # block_number wins over a range
+        assert block.parse({'block_number': 1, 'start': 1, 'end': 2}).plan \
+            == 'block'
+
+    def test_zero(self):
+        """ Zero is a value, not a missing argument """
+
+        block = self.schemas['/block']
+        assert block.parse({'block_number': 0}).values['block_number'] == 0
+        assert block.parse({'start': 0, 'end': 0}).plan == 'range_number'
+
+    def test_query_string(self):
+        """ Tornado query arguments are lists of bytes, the last one wins """
+
+        request = self.schemas['/aggregate'].parse({
+            'interval': [b'hour', b'day'],
+            'start_time': [b'2018-01-01'],
+            'end_time': [b'2018-01-02'],
+            'page': [b''],
+        })
+        assert request.values['interval'] == 'day'
+        assert request.values['page'] == 0
+
+    def test_coerced(self):
+        tx = self.schemas['/transaction']
+        request = tx.parse({'address': ADDRESS, 'page': '2', 'extra': 'x'})
+        assert request == ('address', {'address': ADDRESS.lower(), 'page': 2})
+        assert tx.parse({'hash': 'ab' * 32}).values['hash'] == '0x' + 'ab' * 32
+
+    def test_invalid(self):
+        block = self.schemas['/block']
+        for arguments in ({}, {'start': 1}, {'page': 1}, {'block_number': ''}):
+            with pytest.raises(InvalidInput, match="Invalid request"):
+                block.parse(arguments)
+        with pytest.raises(InvalidInput, match="Invalid page"):
+            block.parse({'block_number': 1, 'page': -1})
+        with pytest.raises(InvalidInput):
+            block.parse({'block_number': 'one'})
+        with pytest.raises(InvalidInput):
+            block.parse({'block_number': 1, 'start': [1]})
+        with pytest.raises(InvalidInput, match="Invalid interval"):
+            self.schemas['/aggregate'].parse({
+                'interval': 'week',
+                'start_time': '2018-01-01',
+                'end_time': '2018-01-02',
+            })
+        with pytest.raises(InvalidInput, match="Invalid request"):
+            self.schemas['/miner'].parse({'start_time': '2018-01-01'})
+
+    def test_unknown_type(self):
+        with pytest.raises(ValueError):
+            RequestSchema({'properties': {'addresses': {'type': 'array'}}})
+
+
+class TestHandlers(object):
+    def test_plans_documented(self):
+        """ Every handler runs exactly the plans its schema documents """
+
+        for handler in (web.BlockHandler, web.TransactionHandler,
+                        web.AggregateHandler, web.MinerHandler):
+            titles = [title for title, required in handler.schema.plans]
+            assert sorted(handler.plans) == sorted(titles)
+            for name, fields, cheap in handler.plans.values():
+                assert callable(getattr(handler, name))
+                assert set(fields) <= set(handler.schema.coercers)
+
+    def test_resolutions(self):
+        schema = next(e for e in JSON_SCHEMA if e['uri'] == '/aggregate')
+        assert tuple(schema['request']['properties']['interval']['enum']) \
+            == RESOLUTIONS
+
+
+class TestFields(object):
+    def setup_method(self):
+        self.schemas = compile_schemas(JSON_SCHEMA + UNLISTED_SCHEMA)
+
+    def test_parse(self):
+        """ fields come as a list or a comma separated string """
+
+        block = self.schemas['/block']
+        assert block.parse({'block_number': 1, 'fields': ['hash', 'size']}) \
+            .values['fields'] == ('hash', 'size')
+        assert block.parse({'block_number': 1, 'fields': [b'hash, size,hash']}) \
+            .values['fields'] == ('hash', 'size')
+        assert 'fields' not in block.parse({'block_number': 1}).values
+        with pytest.raises(InvalidInput, match="Invalid fields"):
+            block.parse({'block_number': 1, 'fields': 'hash,input'})
+        with pytest.raises(InvalidInput, match="Invalid fields"):
+            block.parse({'block_number': 1, 'fields': 3})
+
+    def test_documented(self):
+        """ The fields documented are the model's columns """
+
+        for uri, record in (('/block', Block), ('/transaction', Transaction)):
+            endpoint = next(e for e in JSON_SCHEMA + UNLISTED_SCHEMA
+                            if e['uri'] == uri)
+            fields = endpoint['request']['properties']['fields']
+            assert fields['items']['enum'] == record.columns
+
+
+class TestTruncate(object):
+    def test_truncated(self):
+        rows = [Transaction(TX_ROW[:8] + ('0x' + 'ab' * 10,)),
+                Transaction(TX_ROW)]
+        assert web.truncate_input(rows, 4) == {'input_truncated': True}
+        assert rows[0].input == '0x' + 'ab' * 4
+        assert rows[1].input == '0x'
+        assert web.truncate_input(rows, 4) == {'input_truncated': False}
+        assert web.truncate_input(rows, None) == {}
+
+
+class TestBounds(object):
+    def test_maximum(self):
+        profile = compile_schemas(UNLISTED_SCHEMA)['/admin/profile']
+        assert profile.parse({}).values == {'seconds': 10, 'hz': 100}
+        assert profile.parse({'seconds': 300}).values['seconds'] == 300
+        with pytest.raises(InvalidInput, match="Invalid seconds"):
+            profile.parse({'seconds': 301})
+        with pytest.raises(InvalidInput, match="Invalid hz"):
+            profile.parse({'hz': 0})
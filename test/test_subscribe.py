@@ -0,0 +1,68 @@
+import pytest
+import threading
+import json
+from tornado.websocket import websocket_connect
+from blocksapi.web import Application, IOLoop
+    
+TEST_PORT = 8084
+LOOP = IOLoop.instance()
+
+def start():
+    global thread, LOOP
+    app = Application()
+    app.listen(TEST_PORT)
+    thread = threading.Thread(target=LOOP.start)
+    thread.start()
+    return "ws://localhost:{}".format(TEST_PORT)
+
+def stop():
+    global thread, LOOP
+    LOOP.add_callback(LOOP.stop)
+    thread.join()
+
+@pytest.yield_fixture(scope="session")
+def server():
+    yield start()
+    return stop()
+
+class TestSubscribe(object):
+    def exchange(self, server, *messages):
+        """ Send messages to /subscribe and return the replies """
+
+        async def run():
+            conn = await websocket_connect('{}/subscribe'.format(server))
+            replies = []
+            for msg in messages:
+                conn.write_message(json.dumps(msg))
+                replies.append(json.loads(await conn.read_message()))
+            conn.close()
+            return replies
+
+        return IOLoop().run_sync(run)
+
+    def test_subscribe(self, server):
+        """ Test subscribing to blocks and addresses """
+
+        address = '0xa1e4380a3b1f749673e270229993ee55f35663b4'
+        replies = self.exchange(server,
+            { 'subscribe': 'blocks' },
+            { 'subscribe': 'transactions', 'addresses': [address] },
+            { 'unsubscribe': 'transactions', 'addresses': [address] })
+
+        assert replies[0]['type'] == 'subscribed'
+        assert replies[0]['topic'] == 'blocks'
+        assert replies[1]['type'] == 'subscribed'
+        assert replies[1]['addresses'] == [address]
+        assert replies[2]['type'] == 'unsubscribed'
+        assert replies[2]['addresses'] == []
+
+    def test_invalid_messages(self, server):
+        """ Test /subscribe with invalid messages """
+
+        replies = self.exchange(server,
+            { 'subscribe': 'transactions', 'addresses': ['0xDeadBEEF'] },
+            { 'subscribe': 'gossip' },
+            { 'nothing': 'blocks' })
+
+        for reply in replies:
+            assert reply['type'] == 'error'
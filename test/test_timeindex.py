@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+from blocksapi.head import Head
+from blocksapi.timeindex import TimestampIndex, to_epoch
+
+GENESIS = datetime(2016, 1, 1)
+
+def make_index(count, spacing=15):
+    """ Build a loaded index of count blocks, spacing seconds apart """
+    index = TimestampIndex(None)
+    for i in range(count):
+        index.extend(i, to_epoch(GENESIS) + i * spacing)
+    index.ready = True
+    return index
+
+class TestTimestampIndex(object):
+    def test_not_ready(self):
+        """ An unloaded index has no answer """
+
+        index = TimestampIndex(None)
+        assert index.block_range(GENESIS, GENESIS) is None
+
+    def test_window(self):
+        """ Test a window inside the index """
+
+        index = make_index(100)
+        start = GENESIS + timedelta(seconds=30)
+        end = GENESIS + timedelta(seconds=89)
+
+        assert index.block_range(start, end) == (2, 5, 4)
+
+    def test_empty_window(self):
+        """ Test a window between two blocks """
+
+        index = make_index(100)
+        start = GENESIS + timedelta(seconds=31)
+        end = GENESIS + timedelta(seconds=44)
+
+        first, last, count = index.block_range(start, end)
+        assert first > last
+        assert count == 0
+
+    def test_open_window(self):
+        """ Test windows that run past the newest block """
+
+        index = make_index(100)
+
+        start = GENESIS + timedelta(seconds=1485)
+        end = GENESIS + timedelta(days=1)
+        assert index.block_range(start, end) == (99, None, None)
+
+        start = GENESIS + timedelta(days=1)
+        assert index.block_range(start, end) == (100, None, None)
+
+    def test_reorg(self):
+        """ Re-adding a block replaces it and everything after """
+
+        index = make_index(100)
+        index.extend(50, to_epoch(GENESIS) + 50 * 15 + 5)
+
+        assert len(index) == 51
+        start = GENESIS + timedelta(seconds=750)
+        end = GENESIS + timedelta(seconds=755)
+        assert index.block_range(start, end) == (50, None, None)
+
+    def test_out_of_order_timestamp(self):
+        """ A block older than its parent stays searchable """
+
+        index = make_index(10)
+        index.extend(10, to_epoch(GENESIS))
+        index.extend(11, to_epoch(GENESIS) + 200)
+
+        start = GENESIS + timedelta(seconds=135)
+        end = GENESIS + timedelta(seconds=199)
+        assert index.block_range(start, end) == (9, 10, 2)
+
+    def test_head_while_loading(self):
+        """ Heads are left to the load running, which adds its blocks at once """
+
+        index = make_index(10)
+        with index.loading:
+            index.add_head(Head(10, None, to_epoch(GENESIS) + 150))
+            assert len(index) == 10
+        index.add_head(Head(10, None, to_epoch(GENESIS) + 150))
+        assert len(index) == 11
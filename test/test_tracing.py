@@ -0,0 +1,85 @@
+import json
+import threading
+import pytest
+from blocksapi.tracing import NO_TRACE, Tracer, span, traced
+
+
+def read_traces(path) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+class TestTrace(object):
+    def test_spans(self, tmp_path):
+        """ Spans nest under the root, and threads under the span given to
+            traced()
+        """
+        path = tmp_path / 'traces.jsonl'
+        tracer = Tracer(str(path), sample=1.0)
+        trace = tracer.start('POST /block')
+
+        def query():
+            with traced(flight):
+                with span('db.query', db='primary') as s:
+                    s.attrs['rows'] = 1
+                    with span('hex_format'):
+                        pass
+
+        with trace.span('flight') as flight:
+            thread = threading.Thread(target=query)
+            thread.start()
+            thread.join()
+
+        assert tracer.finish(trace, status=200)
+        written = read_traces(path)[0]
+        assert written['trace_id'] == trace.trace_id
+        assert written['attrs'] == {'status': 200}
+        spans = {s['name']: s for s in written['spans']}
+        assert spans['flight']['parent'] == 1
+        assert spans['db.query']['parent'] == spans['flight']['id']
+        assert spans['db.query']['attrs'] == {'db': 'primary', 'rows': 1}
+        assert spans['hex_format']['parent'] == spans['db.query']['id']
+
+    def test_error(self):
+        trace = Tracer('/dev/null').start('GET /')
+        with pytest.raises(KeyError):
+            with trace.span('validate'):
+                raise KeyError('x')
+        assert trace.spans[-1].attrs == {'error': 'KeyError'}
+
+    def test_untraced(self):
+        """ Without traced() or a file, spans are no-ops """
+
+        with span('db.query') as s:
+            assert s is None
+        tracer = Tracer(None)
+        trace = tracer.start('GET /')
+        assert trace is NO_TRACE
+        assert not trace.sampled
+        with trace.span('validate') as s:
+            assert s is None
+        assert not tracer.finish(trace)
+
+
+class TestSampling(object):
+    def test_slow(self, tmp_path):
+        """ Unsampled traces are only written when slow """
+
+        path = tmp_path / 'traces.jsonl'
+        tracer = Tracer(str(path), sample=0.0, slow=60)
+        assert not tracer.finish(tracer.start('fast'))
+
+        tracer.configure(str(path), sample=0.0, slow=0)
+        assert tracer.finish(tracer.start('slow'))
+        assert [t['name'] for t in read_traces(path)] == ['slow']
+
+    def test_reconfigure(self, tmp_path):
+        first, second = tmp_path / 'first.jsonl', tmp_path / 'second.jsonl'
+        tracer = Tracer(str(first), sample=1.0)
+        tracer.finish(tracer.start('one'))
+        tracer.configure(str(second), 1.0, None)
+        tracer.finish(tracer.start('two'))
+        tracer.configure(None, 1.0, None)
+        assert tracer.start('three') is NO_TRACE
+        assert [t['name'] for t in read_traces(first)] == ['one']
+        assert [t['name'] for t in read_traces(second)] == ['two']
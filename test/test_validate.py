@@ -0,0 +1,45 @@
+import pytest
+from blocksapi.validate import InvalidInput, be_address, be_hash, is_address
+
+CHECKSUMMED = '0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed'
+
+
+class TestAddress(object):
+    def test_normalized(self):
+        """ Addresses come back lower case with a 0x prefix """
+
+        lower = CHECKSUMMED.lower()
+        assert be_address(CHECKSUMMED) == lower
+        assert be_address(lower[2:]) == lower
+        assert be_address('0x' + lower[2:].upper()) == lower
+        assert be_address(lower.encode('utf-8')) == lower
+
+    def test_checksum(self):
+        """ Mixed case addresses must have a valid checksum """
+
+        bad = CHECKSUMMED[:-1] + 'D'
+        assert not is_address(bad)
+        with pytest.raises(InvalidInput):
+            be_address(bad)
+
+    def test_invalid(self):
+        for v in ('0x1234', CHECKSUMMED + '00', ' ' + CHECKSUMMED, 'zz' * 20):
+            assert not is_address(v)
+            with pytest.raises(InvalidInput):
+                be_address(v)
+        assert not is_address(None)
+
+
+class TestHash(object):
+    def test_prefix(self):
+        digits = 'ab' * 32
+        assert be_hash(digits) == '0x' + digits
+        assert be_hash('0x' + digits) == '0x' + digits
+
+    def test_invalid(self):
+        with pytest.raises(InvalidInput):
+            be_hash('0x' + 'zz' * 32)
+        with pytest.raises(InvalidInput):
+            be_hash('0x' + 'ab' * 31)
+        with pytest.raises(InvalidInput):
+            be_hash('ab' * 33)